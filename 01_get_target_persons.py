@@ -1,47 +1,108 @@
 import openpyxl
 import pandas as pd
 import argparse
+import os
+import pickle
+
+from row_delta import RowCache, code_signature
+
+SHEET_CACHE_DIR = "data/sheet_cache"
+RED_RGB = ('FFFF0000', 'FF0000')
+
+def exclude_lod_rows(df):
+    # Exclude records with data length >= 6 in any column starting with 'LOD' or 'lod'
+    lod_cols = [col for col in df.columns if str(col).lower().startswith('lod')]
+    exclude_mask = pd.Series(False, index=df.index)
+    for col in lod_cols:
+        values = df[col]
+        exclude_mask |= values.notna() & (values.astype(object).astype(str).str.len() >= 6)
+    return df[~exclude_mask]
+
+def read_person_sheet(filepath, sheetname='Person List', filter_red=False):
+    """
+    Stream the sheet in read-only mode into a DataFrame. Cell fills
+    are only looked at, on the 'Researcher/Date' column alone, when filter_red
+    is set; otherwise rows are read as plain values.
+    """
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        ws = wb[sheetname]
+        header = list(next(ws.iter_rows(min_row=1, max_row=1, values_only=True)))
+        width = len(header)
 
-def get_target_persons(filepath='data/standard_directory_persons.xlsx', sheetname='Person List', filter_red=False):
-    # Load the workbook and sheet
-    wb = openpyxl.load_workbook(filepath, data_only=True)
-    ws = wb[sheetname]
-
-    # Find the column index for 'Researcher/Date'
-    header = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-    
-    # Check if 'Researcher/Date' exists in header
-    researcher_col_exists = 'Researcher/Date' in header
-    col_idx = header.index('Researcher/Date') + 1 if researcher_col_exists else -1  # openpyxl is 1-based
-
-    # Collect rows (filter by red if requested and column exists)
-    rows = []
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
         # Only apply red filtering if the column exists and filtering is requested
-        if filter_red and researcher_col_exists:
-            cell = row[col_idx - 1]
-            fill = cell.fill
-            # Check if the cell has a red fill (RGB 'FFFF0000' is standard red)
-            if fill.fill_type is not None and fill.start_color.rgb in ('FFFF0000', 'FF0000'):
-                rows.append([c.value for c in row])
+        researcher_col = header.index('Researcher/Date') if 'Researcher/Date' in header else -1
+        rows = []
+        if filter_red and researcher_col >= 0:
+            for row in ws.iter_rows(min_row=2):
+                fill = row[researcher_col].fill if len(row) > researcher_col else None
+                # Check if the cell has a red fill (RGB 'FFFF0000' is standard red)
+                if fill is not None and fill.fill_type is not None and fill.start_color.rgb in RED_RGB:
+                    rows.append(_pad([c.value for c in row], width))
         else:
-            rows.append([c.value for c in row])
+            for values in ws.iter_rows(min_row=2, values_only=True):
+                rows.append(_pad(list(values), width))
+    finally:
+        wb.close()
 
     # Convert to DataFrame
-    df = pd.DataFrame(rows, columns=header)
+    return pd.DataFrame(rows, columns=header)
 
-    # Exclude records with data length >= 6 in any column starting with 'LOD' or 'lod'
-    lod_cols = [col for col in df.columns if str(col).lower().startswith('lod')]
-    mask = df[lod_cols].apply(lambda col: col.map(lambda x: len(str(x)) if pd.notnull(x) else 0))
-    exclude_mask = (mask >= 6).any(axis=1)
-    df_filtered = df[~exclude_mask]
+def _pad(values, width):
+    # Read-only rows stop at their last stored cell
+    return values[:width] + [None] * (width - len(values))
+
+def read_person_sheet_cached(filepath, sheetname='Person List', filter_red=False, cache_dir=SHEET_CACHE_DIR):
+    """
+    read_person_sheet, with the parsed sheet pickled under cache_dir and keyed
+    by a hash of the workbook, so re-runs on an unchanged file skip the Excel
+    parsing.
+    """
+    key = code_signature(filepath, __file__, extra=repr((sheetname, filter_red)))
+    slug = "".join(ch if ch.isalnum() else "_" for ch in sheetname)
+    cache_path = os.path.join(cache_dir, f"{slug}{'_red' if filter_red else ''}.pkl")
+    if os.path.isfile(cache_path):
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("key") == key:
+            return cached["df"]
+    df = read_person_sheet(filepath, sheetname, filter_red)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"key": key, "df": df}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return df
+
+def load_target_persons(filepath='data/standard_directory_persons.xlsx', sheetname='Person List', filter_red=False, delta=False,
+                        use_cache=True):
+    """
+    Read the person list and return the rows to process as a DataFrame.
+    With delta=True only rows not seen on an earlier delta run are filtered;
+    the rest come from the row cache (row_delta.py).
+    """
+    read = read_person_sheet_cached if use_cache else read_person_sheet
+    df = read(filepath, sheetname, filter_red)
+    if not delta:
+        return exclude_lod_rows(df)
+    cache = RowCache("01_target_persons", code_signature(__file__, extra=repr(list(df.columns))))
+    df_filtered = cache.run(df, exclude_lod_rows)
+    cache.save()
+    return df_filtered
+
+def get_target_persons(filepath='data/standard_directory_persons.xlsx', sheetname='Person List', filter_red=False, delta=False,
+                       use_cache=True):
+    df_filtered = load_target_persons(filepath, sheetname, filter_red, delta, use_cache)
 
     # Write to CSV in the data folder
     df_filtered.to_csv('data/target_persons.csv', index=False, encoding='utf-8-sig')
+    return df_filtered
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--filter-red', action='store_true', help='Only include rows with red "Researcher/Date" cells')
+    parser.add_argument('--delta', action='store_true', help='Only process rows that are new or changed since the last --delta run')
+    parser.add_argument('--no-cache', action='store_true', help=f'Re-read the workbook even if it is unchanged since the last run (cache: {SHEET_CACHE_DIR})')
     args = parser.parse_args()
-    get_target_persons(filter_red=args.filter_red)
+    get_target_persons(filter_red=args.filter_red, delta=args.delta, use_cache=not args.no_cache)
     print("target_persons.csv written to data folder.")
\ No newline at end of file
@@ -1,40 +1,70 @@
+import argparse
 import pandas as pd
 import numpy as np
 import re
 from datetime import datetime
 
-def process_date_columns(row):
-    handlebars_columns = {
-        'Birth Date': 'DoB Source URL',
-        'Death Date': 'DoD Source URL',
-        'Marriage Date': 'P26+P2562 Source URL'
-    }
-    brackets_columns = {
-        'Birth Date': 'DoB Source',
-        'Death Date': 'DoD (P570) Source',
-        'Marriage Date': 'P26+P2562 Source'
-    }
-    for col, target_col in handlebars_columns.items():
-        if pd.notna(row[col]) and isinstance(row[col], str):
-            matches = re.findall(r'\{\{(.*?)\}\}', row[col])
-            if matches:
-                row[col] = re.sub(r'\{\{.*?\}\}', '', row[col]).strip()
-                source_text = '; '.join(matches)
-                if pd.notna(row[target_col]) and row[target_col].strip():
-                    row[target_col] += '; ' + source_text
-                else:
-                    row[target_col] = source_text
-    for col, target_col in brackets_columns.items():
-        if pd.notna(row[col]) and isinstance(row[col], str):
-            matches = re.findall(r'\[\[(.*?)\]\]', row[col])
-            if matches:
-                row[col] = re.sub(r'\[\[.*?\]\]', '', row[col]).strip()
-                source_text = '; '.join(matches)
-                if pd.notna(row[target_col]) and row[target_col].strip():
-                    row[target_col] += '; ' + source_text
-                else:
-                    row[target_col] = source_text
-    return row
+from row_delta import RowCache, code_signature
+
+URL_MARKER = re.compile(r'\{\{(.*?)\}\}')
+SOURCE_MARKER = re.compile(r'\[\[(.*?)\]\]')
+
+# Inline markers moved into source columns, as (column, marker, target column), applied in order:
+# {{URL}} markers first, so a [[source]] inside a {{URL}} stays part of the URL
+DATE_MARKER_RULES = [
+    ('Birth Date', URL_MARKER, 'DoB Source URL'),
+    ('Death Date', URL_MARKER, 'DoD Source URL'),
+    ('Marriage Date', URL_MARKER, 'P26+P2562 Source URL'),
+    ('Birth Date', SOURCE_MARKER, 'DoB Source'),
+    ('Death Date', SOURCE_MARKER, 'DoD (P570) Source'),
+    ('Marriage Date', SOURCE_MARKER, 'P26+P2562 Source'),
+]
+PLACE_MARKER_RULES = [
+    ('Place of Birth (P19)', URL_MARKER, 'PoB Source URL'),
+    ('Place of Death', URL_MARKER, 'Place of Death Source URL'),
+    ('Place of Residence', URL_MARKER, 'Place of Residence Source URL'),
+    ('Place of Birth (P19)', SOURCE_MARKER, 'PoB Source'),
+    ('Place of Death', SOURCE_MARKER, 'Place of Death Source'),
+    ('Place of Residence', SOURCE_MARKER, 'Place of Residence Source'),
+]
+OCCUPATION_MARKER_RULES = [
+    ('Occupation', URL_MARKER, 'Occupation Source URL'),
+    ('Occupation', SOURCE_MARKER, 'Occupation Source'),
+]
+
+def move_markers(df, rules):
+    """
+    Apply (column, marker, target) rules column-wise: in every text cell of
+    column containing the marker, the marked texts are removed (and the cell
+    stripped) and added to target, joined with '; ' and after any text
+    already there.
+    """
+    for col, marker, target_col in rules:
+        values = df[col]
+        try:
+            found = values.str.findall(marker)
+        except AttributeError:  # no text cells in this column
+            continue
+        has_marker = found.str.len().gt(0).to_numpy()
+        if not has_marker.any():
+            continue
+        rows = np.flatnonzero(has_marker)
+        source_text = found[has_marker].str.join('; ').to_numpy(dtype=object)
+
+        cleaned = values.to_numpy(dtype=object, copy=True)
+        cleaned[rows] = values[has_marker].str.replace(marker, '', regex=True).str.strip().to_numpy(dtype=object)
+
+        target = df[target_col].to_numpy(dtype=object, copy=True)
+        existing = target[rows]
+        has_text = pd.Series(existing).map(lambda x: pd.notna(x) and x.strip() != '').to_numpy(dtype=bool)
+        merged = source_text.copy()
+        merged[has_text] = existing[has_text] + '; ' + source_text[has_text]
+        target[rows] = merged
+
+        df[col] = cleaned
+        df[target_col] = target
+    # Same column types as the row-wise apply this replaces
+    return df.infer_objects()
 
 def strip_whitespace_from_specific_columns(df):
     columns_to_clean = [
@@ -63,62 +93,17 @@ def fix_partial_date(date_str):
     except Exception:
         return None
 
-def process_place_columns(row):
-    handlebars_columns = {
-        'Place of Birth (P19)': 'PoB Source URL',
-        'Place of Death': 'Place of Death Source URL',
-        'Place of Residence': 'Place of Residence Source URL'
-    }
-    brackets_columns = {
-        'Place of Birth (P19)': 'PoB Source',
-        'Place of Death': 'Place of Death Source',
-        'Place of Residence': 'Place of Residence Source'
-    }
-    for col, target_col in handlebars_columns.items():
-        if pd.notna(row[col]) and isinstance(row[col], str):
-            matches = re.findall(r'\{\{(.*?)\}\}', row[col])
-            if matches:
-                row[col] = re.sub(r'\{\{.*?\}\}', '', row[col]).strip()
-                source_text = '; '.join(matches)
-                if pd.notna(row[target_col]) and row[target_col].strip():
-                    row[target_col] += '; ' + source_text
-                else:
-                    row[target_col] = source_text
-    for col, target_col in brackets_columns.items():
-        if pd.notna(row[col]) and isinstance(row[col], str):
-            matches = re.findall(r'\[\[(.*?)\]\]', row[col])
-            if matches:
-                row[col] = re.sub(r'\[\[.*?\]\]', '', row[col]).strip()
-                source_text = '; '.join(matches)
-                if pd.notna(row[target_col]) and row[target_col].strip():
-                    row[target_col] += '; ' + source_text
-                else:
-                    row[target_col] = source_text
-    return row
-
-def process_occupation_column(row):
-    handlebars_column = 'Occupation Source URL'
-    if pd.notna(row['Occupation']) and isinstance(row['Occupation'], str):
-        matches = re.findall(r'\{\{(.*?)\}\}', row['Occupation'])
-        if matches:
-            row['Occupation'] = re.sub(r'\{\{.*?\}\}', '', row['Occupation']).strip()
-            source_text = '; '.join(matches)
-            if pd.notna(row[handlebars_column]) and row[handlebars_column].strip():
-                row[handlebars_column] += '; ' + source_text
-            else:
-                row[handlebars_column] = source_text
-    if pd.notna(row['Occupation']) and isinstance(row['Occupation'], str):
-        matches = re.findall(r'\[\[(.*?)\]\]', row['Occupation'])
-        if matches:
-            row['Occupation'] = re.sub(r'\[\[.*?\]\]', '', row['Occupation']).strip()
-            source_text = '; '.join(matches)
-            if pd.notna(row['Occupation Source']) and row['Occupation Source'].strip():
-                row['Occupation Source'] += '; ' + source_text
-            else:
-                row['Occupation Source'] = source_text
-    return row
-
-def process_persons_dataframe(df_2):
+def fix_partial_dates(values):
+    """fix_partial_date over a column as text, keeping values it can't parse; each distinct value is parsed once."""
+    text = values.astype(str)
+    parsed = {}
+    for value in text.unique():
+        date = fix_partial_date(value)
+        parsed[value] = date if pd.notna(date) else value
+    return text.map(lambda x: parsed[x])
+
+def make_skeletal_dataframe(df_2):
+    """Clean the target persons and move inline {{URL}} / [[source]] notes into source columns."""
     # Remove sampling to include all rows
     df_persons = df_2.replace('', np.nan, regex=True)
     np.random.seed(1)
@@ -149,15 +134,13 @@ def process_persons_dataframe(df_2):
     df_persons['P26+P2562 Source URL'] = ''
 
     # Process date columns
-    df_persons = df_persons.apply(process_date_columns, axis=1)
+    df_persons = move_markers(df_persons, DATE_MARKER_RULES)
     df_persons = strip_whitespace_from_specific_columns(df_persons)
 
     # Handle partial dates
     date_columns = ['Birth Date', 'Death Date', 'Marriage Date']
     for col in date_columns:
-        df_persons[col] = df_persons[col].astype(str).apply(
-            lambda x: fix_partial_date(x) if pd.notna(fix_partial_date(x)) else x
-        )
+        df_persons[col] = fix_partial_dates(df_persons[col])
 
     # Place and occupation columns
     df_persons.rename(columns={
@@ -174,8 +157,7 @@ def process_persons_dataframe(df_2):
     df_persons['Place of Residence Source URL'] = ''
     df_persons['Occupation Source URL'] = ''
 
-    df_persons = df_persons.apply(process_place_columns, axis=1)
-    df_persons = df_persons.apply(process_occupation_column, axis=1)
+    df_persons = move_markers(df_persons, PLACE_MARKER_RULES + OCCUPATION_MARKER_RULES)
 
     columns_to_clean = [
         'Place of Birth (P19)', 'Place of Death', 'Place of Residence', 'Occupation',
@@ -186,12 +168,27 @@ def process_persons_dataframe(df_2):
         if col in df_persons.columns:
             df_persons[col] = df_persons[col].astype(str).str.strip()
 
+    return df_persons[['name', 'AltLastName', 'AltMiddleName', 'AltFirstName', 'Maiden Name', 'Title', 'Birth Date', 'DoB Source', 'DoB Source URL', 'Death Date', 'DoD (P570) Source', 'DoD Source URL', 'Marriage Date', 'P26+P2562 Source', 'P26+P2562 Source URL', 'Source for Dates', 'Place of Birth (P19)', 'PoB Source', 'PoB Source URL', 'Place of Death', 'Place of Death Source', 'Place of Death Source URL', 'Place of Residence', 'Place of Residence Source', 'Place of Residence Source URL', 'Source for Places', 'Occupation', 'Occupation Source', 'Occupation Source URL', 'Gender', 'LOD - WikiData']]
+
+def make_skeletal_dataframe_delta(df_2):
+    """make_skeletal_dataframe for only the rows that are new or changed since the last delta run."""
+    cache = RowCache("02_df_persons_skeletal", code_signature(__file__, extra=repr(list(df_2.columns))))
+    df_persons_skeletal = cache.run(df_2, make_skeletal_dataframe)
+    cache.save()
+    return df_persons_skeletal
+
+def process_persons_dataframe(df_2, delta=False):
+    df_persons_skeletal = make_skeletal_dataframe_delta(df_2) if delta else make_skeletal_dataframe(df_2)
+
     # Export skeletal DataFrame to the data folder
     output_path = 'data/df_persons_skeletal.csv'
-    df_persons_skeletal = df_persons[['name', 'AltLastName', 'AltMiddleName', 'AltFirstName', 'Maiden Name', 'Title', 'Birth Date', 'DoB Source', 'DoB Source URL', 'Death Date', 'DoD (P570) Source', 'DoD Source URL', 'Marriage Date', 'P26+P2562 Source', 'P26+P2562 Source URL', 'Source for Dates', 'Place of Birth (P19)', 'PoB Source', 'PoB Source URL', 'Place of Death', 'Place of Death Source', 'Place of Death Source URL', 'Place of Residence', 'Place of Residence Source', 'Place of Residence Source URL', 'Source for Places', 'Occupation', 'Occupation Source', 'Occupation Source URL', 'Gender', 'LOD - WikiData']]
     df_persons_skeletal.to_csv(output_path, index=False, encoding='utf-8-sig')
+    return df_persons_skeletal
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--delta', action='store_true', help='Only process rows that are new or changed since the last --delta run')
+    args = parser.parse_args()
     # Read target_persons.csv as df_2
     df_2 = pd.read_csv('data/target_persons.csv', encoding='utf-8-sig')
-    process_persons_dataframe(df_2)
\ No newline at end of file
+    process_persons_dataframe(df_2, delta=args.delta)
\ No newline at end of file
@@ -7,6 +7,10 @@ def get_unique_source_values(csv_path='data/df_persons_skeletal.csv'):
     from columns containing 'source' (case-insensitive) but not 'url'.
     """
     df = pd.read_csv(csv_path, encoding='utf-8-sig')
+    return unique_source_values(df)
+
+def unique_source_values(df):
+    """get_unique_source_values for a DataFrame already in memory."""
     source_cols = [
         col for col in df.columns
         if 'source' in col.lower() and 'url' not in col.lower()
@@ -17,9 +21,11 @@ def get_unique_source_values(csv_path='data/df_persons_skeletal.csv'):
     source_values = sorted({val.strip() for val in source_values if val.strip()})
     return source_values
 
+def write_unique_sources(unique_sources, path='data/unique_sources.txt'):
+    with open(path, 'w', encoding='utf-8') as f:
+        for source in unique_sources:
+            f.write(source + '\n')
+
 # Example usage:
 if __name__ == "__main__":
-    unique_sources = get_unique_source_values()
-    with open('data/unique_sources.txt', 'w', encoding='utf-8') as f:
-        for source in unique_sources:
-            f.write(source + '\n')
\ No newline at end of file
+    write_unique_sources(get_unique_source_values())
\ No newline at end of file
@@ -1,62 +1,47 @@
 # filepath: c:\Users\ch738340\OneDrive - University of Central Florida\Documents\CHDR\PRINT Project\data exploration\lccn script\04_lccn_from_openlib_then_loc.py
-import time
 import os
 import json
-import csv
+import argparse
+import logging
 import concurrent.futures
 import xml.etree.ElementTree as ET
 
-from get_lccn_from_title import get_lccn_from_title
-from retrieve_from_open_library_dump import find_best_title_match
+from circuit_breaker import CircuitBreaker
+from get_lccn_from_title import SRU_URL, get_lccn_from_title, get_lccns_from_titles_async, get_lccns_from_titles_batched
+from http_cache import ResponseCache
+from lookup_journal import JOURNAL_PATH, LookupJournal
+from ol_title_index import INDEX_PATH
+from resolver_cascade import ResolverCascade, default_backends
+from results_store import ResultsStore
+from retrieve_from_open_library_dump import DUMP_PATH, TitleLedgerCache, find_best_title_matches
+from shared_rate_limit import host_of, shared_limiter
+
+EXTRACT_PATH = os.path.join("data", "ol_editions_extract.parquet")
 
 def read_titles(filepath):
     with open(filepath, "r", encoding="utf-8") as f:
         return [line.strip() for line in f if line.strip()]
 
-def normalize(text):
-    import string
-    if not text:
-        return ""
-    return text.translate(str.maketrans('', '', string.punctuation)).strip().lower()
-
-def title_in_csv(title, csv_path):
-    """Check if a (normalized) title is already in the CSV."""
-    if not os.path.isfile(csv_path):
-        return False
-    norm_title = normalize(title)
-    with open(csv_path, "r", encoding="utf-8", newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            existing_title = row.get("Title", "")
-            if normalize(existing_title) == norm_title:
-                return True
-    return False
-
-def append_results_to_csv(results, csv_path):
-    fieldnames = ["Title", "LCCN", "Alt_LCCN", "OCLC", "Alt_OCLC", "Source"]
-    file_exists = os.path.isfile(csv_path)
-    with open(csv_path, "a", newline='', encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not file_exists or os.stat(csv_path).st_size == 0:
-            writer.writeheader()
-        for res in results:
-            writer.writerow({
-                "Title": res["title"],
-                "LCCN": res.get("lccn", "n/a"),
-                "Alt_LCCN": repr(res.get("alt_lccn", [])),
-                "OCLC": res.get("oclc", "n/a"),
-                "Alt_OCLC": repr(res.get("alt_oclc", [])),
-                "Source": res.get("source", "None")
-            })
-
-def get_lccn_with_timeout(title, timeout=10):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(get_lccn_from_title, title)
-        try:
-            return future.result(timeout=timeout)
-        except concurrent.futures.TimeoutError:
-            print("LOC search took too long (>10s), moving to Open Library...")
-            return None
+def get_lccn_with_timeout(title, executor, timeout=10, cache=None, verbose=True, breaker=None):
+    """
+    Run get_lccn_from_title on the shared executor. The request itself gets
+    connect/read timeouts, which are what bound the worker: a running request
+    cannot be cancelled, so it keeps its pool slot and socket until they fire
+    (the read timeout restarts with every chunk received). The caller stops
+    waiting a second after the timeout and moves on; repeated failures open
+    the circuit breaker, which makes later calls return at once.
+    Waits for the shared LOC budget before the clock starts, so time spent
+    behind other processes' requests does not count as a timeout.
+    Returns None if LOC timed out, failed to connect or the breaker is open.
+    """
+    shared_limiter().wait_until_ready(host_of(SRU_URL), verbose)
+    request_timeout = (min(5, timeout), timeout)
+    future = executor.submit(get_lccn_from_title, title, cache, verbose, request_timeout, breaker)
+    try:
+        return future.result(timeout=timeout + 1)
+    except concurrent.futures.TimeoutError:
+        print(f"LOC search took too long (>{timeout}s), moving on...")
+        return None
 
 def parse_xml_response(response):
     """Parse XML response to extract LCCN and other identifiers."""
@@ -76,33 +61,163 @@ def parse_xml_response(response):
         print(f"XML parsing error: {e}")
         return None
 
-def main():
-    titles = read_titles(os.path.join("data", "unique_sources.txt"))  # <-- updated filename here
+def search_open_library(titles, dump_path=DUMP_PATH, workers=None, extract_path=EXTRACT_PATH, ledger=None):
+    """
+    Match all titles against Open Library in one pass (the columnar extract if it
+    exists, otherwise the dump); returns title -> result dict for hits.
+    """
+    if not extract_path or not os.path.isfile(extract_path):
+        extract_path = None
+    if not titles or not (extract_path or os.path.isfile(dump_path)):
+        return {}
+    print(f"Searching Open Library for {len(titles)} titles in a single pass...")
+    ol_results = find_best_title_matches(titles, dump_path=dump_path, write_csv=False, workers=workers, extract_path=extract_path, ledger=ledger)
+    found = {}
+    for title, ol in ol_results.items():
+        # Ledger rows returned for already-searched titles have no "matches" key
+        if ol and "matches" in ol and ol.get("LCCN"):
+            found[title] = {
+                "lccn": ol["LCCN"],
+                "alt_lccn": ol["Alt_LCCN"],
+                "oclc": ol["OCLC"] or 'n/a',
+                "alt_oclc": ol["Alt_OCLC"],
+            }
+    return found
+
+def main(dump_path=DUMP_PATH, use_openlib=True, workers=None, extract_path=EXTRACT_PATH,
+         async_loc=False, concurrency=4, rate=0.5, use_cache=True, batch_loc=0, quiet=False,
+         loc_timeout=10, loc_workers=2, breaker_failures=5, breaker_cooldown=300, cascade=False, hedge_delay=2.0,
+         journal_path=JOURNAL_PATH, titles=None):
+    if titles is None:
+        titles = read_titles(os.path.join("data", "unique_sources.txt"))  # <-- updated filename here
     csv_path = os.path.join("data", "titles_lccn.csv")
-    results = []
+    cache = ResponseCache() if use_cache else None
+    # One pool and one breaker for the whole batch: after breaker_failures
+    # timeouts/errors in a row LOC is left alone for breaker_cooldown seconds
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=loc_workers)
+    breaker = CircuitBreaker("LOC SRU", failure_threshold=breaker_failures, cooldown=breaker_cooldown)
+    deferred = 0
+    resolver = None
+    if cascade:
+        backends = default_backends(cache=cache, breaker=breaker, extract_path=extract_path if use_openlib else None,
+                                    index_path=INDEX_PATH if use_openlib else None, loc_timeout=(min(5, loc_timeout), loc_timeout))
+        resolver = ResolverCascade(backends, hedge_delay=hedge_delay)
+    # The cascade looks titles up in the extract/index itself; without either, the batch dump pass still runs first
+    ol_in_cascade = resolver is not None and any(backend.name == "OpenLibrary" for backend in resolver.backends)
+    # Each result goes to the journal as soon as it is resolved. A run that
+    # died part way left its results there: they go into the store first, so
+    # their titles are skipped, and are carried into this run's outputs.
+    store = ResultsStore(legacy_csv=csv_path)
+    journal = LookupJournal(journal_path)
+    results = journal.replay()
+    if results:
+        print(f"Resuming: {len(results)} results recovered from {journal_path}")
+        store.upsert_many(results)
+    ledger = TitleLedgerCache(csv_path, store=store)
+    done = store.resolved(titles)
+    pending = [title for title in titles if title not in done]
+
+    def save(result):
+        results.append(result)
+        journal.append(result)
+
+    ol_found = search_open_library(pending, dump_path, workers, extract_path, ledger) if use_openlib and not ol_in_cascade else {}
+    loc_found = {}
+    if async_loc:
+        loc_titles = [title for title in pending if title not in ol_found]
+        print(f"Searching LOC for {len(loc_titles)} titles ({concurrency} concurrent, {rate} requests/second)...")
+        loc_found = get_lccns_from_titles_async(loc_titles, concurrency=concurrency, rate=rate, cache=cache, verbose=not quiet)
+    elif batch_loc:
+        loc_titles = [title for title in pending if title not in ol_found]
+        print(f"Searching LOC for {len(loc_titles)} titles, {batch_loc} per query...")
+        loc_found = get_lccns_from_titles_batched(loc_titles, batch_size=batch_loc, cache=cache, verbose=not quiet,
+                                                  timeout=(min(5, loc_timeout), loc_timeout), breaker=breaker)
+    prefetched = async_loc or batch_loc
     for idx, title in enumerate(titles, 1):
-        if title_in_csv(title, csv_path):
-            print(f"[{idx}/{len(titles)}] Skipping '{title}' (already in titles_lccn.csv)")
+        if title in done:
+            print(f"[{idx}/{len(titles)}] Skipping '{title}' (already resolved)")
             continue
-        print(f"\n[{idx}/{len(titles)}] Searching LOC for: {title}")
-
-        loc_result = get_lccn_with_timeout(title, timeout=10)
+        if title in ol_found:
+            print(f"[{idx}/{len(titles)}] Open Library LCCN found for '{title}': {ol_found[title]['lccn']}")
+            save({"title": title, "source": "OpenLibrary", **ol_found[title]})
+            continue
+        if resolver is not None:
+            print(f"\n[{idx}/{len(titles)}] Resolving: {title}")
+            resolved = resolver.resolve(title)
+            if resolved is None:
+                print(f"No source answered; leaving '{title}' for the next run.")
+                deferred += 1
+            else:
+                if resolved["lccn"]:
+                    print(f"{resolved['source']} LCCN found: {resolved['lccn']} (score {resolved['score']})")
+                else:
+                    print("No LCCN found in any source.")
+                save({key: value for key, value in resolved.items() if key != "score"})
+            continue
+        if prefetched:
+            print(f"\n[{idx}/{len(titles)}] LOC result for: {title}")
+            loc_result = loc_found.get(title)
+        else:
+            print(f"\n[{idx}/{len(titles)}] Searching LOC for: {title}")
+            loc_result = get_lccn_with_timeout(title, executor, timeout=loc_timeout, cache=cache, verbose=not quiet, breaker=breaker)
 
+        if loc_result is None:
+            # Timed out, short-circuited, answered with a 429/5xx or failed in the async client:
+            # leave the title out of the store so the next run retries it
+            print(f"LOC unavailable; leaving '{title}' for the next run.")
+            deferred += 1
+            continue
         if loc_result and loc_result.get("lccn") and loc_result["lccn"] != 'n/a':
             print(f"LOC LCCN found: {loc_result['lccn']}")
-            results.append({"title": title, "source": "LOC", **loc_result})
+            save({"title": title, "source": "LOC", **loc_result})
         else:
             print("No LCCN found in either source.")
-            results.append({"title": title, "source": "None", "lccn": "n/a", "alt_lccn": [], "oclc": "n/a", "alt_oclc": []})
-        time.sleep(10)
+            save({"title": title, "source": "None", "lccn": "n/a", "alt_lccn": [], "oclc": "n/a", "alt_oclc": []})
 
-    # Save results to JSON
+    executor.shutdown(wait=False, cancel_futures=True)
+    if resolver is not None:
+        resolver.print_stats()
+        resolver.save_stats()
+        resolver.close()
+    if cache:
+        print(f"HTTP cache: {cache.hits} hits, {cache.misses} misses")
+    if deferred:
+        print(f"{deferred} titles deferred because LOC timed out, failed or was paused ({breaker.short_circuited} requests skipped)")
+
+    # Compact the journal into the final outputs, then drop it
+    journal.sync()
+    store.upsert_many(results)
     os.makedirs("data", exist_ok=True)
     with open("data/lccn_results.json", "w", encoding="utf-8") as f:
         json.dump(results, f, indent=2, ensure_ascii=False)
-
-    # Append results to CSV
-    append_results_to_csv(results, csv_path)
+    # Write the full ledger (earlier runs included) for steps 05 and 06
+    count = store.export_csv(csv_path)
+    journal.compact()
+    print(f"{len(results)} titles resolved this run; {count} titles written to {csv_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dump-path', default=DUMP_PATH, help='Open Library editions dump to search before LOC')
+    parser.add_argument('--skip-openlib', action='store_true', help='Query LOC only')
+    parser.add_argument('--workers', type=int, default=None, help='Scan the dump in parallel shards with this many processes')
+    parser.add_argument('--extract-path', default=EXTRACT_PATH, help='Columnar Open Library extract, used instead of the dump when present')
+    parser.add_argument('--async-loc', action='store_true', help='Query LOC for the whole batch with the pooled async client')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent LOC requests in --async-loc mode')
+    parser.add_argument('--rate', type=float, default=0.5, help='LOC requests per second in --async-loc mode')
+    parser.add_argument('--batch-loc', type=int, default=0, metavar='N', help='Query LOC for N titles per SRU request')
+    parser.add_argument('--loc-timeout', type=float, default=10, help='Seconds to wait for one LOC lookup')
+    parser.add_argument('--loc-workers', type=int, default=2, help='Threads in the shared LOC worker pool')
+    parser.add_argument('--breaker-failures', type=int, default=5, help='Consecutive LOC failures before pausing LOC requests')
+    parser.add_argument('--breaker-cooldown', type=float, default=300, help='Seconds to pause LOC requests after repeated failures')
+    parser.add_argument('--cascade', action='store_true', help='Resolve each title through the local-then-remote backend cascade')
+    parser.add_argument('--hedge-delay', type=float, default=2.0, help='Seconds before a slow remote lookup is hedged in --cascade mode')
+    parser.add_argument('--quiet', action='store_true', help='Log LOC diagnostics instead of printing every response; keep raw responses only on failure')
+    parser.add_argument('--no-cache', action='store_true', help='Always query LOC instead of reusing cached responses')
+    args = parser.parse_args()
+    if args.quiet:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    main(dump_path=args.dump_path, use_openlib=not args.skip_openlib, workers=args.workers, extract_path=args.extract_path,
+         async_loc=args.async_loc, concurrency=args.concurrency, rate=args.rate, use_cache=not args.no_cache,
+         batch_loc=args.batch_loc, quiet=args.quiet, loc_timeout=args.loc_timeout, loc_workers=args.loc_workers,
+         breaker_failures=args.breaker_failures, breaker_cooldown=args.breaker_cooldown, cascade=args.cascade,
+         hedge_delay=args.hedge_delay)
\ No newline at end of file
@@ -1,15 +1,8 @@
+import argparse
 import pandas as pd
 import ast
 
-# Load data
-df = pd.read_csv('data/df_persons_skeletal.csv', encoding='utf-8-sig')
-titles_lccn = pd.read_csv('data/titles_lccn.csv', encoding='utf-8-sig')
-
-# Build lookup dictionaries for fast access
-title_to_lccn = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['LCCN']))
-title_to_alt_lccn = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['Alt_LCCN']))
-title_to_oclc = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['OCLC']))
-title_to_alt_oclc = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['Alt_OCLC']))
+from row_delta import RowCache, code_signature
 
 # Function to safely parse string representations of lists
 def safe_parse_list(list_str):
@@ -24,32 +17,75 @@ def safe_parse_list(list_str):
     except (ValueError, SyntaxError):
         return ''
 
-# Identify all columns that may contain titles (those with 'Source' in the name, but not 'URL')
-title_columns = [col for col in df.columns if 'source' in col.lower() and 'url' not in col.lower()]
-
-for col in title_columns:
-    # Create column names
-    lccn_col = f"{col} LCCN"
-    alt_lccn_col = f"{col} Alt_LCCN"
-    oclc_col = f"{col} OCLC"
-    alt_oclc_col = f"{col} Alt_OCLC"
-    
-    # Map titles to their identifiers
-    df[lccn_col] = df[col].astype(str).str.strip().map(title_to_lccn).fillna('')
-    
-    # Handle list columns with special parsing
-    df[alt_lccn_col] = df[col].astype(str).str.strip().map(
-        lambda x: title_to_alt_lccn.get(x, '') if x in title_to_alt_lccn else ''
-    )
-    df[alt_lccn_col] = df[alt_lccn_col].apply(safe_parse_list)
-    
-    df[oclc_col] = df[col].astype(str).str.strip().map(title_to_oclc).fillna('')
-    
-    df[alt_oclc_col] = df[col].astype(str).str.strip().map(
-        lambda x: title_to_alt_oclc.get(x, '') if x in title_to_alt_oclc else ''
-    )
-    df[alt_oclc_col] = df[alt_oclc_col].apply(safe_parse_list)
-
-# Save the updated DataFrame
-df.to_csv('data/df_persons_skeletal_with_lccn.csv', index=False, encoding='utf-8-sig')
-print("LCCN, Alt_LCCN, OCLC, and Alt_OCLC columns added and saved to data/df_persons_skeletal_with_lccn.csv")
\ No newline at end of file
+def add_lccns(df, titles_lccn):
+    """Add LCCN, Alt_LCCN, OCLC and Alt_OCLC columns for every source column of df."""
+    # Build lookup dictionaries for fast access
+    title_to_lccn = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['LCCN']))
+    title_to_alt_lccn = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['Alt_LCCN']))
+    title_to_oclc = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['OCLC']))
+    title_to_alt_oclc = dict(zip(titles_lccn['Title'].astype(str).str.strip(), titles_lccn['Alt_OCLC']))
+
+    # Identify all columns that may contain titles (those with 'Source' in the name, but not 'URL')
+    title_columns = [col for col in df.columns if 'source' in col.lower() and 'url' not in col.lower()]
+
+    for col in title_columns:
+        # Create column names
+        lccn_col = f"{col} LCCN"
+        alt_lccn_col = f"{col} Alt_LCCN"
+        oclc_col = f"{col} OCLC"
+        alt_oclc_col = f"{col} Alt_OCLC"
+        
+        # Map titles to their identifiers
+        df[lccn_col] = df[col].astype(str).str.strip().map(title_to_lccn).fillna('')
+        
+        # Handle list columns with special parsing
+        df[alt_lccn_col] = df[col].astype(str).str.strip().map(
+            lambda x: title_to_alt_lccn.get(x, '') if x in title_to_alt_lccn else ''
+        )
+        df[alt_lccn_col] = df[alt_lccn_col].apply(safe_parse_list)
+        
+        df[oclc_col] = df[col].astype(str).str.strip().map(title_to_oclc).fillna('')
+        
+        df[alt_oclc_col] = df[col].astype(str).str.strip().map(
+            lambda x: title_to_alt_oclc.get(x, '') if x in title_to_alt_oclc else ''
+        )
+        df[alt_oclc_col] = df[alt_oclc_col].apply(safe_parse_list)
+    return df
+
+def title_identifiers(titles_lccn):
+    """Title -> (LCCN, Alt_LCCN, OCLC, Alt_OCLC) as add_lccns looks them up (the last row for a title wins)."""
+    columns = [titles_lccn[col].astype(str) for col in ('LCCN', 'Alt_LCCN', 'OCLC', 'Alt_OCLC')]
+    return dict(zip(titles_lccn['Title'].astype(str).str.strip(), zip(*columns)))
+
+def add_lccns_delta(df, titles_lccn):
+    """
+    add_lccns for only the rows that are new or changed since the last delta
+    run, plus cached rows citing a title whose identifiers have changed.
+    """
+    cache = RowCache("05_df_persons_skeletal_with_lccn", code_signature(__file__, extra=repr(list(df.columns))))
+    current = title_identifiers(titles_lccn)
+    previous = cache.extra.get("titles", {})
+    changed = {title for title in current.keys() | previous.keys() if current.get(title) != previous.get(title)}
+    stale = []
+    if changed and cache.outputs is not None and len(cache.outputs):
+        title_columns = [col for col in df.columns if 'source' in col.lower() and 'url' not in col.lower()]
+        cites_changed = cache.outputs[title_columns].apply(lambda col: col.astype(str).str.strip().isin(changed)).any(axis=1)
+        stale = cache.outputs.index[cites_changed]
+    df = cache.run(df, lambda rows: add_lccns(rows.copy(), titles_lccn), stale)
+    cache.extra["titles"] = current
+    cache.save()
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--delta', action='store_true', help='Only process rows that are new or changed since the last --delta run')
+    args = parser.parse_args()
+    # Load data
+    df = pd.read_csv('data/df_persons_skeletal.csv', encoding='utf-8-sig')
+    titles_lccn = pd.read_csv('data/titles_lccn.csv', encoding='utf-8-sig')
+
+    df = add_lccns_delta(df, titles_lccn) if args.delta else add_lccns(df, titles_lccn)
+
+    # Save the updated DataFrame
+    df.to_csv('data/df_persons_skeletal_with_lccn.csv', index=False, encoding='utf-8-sig')
+    print("LCCN, Alt_LCCN, OCLC, and Alt_OCLC columns added and saved to data/df_persons_skeletal_with_lccn.csv")
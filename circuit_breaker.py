@@ -0,0 +1,83 @@
+import functools
+import threading
+import time
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the breaker is open."""
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service. After failure_threshold consecutive
+    failures the breaker opens and allow() returns False for cooldown seconds;
+    then one trial call is let through (half-open). A success closes the
+    breaker again; a failure reopens it for another cooldown.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, failure_threshold=5, cooldown=300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may be made now."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                print(f"{self.name}: cool-down over, sending a trial request")
+                return True
+            if self.state == self.CLOSED:
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"{self.name}: trial request succeeded, resuming")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"{self.name}: {self.failures} consecutive failures, pausing requests for {self.cooldown} seconds")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def remaining_cooldown(self):
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def guard(self, get):
+        """
+        Wrap a requests-style get: raises CircuitOpenError while open, and
+        counts exceptions (timeouts, connection errors), 429s and 5xx responses as failures.
+        """
+        @functools.wraps(get)
+        def guarded(*args, **kwargs):
+            if not self.allow():
+                raise CircuitOpenError(f"{self.name} is paused for {self.remaining_cooldown():.0f} more seconds")
+            try:
+                response = get(*args, **kwargs)
+            except Exception:
+                self.record_failure()
+                raise
+            if response.status_code == 429 or response.status_code >= 500:
+                self.record_failure()
+            else:
+                self.record_success()
+            return response
+        return guarded
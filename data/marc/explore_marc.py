@@ -1,6 +1,9 @@
+import os
 import sys
 from pymarc import MARCReader
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
 def normalize(text):
     return text.lower().strip() if text else ""
 
@@ -9,8 +12,19 @@ if len(sys.argv) < 2:
     sys.exit(1)
 
 search_title = normalize(sys.argv[1])
+marc_path = 'BooksAll.2016.combined.utf8'
+
+if os.path.exists(marc_path + '.idx.sqlite'):
+    # Seek straight to the records whose normalized title matches (python marc_index.py build)
+    from marc_index import find_by_title, print_record, read_marc_record
+    rows = find_by_title(sys.argv[1], marc_path + '.idx.sqlite', exact=True)
+    for row in rows:
+        print_record(read_marc_record(marc_path, row["offset"], row["length"]), row)
+    if not rows:
+        print(f"No records found with title: {search_title}")
+    sys.exit(0)
 
-with open('BooksAll.2016.combined.utf8', 'rb') as fh:
+with open(marc_path, 'rb') as fh:
     reader = MARCReader(fh, to_unicode=True, force_utf8=True)
     found = False
     for i, record in enumerate(reader):
@@ -29,4 +43,4 @@ with open('BooksAll.2016.combined.utf8', 'rb') as fh:
             print()
             found = True
     if not found:
-        print(f"No records found with title: {search_title}")
\ No newline at end of file
+        print(f"No records found with title: {search_title}")
@@ -5,198 +5,527 @@ from rapidfuzz import fuzz
 import re
 import urllib.parse
 import xml.etree.ElementTree as ET  # Add this import for XML parsing
+import asyncio
+import hashlib
+import io
+import logging
+import random
+import time
+
+from circuit_breaker import CircuitOpenError
+from http_cache import ResponseCache, cached_get
+from shared_rate_limit import host_of, retry_after_seconds, shared_limiter
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:  # optional: only needed for the async batch client
+    aiohttp = yarl = None
+
+# LOC_SRU_URL points the lookups elsewhere, e.g. at mock_services.py for load tests
+SRU_URL = os.environ.get("LOC_SRU_URL", "http://lx2.loc.gov:210/lcdb")
+RAW_RESPONSE_DIR = "data/raw_responses"
+# (connect, read) seconds for requests; the read timeout applies between bytes
+LOC_TIMEOUT = (5, 10)
+
+logger = logging.getLogger(__name__)
 
 # Add the missing function
-def parse_xml_response(response):
+def parse_xml_response(response, verbose=True):
     """Parse XML response to extract LCCN and other identifiers."""
+    return parse_xml_text(response.text, verbose)
+
+SRU_NAMESPACES = {
+    'zs': 'http://www.loc.gov/zing/srw/',
+    'mods': 'http://www.loc.gov/mods/v3'
+}
+
+SRU_RECORDS_TAG = f"{{{SRU_NAMESPACES['zs']}}}records"
+SRU_RECORD_TAG = f"{{{SRU_NAMESPACES['zs']}}}record"
+SRU_TOTAL_TAG = f"{{{SRU_NAMESPACES['zs']}}}numberOfRecords"
+
+def iter_mods_records(text):
+    """
+    Stream an SRU searchRetrieve response and yield one dict per MODS record
+    with its titles, first subtitle, LCCNs, OCLCs and LC classifications.
+    Each record element is dropped once read, so only one is held in memory.
+    The numberOfRecords value is yielded first as an int. Raises ET.ParseError
+    on bad XML.
+    """
+    parent = None
+    for event, elem in ET.iterparse(io.StringIO(text), events=("start", "end")):
+        if event == "start":
+            if elem.tag == SRU_RECORDS_TAG:
+                parent = elem
+            continue
+        if elem.tag == SRU_TOTAL_TAG:
+            yield int(elem.text) if (elem.text or "").strip().isdigit() else None
+        elif elem.tag == SRU_RECORD_TAG:
+            subtitle = elem.find('.//mods:titleInfo/mods:subTitle', SRU_NAMESPACES)
+            yield {
+                "titles": [e.text for e in elem.findall('.//mods:titleInfo/mods:title', SRU_NAMESPACES)],
+                "subtitle": subtitle.text if subtitle is not None else None,
+                "lccns": [e.text for e in elem.findall('.//mods:identifier[@type="lccn"]', SRU_NAMESPACES)],
+                "oclcs": [e.text for e in elem.findall('.//mods:identifier[@type="oclc"]', SRU_NAMESPACES)],
+                "lcc": [e.text for e in elem.findall('.//mods:classification[@authority="lcc"]', SRU_NAMESPACES)],
+            }
+            elem.clear()
+            if parent is not None:
+                parent.remove(elem)
+
+def parse_mods_records(text):
+    """Parse an SRU response with iter_mods_records. Returns (records, number_of_records)."""
+    total = None
+    records = []
+    for item in iter_mods_records(text):
+        if isinstance(item, dict):
+            records.append(item)
+        elif item is not None:
+            total = item
+    return records, total if total is not None else len(records)
+
+def _report(verbose, level, message, *args):
+    """Print a diagnostic in verbose mode, otherwise send it to the module logger at level."""
+    if verbose:
+        print(message % args if args else message)
+    else:
+        logger.log(level, message, *args)
+
+def save_raw_response(title, text, directory=RAW_RESPONSE_DIR):
+    """Keep a failed response for inspection in its own file, named after the title."""
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r'\W+', '_', title.strip().lower()).strip('_')[:60]
+    digest = hashlib.sha1(title.encode("utf-8")).hexdigest()[:8]
+    path = os.path.join(directory, f"{slug}_{digest}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+def parse_xml_text(text, verbose=True):
+    """Parse an SRU/MODS XML document to extract LCCN and other identifiers."""
     try:
-        # Parse the XML while preserving namespaces
-        root = ET.fromstring(response.text)
-        
-        # Register namespaces needed for XPath
-        namespaces = {
-            'zs': 'http://www.loc.gov/zing/srw/',
-            'mods': 'http://www.loc.gov/mods/v3'
-        }
-        
-        # Find all records
-        records = root.findall('.//zs:record', namespaces)
-        print(f"Found {len(records)} records in response")
-        
-        all_titles = []
-        all_lccns = []
-        all_oclcs = []
-        
+        records, _ = parse_mods_records(text)
+    except ET.ParseError as e:
+        _report(verbose, logging.WARNING, "XML parsing error: %s", e)
+        return None
+
+    _report(verbose, logging.DEBUG, "Found %d records in response", len(records))
+    if verbose:
         # Process each record
         for i, record in enumerate(records, 1):
             print(f"\n--- Record {i} ---")
-            
-            # Find title elements using proper namespace
-            title_elements = record.findall('.//mods:titleInfo/mods:title', namespaces)
-            if title_elements:
-                for elem in title_elements:
-                    title_text = elem.text
-                    all_titles.append(title_text)
-                    print(f"Title: {title_text}")
-                    
-                    # Check for subtitles
-                    subtitle = record.find('.//mods:titleInfo/mods:subTitle', namespaces)
-                    if subtitle is not None and subtitle.text:
-                        print(f"Subtitle: {subtitle.text}")
-            
-            # Find LCCN identifiers using proper namespace
-            lccn_elements = record.findall('.//mods:identifier[@type="lccn"]', namespaces)
-            if lccn_elements:
-                for elem in lccn_elements:
-                    lccn_text = elem.text
-                    all_lccns.append(lccn_text)
-                    print(f"LCCN: {lccn_text}")
-            
-            # Find OCLC identifiers using proper namespace
-            oclc_elements = record.findall('.//mods:identifier[@type="oclc"]', namespaces)
-            if oclc_elements:
-                for elem in oclc_elements:
-                    oclc_text = elem.text
-                    all_oclcs.append(oclc_text)
-                    print(f"OCLC: {oclc_text}")
-            
+            for title_text in record["titles"]:
+                print(f"Title: {title_text}")
+                if record["subtitle"]:
+                    print(f"Subtitle: {record['subtitle']}")
+            for lccn_text in record["lccns"]:
+                print(f"LCCN: {lccn_text}")
+            for oclc_text in record["oclcs"]:
+                print(f"OCLC: {oclc_text}")
             # Also check for classification codes, which can be useful
-            class_elements = record.findall('.//mods:classification[@authority="lcc"]', namespaces)
-            if class_elements:
-                for elem in class_elements:
-                    print(f"LC Classification: {elem.text}")
-        
-        # Return the first LCCN if any were found, otherwise n/a
-        return {
-            "lccn": all_lccns[0] if all_lccns else 'n/a',
-            "alt_lccn": all_lccns[1:],
-            "oclc": all_oclcs[0] if all_oclcs else 'n/a',
-            "alt_oclc": all_oclcs[1:],
-        }
-    except ET.ParseError as e:
-        print(f"XML parsing error: {e}")
-        return None
+            for lcc in record["lcc"]:
+                print(f"LC Classification: {lcc}")
+
+    # Return the first LCCN if any were found, otherwise n/a
+    return result_from_records(records)
 
-def get_lccn_from_title(title):
+def result_from_records(records):
+    """Result dict from MODS records: first LCCN/OCLC plus the rest as alternates, in record order."""
+    all_lccns = [lccn for record in records for lccn in record["lccns"]]
+    all_oclcs = [oclc for record in records for oclc in record["oclcs"]]
+    return {
+        "lccn": all_lccns[0] if all_lccns else 'n/a',
+        "alt_lccn": all_lccns[1:],
+        "oclc": all_oclcs[0] if all_oclcs else 'n/a',
+        "alt_oclc": all_oclcs[1:],
+    }
+
+def build_sru_url(title, base_url=SRU_URL):
     encoded_title = urllib.parse.quote(title)
-    url = f"http://lx2.loc.gov:210/lcdb?version=1.1&operation=searchRetrieve&query=dc.title={encoded_title}&startRecord=1&maximumRecords=5&recordSchema=mods&fo=json"
+    return f"{base_url}?version=1.1&operation=searchRetrieve&query=dc.title={encoded_title}&startRecord=1&maximumRecords=5&recordSchema=mods&fo=json"
+
+def get_lccn_from_title(title, cache=None, verbose=True, timeout=LOC_TIMEOUT, breaker=None):
+    """
+    Look up a title on the LOC SRU endpoint. verbose=True prints the headers,
+    a preview and every record, and saves the body to data/raw_response.txt;
+    verbose=False logs through the module logger and keeps the body (under
+    data/raw_responses/) only when the request or parsing fails.
+    Returns None when LOC gave no answer (timeout, connection error or a
+    non-200 status such as a 429 or 5xx) so callers can retry later. With a
+    CircuitBreaker, those errors, 429s and 5xx responses count as failures,
+    and None is returned without a request while it is open.
+    """
+    url = build_sru_url(title)
+    get = shared_limiter().wrap(requests.get)
+    if breaker is not None:
+        get = breaker.guard(get)
     
     try:
-        response = requests.get(url)
-        
-        # Print the complete headers
-        print("\n--- Response Headers ---")
-        for header, value in response.headers.items():
-            print(f"{header}: {value}")
-        print("--- End Headers ---\n")
-        
-        print(f"Status code: {response.status_code}")
-        
-        # Print first part of the response
-        print("\n--- Response Content Preview ---")
-        print(response.text[:500] + "..." if len(response.text) > 500 else response.text)
-        print("--- End Preview ---\n")
+        response = cached_get(url, cache=cache, get=get, timeout=timeout)
         
-        # Save full response for inspection
-        os.makedirs("data", exist_ok=True)
-        with open("data/raw_response.txt", "w", encoding="utf-8") as f:
-            f.write(response.text)
-        
-        # Try JSON parsing first
-        try:
-            data = response.json()
-            # Continue with JSON processing...
-        except json.JSONDecodeError:
-            print("Response is not valid JSON. Attempting XML parsing...")
-            # Try parsing as XML using your existing function
-            xml_result = parse_xml_response(response)
-            if xml_result:
-                return xml_result
-            else:
-                print("XML parsing also failed. See data/raw_response.txt for details.")
-                return {"lccn": 'n/a', "alt_lccn": [], "oclc": 'n/a', "alt_oclc": []}
+        if verbose:
+            # Print the complete headers
+            print("\n--- Response Headers ---")
+            for header, value in response.headers.items():
+                print(f"{header}: {value}")
+            print("--- End Headers ---\n")
+            
+            print(f"Status code: {response.status_code}")
+            
+            # Print first part of the response
+            print("\n--- Response Content Preview ---")
+            print(response.text[:500] + "..." if len(response.text) > 500 else response.text)
+            print("--- End Preview ---\n")
+            
+            # Save full response for inspection
+            os.makedirs("data", exist_ok=True)
+            with open("data/raw_response.txt", "w", encoding="utf-8") as f:
+                f.write(response.text)
+            if response.status_code != 200:
+                print(f"HTTP error {response.status_code} for '{title}'; leaving it for a later run.")
+                return None
+        else:
+            logger.debug("LOC SRU status %s for '%s' (%d chars)", response.status_code, title, len(response.text))
+            if response.status_code != 200:
+                path = save_raw_response(title, response.text)
+                logger.warning("HTTP error %s for '%s'; response saved to %s", response.status_code, title, path)
+                return None
         
-        results = data.get("results", [])
-
-        threshold = 80
-        matches = []
-        input_len = len(title.strip())
-        for record in results:
-            candidate_titles = []
-            if "title" in record and isinstance(record["title"], str):
-                candidate_titles.append(record["title"])
-            if isinstance(record.get("item"), dict) and "title" in record["item"]:
-                candidate_titles.append(record["item"]["title"])
-
-            record_lccn = record.get("number_lccn", [])
-            record_oclc = record.get("number_oclc", [])
-
-            for candidate_title in candidate_titles:
-                #print(f"DEBUG candidate title: '{candidate_title}'")
-                norm_input = normalize(title)
-                norm_candidate = normalize(candidate_title)
-                # Print normalized strings for debugging
-                #print(f"DEBUG norm_input: '{norm_input}', norm_candidate: '{norm_candidate}'")
-                # Compare input to the start of the normalized candidate title
-                score = fuzz.ratio(norm_input, norm_candidate[:len(norm_input)])
-                #print(f"DEBUG score for '{candidate_title}': {score}")
-                if score >= threshold:
-                    matches.append({
-                        "score": score,
-                        "title": candidate_title,
-                        "number_lccn": record_lccn,
-                        "number_oclc": record_oclc
-                    })
-
-        if matches:
-            # Sort matches by score descending
-            matches.sort(key=lambda x: x["score"], reverse=True)
-            #print("DEBUG: All matches and their LCCNs:")
-            #for m in matches:
-                #print(f"  Title: {m['title']}, LCCN: {m['number_lccn']}, Score: {m['score']}")
-            best = matches[0]
-            alt_lccn = []
-            alt_oclc = []
-            # Collect alternate LCCNs/OCLCs from other matches
-            for m in matches[1:]:
-                alt_lccn.extend([l for l in m.get("number_lccn", []) if l not in alt_lccn and l not in best.get("number_lccn", [])])
-                alt_oclc.extend([o for o in m.get("number_oclc", []) if o not in alt_oclc and o not in best.get("number_oclc", [])])
-            lccn_list = best.get("number_lccn", [])
-            oclc_list = best.get("number_oclc", [])
-            lccn = lccn_list[0] if lccn_list else 'n/a'
-            oclc = oclc_list[0] if oclc_list else 'n/a'
-            return {
-                "lccn": lccn,
-                "alt_lccn": alt_lccn,
-                "oclc": oclc,
-                "alt_oclc": alt_oclc
-            }
-        return {
-            "lccn": 'n/a',
-            "alt_lccn": [],
-            "oclc": 'n/a',
-            "alt_oclc": []
-        }
+        return parse_lccn_response(title, response.text, verbose)
+    except CircuitOpenError:
+        return None
+    except requests.RequestException as e:
+        _report(verbose, logging.ERROR, "Error: %s", e)
+        return None
     except Exception as e:
-        print(f"Error: {e}")
+        _report(verbose, logging.ERROR, "Error: %s", e)
+        return empty_result()
+
+def empty_result():
+    return {
+        "lccn": 'n/a',
+        "alt_lccn": [],
+        "oclc": 'n/a',
+        "alt_oclc": []
+    }
+
+def parse_lccn_response(title, text, verbose=True):
+    """Turn an SRU response body (JSON or MODS XML) into an LCCN/OCLC result dict."""
+    # Try JSON parsing first
+    try:
+        data = json.loads(text)
+        # Continue with JSON processing...
+    except json.JSONDecodeError:
+        _report(verbose, logging.DEBUG, "Response is not valid JSON. Attempting XML parsing...")
+        # Try parsing as XML using your existing function
+        xml_result = parse_xml_text(text, verbose)
+        if xml_result:
+            return xml_result
+        elif verbose:
+            print("XML parsing also failed. See data/raw_response.txt for details.")
+        else:
+            logger.warning("XML parsing also failed for '%s'; response saved to %s", title, save_raw_response(title, text))
+        return empty_result()
+    return match_json_results(title, data)
+
+def match_json_results(title, data):
+    results = data.get("results", [])
+
+    threshold = 80
+    matches = []
+    input_len = len(title.strip())
+    for record in results:
+        candidate_titles = []
+        if "title" in record and isinstance(record["title"], str):
+            candidate_titles.append(record["title"])
+        if isinstance(record.get("item"), dict) and "title" in record["item"]:
+            candidate_titles.append(record["item"]["title"])
+
+        record_lccn = record.get("number_lccn", [])
+        record_oclc = record.get("number_oclc", [])
+
+        for candidate_title in candidate_titles:
+            #print(f"DEBUG candidate title: '{candidate_title}'")
+            norm_input = normalize(title)
+            norm_candidate = normalize(candidate_title)
+            # Print normalized strings for debugging
+            #print(f"DEBUG norm_input: '{norm_input}', norm_candidate: '{norm_candidate}'")
+            # Compare input to the start of the normalized candidate title
+            score = fuzz.ratio(norm_input, norm_candidate[:len(norm_input)])
+            #print(f"DEBUG score for '{candidate_title}': {score}")
+            if score >= threshold:
+                matches.append({
+                    "score": score,
+                    "title": candidate_title,
+                    "number_lccn": record_lccn,
+                    "number_oclc": record_oclc
+                })
+
+    if matches:
+        # Sort matches by score descending
+        matches.sort(key=lambda x: x["score"], reverse=True)
+        #print("DEBUG: All matches and their LCCNs:")
+        #for m in matches:
+            #print(f"  Title: {m['title']}, LCCN: {m['number_lccn']}, Score: {m['score']}")
+        best = matches[0]
+        alt_lccn = []
+        alt_oclc = []
+        # Collect alternate LCCNs/OCLCs from other matches
+        for m in matches[1:]:
+            alt_lccn.extend([l for l in m.get("number_lccn", []) if l not in alt_lccn and l not in best.get("number_lccn", [])])
+            alt_oclc.extend([o for o in m.get("number_oclc", []) if o not in alt_oclc and o not in best.get("number_oclc", [])])
+        lccn_list = best.get("number_lccn", [])
+        oclc_list = best.get("number_oclc", [])
+        lccn = lccn_list[0] if lccn_list else 'n/a'
+        oclc = oclc_list[0] if oclc_list else 'n/a'
         return {
-            "lccn": 'n/a',
-            "alt_lccn": [],
-            "oclc": 'n/a',
-            "alt_oclc": []
+            "lccn": lccn,
+            "alt_lccn": alt_lccn,
+            "oclc": oclc,
+            "alt_oclc": alt_oclc
         }
+    return empty_result()
 
 def normalize(s):
     # Lowercase, remove punctuation, collapse whitespace
     return re.sub(r'\W+', '', s.strip().lower())
 
+def cql_quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def build_batch_cql(titles):
+    """One CQL query matching any of the titles (all words of each, in any order)."""
+    return " or ".join(f"dc.title all {cql_quote(title)}" for title in titles)
+
+def build_batch_sru_url(titles, records_per_title=5, base_url=SRU_URL):
+    query = urllib.parse.quote(build_batch_cql(titles))
+    maximum = records_per_title * len(titles)
+    return f"{base_url}?version=1.1&operation=searchRetrieve&query={query}&startRecord=1&maximumRecords={maximum}&recordSchema=mods"
+
+def record_title_score(title, record):
+    """Best score of a MODS record's titles against an input title, using the JSON-path comparison."""
+    norm_input = normalize(title)
+    candidates = [t for t in record["titles"] if t]
+    if record["subtitle"]:
+        candidates += [f"{t} {record['subtitle']}" for t in candidates]
+    # Compare input to the start of the normalized candidate title
+    return max((fuzz.ratio(norm_input, normalize(c)[:len(norm_input)]) for c in candidates), default=0)
+
+def assign_records_to_titles(titles, records, threshold=80):
+    """
+    Map each record of a batched response to the input title it matches best.
+    Returns (assigned, ambiguous): assigned maps title -> [(score, record)], and
+    ambiguous holds titles that tie for the best score on some record.
+    """
+    assigned = {title: [] for title in titles}
+    ambiguous = set()
+    for record in records:
+        scores = [(record_title_score(title, record), title) for title in titles]
+        best = max(score for score, _ in scores)
+        if best < threshold:
+            continue
+        winners = [title for score, title in scores if score == best]
+        if len(winners) > 1:
+            ambiguous.update(winners)
+            continue
+        assigned[winners[0]].append((best, record))
+    return assigned, ambiguous
+
+def get_lccns_from_titles_batched(titles, batch_size=5, records_per_title=5, cache=None, delay=0, base_url=SRU_URL, verbose=True,
+                                  timeout=LOC_TIMEOUT, breaker=None):
+    """
+    Resolve titles with one SRU request per batch_size titles. Each returned
+    MODS record is assigned to the title it matches best; a title falls back
+    to its own get_lccn_from_title query when its batch is ambiguous: the
+    request failed, a record tied between titles, or the result set was
+    truncated and the title got no records. Returns a dict of title -> result;
+    titles skipped while the breaker is open, or whose single query got no
+    answer or a non-200 status, map to None.
+    """
+    get = shared_limiter().wrap(requests.get)
+    if breaker is not None:
+        get = breaker.guard(get)
+    titles = list(dict.fromkeys(titles))
+    results = {}
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start:start + batch_size]
+        url = build_batch_sru_url(batch, records_per_title, base_url)
+        fallback = set(batch)
+        try:
+            response = cached_get(url, cache=cache, get=get, timeout=timeout)
+            from_cache = getattr(response, "from_cache", False)
+            if response.status_code == 200:
+                records, total = parse_mods_records(response.text)
+                assigned, ambiguous = assign_records_to_titles(batch, records)
+                truncated = total > len(records)
+                fallback = {title for title in batch if title in ambiguous or (truncated and not assigned[title])}
+                for title in batch:
+                    if title not in fallback:
+                        ranked = sorted(assigned[title], key=lambda pair: pair[0], reverse=True)
+                        results[title] = result_from_records([record for _, record in ranked])
+            else:
+                _report(verbose, logging.WARNING, "HTTP error %s for batch starting with '%s'", response.status_code, batch[0])
+        except CircuitOpenError:
+            results.update(dict.fromkeys(batch))
+            continue
+        except Exception as e:
+            from_cache = False
+            _report(verbose, logging.WARNING, "Batch query failed: %s", e)
+        _report(verbose, logging.INFO, "Batch of %d titles: %d resolved, %d sent as single queries",
+                len(batch), len(batch) - len(fallback), len(fallback))
+        if delay and not from_cache:
+            time.sleep(delay)
+        for title in batch:
+            if title in fallback:
+                results[title] = get_lccn_from_title(title, cache=cache, verbose=verbose, timeout=timeout, breaker=breaker)
+                if delay and results[title] is not None:
+                    time.sleep(delay)
+    return results
+
+class TokenBucket:
+    """
+    Async token bucket: refills `rate` tokens per second up to `capacity`.
+    pause() stops all acquirers until a deadline, e.g. for a 429 Retry-After.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncLocSruClient:
+    """
+    asyncio client for the LOC SRU endpoint. One pooled keep-alive session is
+    shared by all lookups; at most `concurrency` requests are in flight and
+    request starts are spaced by a token bucket of `rate` requests per second.
+    A 429 pauses the bucket for Retry-After seconds (exponential backoff if
+    the header is missing) instead of sleeping a fixed interval. Requests also
+    draw from the cross-process budget in shared_rate_limit.py. Diagnostics
+    go to the module logger unless verbose is set.
+    """
+
+    def __init__(self, concurrency=4, rate=0.5, burst=1, timeout=30, max_retries=4, base_delay=5, base_url=SRU_URL, cache=None, verbose=False):
+        if aiohttp is None:
+            raise ImportError("The async LOC client requires aiohttp (pip install aiohttp)")
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.base_url = base_url
+        self.cache = cache
+        self.verbose = verbose
+        self.limiter = shared_limiter()
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch(self, title):
+        """Return the response body for a title's SRU query, or None after max_retries."""
+        raw_url = build_sru_url(title, self.base_url)
+        if self.cache is not None:
+            cached = self.cache.get(raw_url)
+            if cached is not None:
+                return cached.text
+        # The URL is already percent-encoded by build_sru_url; keep aiohttp from re-encoding it
+        url = yarl.URL(raw_url, encoded=True)
+        host = host_of(raw_url)
+        for attempt in range(self.max_retries):
+            backoff = self.base_delay * (2 ** attempt) + random.uniform(0, 1)
+            await self.bucket.acquire()
+            await self.limiter.acquire_async(host)
+            try:
+                async with self._semaphore, self.session.get(url) as response:
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"), None)
+                    await self.limiter.record_async(host, response.status, retry_after)
+                    if response.status == 200:
+                        text = await response.text()
+                        if self.cache is not None:
+                            self.cache.put(raw_url, None, response.status, text, response.headers)
+                        return text
+                    if response.status == 429 or response.status >= 500:
+                        wait = retry_after if retry_after is not None else backoff
+                        _report(self.verbose, logging.WARNING, "LOC returned %s for '%s'. Pausing requests for %.1f seconds...",
+                                response.status, title, wait)
+                        self.bucket.pause(wait)
+                        continue
+                    _report(self.verbose, logging.WARNING, "HTTP error %s for '%s'", response.status, title)
+                    return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                _report(self.verbose, logging.WARNING, "Request failed for '%s': %r", title, e)
+                await asyncio.sleep(backoff)
+        _report(self.verbose, logging.ERROR, "Failed after retries: '%s'", title)
+        return None
+
+    async def lookup(self, title):
+        """
+        Result dict for a title, or None when fetch got no usable answer
+        (transport errors, retries used up, an HTTP error) so the caller
+        retries the title on a later run instead of recording "no match".
+        """
+        text = await self.fetch(title)
+        if text is None:
+            return None
+        try:
+            return parse_lccn_response(title, text, self.verbose)
+        except Exception as e:
+            _report(self.verbose, logging.ERROR, "Error: %s", e)
+            return empty_result()
+
+    async def lookup_many(self, titles):
+        results = await asyncio.gather(*(self.lookup(title) for title in titles))
+        return dict(zip(titles, results))
+
+def get_lccns_from_titles_async(titles, concurrency=4, rate=0.5, **client_kwargs):
+    """Look up a batch of titles concurrently; returns a dict of title -> result dict (None if LOC did not answer)."""
+    async def run():
+        async with AsyncLocSruClient(concurrency=concurrency, rate=rate, **client_kwargs) as client:
+            return await client.lookup_many(list(dict.fromkeys(titles)))
+    return asyncio.run(run())
+
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) < 2:
-        print("Usage: python test2_get_lccn_from_title.py \"Book Title Here\"")
+    args = sys.argv[1:]
+    quiet = "--quiet" in args
+    args = [arg for arg in args if arg != "--quiet"]
+    if not args:
+        print("Usage: python test2_get_lccn_from_title.py [--quiet] \"Book Title Here\"")
+        sys.exit(1)
+    title = " ".join(args)
+    if quiet:
+        logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    result = get_lccn_from_title(title, cache=ResponseCache(), verbose=not quiet)
+    if result is None:
+        print("LOC did not answer; try again later.")
         sys.exit(1)
-    title = " ".join(sys.argv[1:])
-    result = get_lccn_from_title(title)
     print(f"LCCN: {result['lccn']}")
     print(f"Alt LCCN: {result['alt_lccn']}")
     print(f"OCLC: {result['oclc']}")
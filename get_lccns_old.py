@@ -4,60 +4,50 @@ import time
 import random
 import re
 from thefuzz import fuzz
-from threading import Lock
 import os
 import argparse
 import math
+from http_cache import ResponseCache, is_cached
+from results_store import ResultsStore, result_from_ledger_row
+from shared_rate_limit import host_of, retry_after_seconds, shared_limiter
+from verify_lccns import verify_candidates
 
-# Shared variables for rate limiting
-request_count = 0
-start_time = time.time()
-lock = Lock()
+# LOC_API_URL points the lookups elsewhere, e.g. at mock_services.py for load tests
+LOC_API_URL = os.environ.get("LOC_API_URL", "https://www.loc.gov")
 
-def rate_limit(max_requests=9, time_window=60):
-    """
-    Ensures that no more than `max_requests` are made within `time_window` seconds.
-    """
-    global request_count, start_time
-    with lock:
-        current_time = time.time()
-        elapsed_time = current_time - start_time
-
-        if elapsed_time > time_window:
-            request_count = 0
-            start_time = current_time
-
-        if request_count >= max_requests:
-            wait_time = time_window - elapsed_time
-            if wait_time > 0:
-                print(f"Rate limit reached. Waiting for {wait_time:.2f} seconds...")
-                time.sleep(wait_time)
-                request_count = 0
-                start_time = time.time()
-
-        request_count += 1
-
-def robust_request(url, params=None, max_retries=5, base_delay=6, verbose=True):
+def robust_request(url, params=None, max_retries=5, base_delay=6, verbose=True, cache=None):
     """
     Makes a robust request with exponential backoff and rate limiting.
+    Requests draw from the per-host budget shared by every running script
+    (shared_rate_limit.py), so a 429 here slows down the other processes too.
+    With a ResponseCache, cached responses are returned without rate limiting.
     """
+    if cache is not None:
+        cached = cache.get(url, params)
+        if cached is not None:
+            return cached
     headers = {'User-Agent': 'Mozilla/5.0 (compatible; LCCNBot/1.0; +https://github.com/millerbrook/lod_lccn_script)'}
+    limiter = shared_limiter()
+    limited_get = limiter.wrap(requests.get, verbose)
     for attempt in range(max_retries):
-        rate_limit()
         try:
-            response = requests.get(url, params=params, headers=headers)  # <-- add headers here
+            response = limited_get(url, params=params, headers=headers)  # <-- add headers here
             if response.status_code == 200:
+                if cache is not None:
+                    cache.put(url, params, response.status_code, response.text, response.headers)
                 return response
             elif response.status_code == 429:
+                # The pause is shared: every process waits for it in its next acquire
                 if attempt == max_retries - 1:
                     if verbose:
-                        print("Rate limited by server. Waiting for 1 hour and 1 minute (3660 seconds) before retrying...")
-                    time.sleep(3660)
+                        print("Rate limited by server. Pausing requests for 1 hour and 1 minute (3660 seconds)...")
+                    limiter.pause(host_of(url), 3660)
                 else:
-                    wait = base_delay * (2 ** attempt) + random.uniform(0, 1)
+                    backoff = base_delay * (2 ** attempt) + random.uniform(0, 1)
+                    wait = retry_after_seconds(response.headers.get("Retry-After"), backoff)
                     if verbose:
                         print(f"Rate limited by server. Retrying in {wait:.2f} seconds...")
-                    time.sleep(wait)
+                    limiter.pause(host_of(url), wait)
             else:
                 if verbose:
                     print(f"HTTP error {response.status_code} for URL: {url}")
@@ -118,9 +108,9 @@ def write_bad_titles(bad_titles, bad_titles_path='data/bad_titles.csv'):
         pass
     bad_df.to_csv(bad_titles_path, index=False)
 
-def get_lccn_for_title(title, max_retries=5, delay=1.5, threshold=90, verbose=True):
+def get_lccn_for_title(title, max_retries=5, delay=1.5, threshold=90, verbose=True, cache=None, store=None):
     """
-    Searches for LCCNs for a given title using the Library of Congress search API or reuses LCCNs from titles_lccn.csv.
+    Searches for LCCNs for a given title using the Library of Congress search API or reuses LCCNs from the results store.
     Screens for URLs and page numbers.
     """
     missing_titles = []
@@ -133,26 +123,23 @@ def get_lccn_for_title(title, max_retries=5, delay=1.5, threshold=90, verbose=Tr
         return []
     title = cleaned_title
 
-    try:
-        titles_lccn_df = pd.read_csv('data/titles_lccn.csv')
-        matching_row = titles_lccn_df[titles_lccn_df['Title'].str.strip().str.lower() == title.strip().lower()]
-        if not matching_row.empty:
-            lccn = matching_row.iloc[0]['LCCN']
-            if verbose:
-                print(f"Reused LCCN from titles_lccn.csv for '{title}': {lccn}")
-            return [lccn] if pd.notna(lccn) else []
-    except FileNotFoundError:
+    if store is None:
+        store = ResultsStore()
+    existing = store.get(title)
+    if existing is not None:
+        lccn = existing['lccn']
         if verbose:
-            print("titles_lccn.csv not found. Proceeding with API request.")
+            print(f"Reused LCCN from the results store for '{title}': {lccn or 'n/a'}")
+        return [lccn] if lccn else []
 
-    url = "https://www.loc.gov/search/"
+    url = f"{LOC_API_URL}/search/"
     params = {
         'all': 'true',
         'q': title,
         'fo': 'json',
         'fa': 'original-format:book',
     }
-    response = robust_request(url, params=params, max_retries=max_retries, base_delay=delay, verbose=verbose)
+    response = robust_request(url, params=params, max_retries=max_retries, base_delay=delay, verbose=verbose, cache=cache)
     if response is None:
         missing_titles.append((safe_str(title), "lccn not found"))
         write_missing_titles(missing_titles)
@@ -162,7 +149,8 @@ def get_lccn_for_title(title, max_retries=5, delay=1.5, threshold=90, verbose=Tr
     if not results:
         if verbose:
             print(f"No results for '{title}'")
-        time.sleep(delay + random.uniform(0, 1))
+        if not is_cached(response):
+            time.sleep(delay + random.uniform(0, 1))
         missing_titles.append((safe_str(title), "lccn not found"))
         write_missing_titles(missing_titles)
         return []
@@ -201,63 +189,52 @@ def get_lccn_for_title(title, max_retries=5, delay=1.5, threshold=90, verbose=Tr
         print(f"\nMatches for '{title}':")
         for t, l in matches:
             print(f"  Title: {t}\n  LCCN: {l}")
-    time.sleep(delay + random.uniform(0, 1))
+    if not is_cached(response):
+        time.sleep(delay + random.uniform(0, 1))
     return lccns[:5]
 
-def confirm_lccn_matches(df, lccn_col, title_col, delay=1.5, sim_threshold=95, max_retries=5, verbose=True):
+def confirm_lccn_matches(df, lccn_col, title_col, sim_threshold=95, max_retries=5, verbose=True, cache=None, concurrency=4,
+                         store=None):
     """
-    Confirms LCCNs by comparing titles using fuzzy matching and appends results to titles_lccn.csv.
-    Ensures no duplicate lines in titles_lccn.csv.
+    Confirms LCCNs by comparing titles using fuzzy matching and upserts the confirmed
+    titles into the results store, which then rewrites titles_lccn.csv.
+    All candidate LCCNs are fetched once each, concurrently, and scored in one pass (verify_lccns.py).
     """
-    rate_limit()
+    rows = [
+        (idx, row[title_col], row[lccn_col])
+        for idx, row in df.iterrows()
+        if row[lccn_col] and isinstance(row[lccn_col], list)
+    ]
+    confirmed = verify_candidates([(orig_title, lccn_list) for _, orig_title, lccn_list in rows],
+                                  sim_threshold, concurrency, cache, max_retries, verbose)
     confirmed_titles_lccn = []
-    for idx, row in df.iterrows():
-        orig_title = row[title_col]
-        lccn_list = row[lccn_col]
-        if not lccn_list or not isinstance(lccn_list, list):
-            continue
-        found = False
-        for lccn in lccn_list:
-            title_from_lccn = get_title_from_lccn(lccn, delay=delay, max_retries=max_retries, verbose=verbose)
-            if title_from_lccn:
-                sim_sort = fuzz.token_sort_ratio(orig_title, title_from_lccn)
-                if sim_sort >= sim_threshold:
-                    if verbose:
-                        print(f"Confirmed with token_sort_ratio: {sim_sort} | Title: {title_from_lccn}")
-                    df.at[idx, lccn_col] = [lccn]
-                    confirmed_titles_lccn.append({'Title': title_from_lccn, 'LCCN': lccn})
-                    found = True
-                    break
-
-                sim_set = fuzz.token_set_ratio(orig_title, title_from_lccn)
-                if sim_set >= sim_threshold:
-                    if verbose:
-                        print(f"Confirmed with token_set_ratio: {sim_set} | Title: {title_from_lccn}")
-                    df.at[idx, lccn_col] = [lccn]
-                    confirmed_titles_lccn.append({'Title': title_from_lccn, 'LCCN': lccn})
-                    found = True
-                    break
-        if not found:
+    for (idx, _, _), match in zip(rows, confirmed):
+        if match is None:
             df.at[idx, lccn_col] = []
+            continue
+        if verbose:
+            print(f"Confirmed with {match['scorer']}: {match['score']} | Title: {match['title_from_lccn']}")
+        df.at[idx, lccn_col] = [match["lccn"]]
+        confirmed_titles_lccn.append({'Title': match["title_from_lccn"], 'LCCN': match["lccn"]})
 
     confirmed_df = pd.DataFrame(confirmed_titles_lccn)
     if not confirmed_df.empty:
-        try:
-            existing_df = pd.read_csv('./data/titles_lccn.csv')
-            combined_df = pd.concat([existing_df, confirmed_df], ignore_index=True)
-            combined_df = combined_df.drop_duplicates(subset=['Title', 'LCCN'], keep='first')
-        except FileNotFoundError:
-            combined_df = confirmed_df
-        combined_df.to_csv('data/titles_lccn.csv', index=False)
+        if store is None:
+            store = ResultsStore()
+        store.upsert_many([result_from_ledger_row({**row, 'Source': 'LOC'}) for row in confirmed_titles_lccn])
+        store.export_csv()
     return df, confirmed_df
 
-def get_title_from_lccn(lccn, delay=1.5, max_retries=5, verbose=True):
+def get_title_from_lccn(lccn, delay=1.5, max_retries=5, verbose=True, cache=None):
     """
     Retrieves the title of a book using its LCCN from the Library of Congress JSON API.
     """
-    url = f"https://www.loc.gov/item/{lccn}/?fo=json"
-    rate_limit()  # Apply rate limiting before making the request
-    response = robust_request(url, max_retries=max_retries, base_delay=delay, verbose=verbose)
+    url = f"{LOC_API_URL}/item/{lccn}/?fo=json"
+    response = cache.get(url) if cache is not None else None
+    if response is None:
+        response = robust_request(url, max_retries=max_retries, base_delay=delay, verbose=verbose)
+        if cache is not None and response is not None:
+            cache.put(url, None, response.status_code, response.text, response.headers)
     if response and response.status_code == 200:
         try:
             data = response.json()
@@ -275,7 +252,8 @@ def get_title_from_lccn(lccn, delay=1.5, max_retries=5, verbose=True):
     else:
         if verbose:
             print(f"Failed to retrieve JSON for LCCN {lccn}")
-    time.sleep(delay + random.uniform(0, 1))
+    if not is_cached(response):
+        time.sleep(delay + random.uniform(0, 1))
     return None
 
 def safe_str(val):
@@ -293,34 +271,31 @@ def safe_str(val):
         return "; ".join(map(str, val))
     return str(val)
 
-def process_batch(titles, verbose=True):
+def process_batch(titles, verbose=True, cache=None, store=None):
+    if store is None:
+        store = ResultsStore()
     df = pd.DataFrame({'title': titles})
-    df['LCCN'] = df['title'].apply(get_lccn_for_title)
-    df, confirmed_df = confirm_lccn_matches(df, 'LCCN', 'title')
+    df['LCCN'] = df['title'].apply(get_lccn_for_title, cache=cache, store=store)
+    df, confirmed_df = confirm_lccn_matches(df, 'LCCN', 'title', cache=cache, store=store)
     df.to_csv('data/lccns.csv', index=False, encoding='utf-8-sig')
-    titles_lccn_path = 'data/titles_lccn.csv'
 
-    # Convert LCCN lists to strings for deduplication
-    df_out = df[['title', 'LCCN']].rename(columns={'title': 'Title'}).copy()
-    df_out['LCCN'] = df_out['LCCN'].apply(safe_str)
-
-    if os.path.exists(titles_lccn_path):
-        existing = pd.read_csv(titles_lccn_path, dtype={'LCCN': str})  # <-- force LCCN as string
-        # Ensure existing LCCN column is string
-        if 'LCCN' in existing.columns:
-            existing['LCCN'] = existing['LCCN'].apply(safe_str)
-        combined = pd.concat([existing, df_out], ignore_index=True)
-        combined = combined.drop_duplicates(subset=['Title', 'LCCN'])
-    else:
-        combined = df_out
-    combined.to_csv(titles_lccn_path, index=False, encoding='utf-8-sig')
+    # One result per title through the store, which keeps a found LCCN over a later miss
+    rows = [
+        {'Title': title, 'LCCN': lccns[0] if lccns else '', 'Alt_LCCN': repr(lccns[1:]), 'Source': 'LOC' if lccns else 'None'}
+        for title, lccns in zip(df['title'], df['LCCN'])
+    ]
+    store.upsert_many([result_from_ledger_row(row) for row in rows])
+    store.export_csv()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--batch-size', type=int, default=None, help='Number of titles to process in this batch')
     parser.add_argument('--batch-index', type=int, default=0, help='Batch index (0-based)')
     parser.add_argument('--all-batches', action='store_true', help='Process all batches sequentially')
+    parser.add_argument('--no-cache', action='store_true', help='Always query loc.gov instead of reusing cached responses')
     args = parser.parse_args()
+    cache = None if args.no_cache else ResponseCache()
+    store = ResultsStore()
 
     with open('data/unique_sources.txt', 'r', encoding='utf-8') as f:
         titles = [line.strip() for line in f if line.strip()]
@@ -332,7 +307,7 @@ if __name__ == "__main__":
             end = start + args.batch_size
             batch_titles = titles[start:end]
             print(f"Processing batch {batch_idx} (titles {start} to {end-1})")
-            process_batch(batch_titles)
+            process_batch(batch_titles, cache=cache, store=store)
             print(f"Batch {batch_idx} complete. Processed {len(batch_titles)} titles.")
     else:
         if args.batch_size:
@@ -340,5 +315,5 @@ if __name__ == "__main__":
             end = start + args.batch_size
             titles = titles[start:end]
             print(f"Processing batch {args.batch_index} (titles {start} to {end-1})")
-        process_batch(titles)
+        process_batch(titles, cache=cache, store=store)
         print(f"Batch {args.batch_index if args.batch_size else 0} complete. Processed {len(titles)} titles.")
\ No newline at end of file
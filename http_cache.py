@@ -0,0 +1,189 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+
+import requests
+
+CACHE_PATH = "data/http_cache.sqlite"
+DEFAULT_TTL = 30 * 24 * 3600  # 30 days
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    status INTEGER,
+    headers TEXT,
+    body BLOB,
+    size INTEGER,
+    created_at REAL,
+    accessed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+def normalize_url(url, params=None):
+    """
+    Canonical form of a request URL: lowercase scheme and host, default ports
+    dropped, and query parameters (from the URL and params) decoded and sorted.
+    """
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        items = params.items() if isinstance(params, dict) else params
+        query.extend((str(k), str(v)) for k, v in items)
+    query.sort()
+    return urllib.parse.urlunsplit((scheme, host, parts.path or "/", urllib.parse.urlencode(query), ""))
+
+class CachedResponse:
+    """The parts of a requests.Response that the lookup scripts use."""
+
+    from_cache = True
+
+    def __init__(self, url, status_code, text, headers):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.text)
+
+class ResponseCache:
+    """
+    Persistent HTTP response cache in SQLite, keyed by the normalized request
+    URL and parameters. Bodies are zlib-compressed; entries older than ttl
+    seconds are treated as misses; once the stored bodies exceed max_bytes the
+    least recently used entries are evicted. Hit/miss counts are kept in the
+    database so they add up across runs and processes.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def key(self, url, params=None):
+        return hashlib.sha256(normalize_url(url, params).encode("utf-8")).hexdigest()
+
+    def _count(self, name):
+        self._conn.execute(
+            "INSERT INTO counters VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,)
+        )
+
+    def get(self, url, params=None):
+        """Return a CachedResponse for the request, or None on a miss or expired entry."""
+        key = self.key(url, params)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT url, status, headers, body, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[4] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                self._count("misses")
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self._count("hits")
+        cached_url, status, headers, body, _ = row
+        return CachedResponse(cached_url, status, zlib.decompress(body).decode("utf-8"), json.loads(headers))
+
+    def put(self, url, params, status_code, text, headers=None):
+        """Store a response body; evicts least recently used entries if over max_bytes."""
+        body = zlib.compress(text.encode("utf-8"), 6)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(url, params), normalize_url(url, params), status_code,
+                 json.dumps(dict(headers or {})), body, len(body), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters"))
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": counters.get("hits", 0),
+            "total_misses": counters.get("misses", 0),
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM counters")
+
+def cached_get(url, params=None, cache=None, get=requests.get, **kwargs):
+    """
+    requests.get through a ResponseCache: a fresh cached 200 response is
+    returned without touching the network; new 200 responses are stored.
+    """
+    if cache is not None:
+        cached = cache.get(url, params)
+        if cached is not None:
+            return cached
+    response = get(url, params=params, **kwargs)
+    if cache is not None and response.status_code == 200:
+        cache.put(url, params, response.status_code, response.text, response.headers)
+    return response
+
+def is_cached(response):
+    return getattr(response, "from_cache", False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the HTTP response cache")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--cache", default=CACHE_PATH, help="Path of the cache database")
+    args = parser.parse_args()
+    cache = ResponseCache(args.cache)
+    if args.command == "clear":
+        cache.clear()
+        print(f"Cleared {args.cache}")
+    else:
+        for name, value in cache.stats().items():
+            print(f"{name}: {value}")
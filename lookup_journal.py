@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import time
+
+JOURNAL_PATH = "data/lccn_journal.jsonl"
+FSYNC_EVERY = 20
+FSYNC_INTERVAL = 5.0
+
+class LookupJournal:
+    """
+    Append-only JSON-lines journal of lookup results. Every entry is written
+    and flushed as soon as it is appended, so a crash of the process loses
+    nothing; fsync runs every fsync_every entries or fsync_interval seconds,
+    whichever comes first, so a crash of the machine loses at most that batch.
+    replay() returns the entries of an interrupted run, and compact() removes
+    the journal once its entries are in the final outputs.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def replay(self):
+        """
+        Entries written by earlier runs, in order. A torn or unreadable last
+        line (the process died mid-write) is dropped and cut from the file so
+        new entries start on a clean line. A corrupt line before that is
+        skipped and reported, and the entries after it are kept.
+        """
+        if not os.path.isfile(self.path):
+            return []
+        entries = []
+        bad = []
+        number = 0
+        start = end = 0
+        with open(self.path, "rb") as f:
+            for number, line in enumerate(f, 1):
+                start, end = end, end + len(line)
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("torn line")
+                    entries.append(json.loads(line))
+                except ValueError:
+                    bad.append(number)
+        if bad and bad[-1] == number:
+            bad.pop()
+            print(f"Dropping a torn entry at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(start)
+        if bad:
+            print(f"Skipped {len(bad)} corrupt entries in {self.path} (lines {', '.join(map(str, bad))})")
+        return entries
+
+    def append(self, entry):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def compact(self):
+        """Remove the journal; call only after its entries are written to the final outputs."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the step 04 lookup journal")
+    parser.add_argument("--journal", default=JOURNAL_PATH, help="Path of the journal")
+    args = parser.parse_args()
+    entries = LookupJournal(args.journal).replay()
+    print(f"{len(entries)} results waiting in {args.journal}")
+    for entry in entries[-10:]:
+        print(f"  {entry.get('title')}: {entry.get('lccn')} ({entry.get('source')})")
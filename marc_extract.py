@@ -0,0 +1,187 @@
+import argparse
+import concurrent.futures
+import functools
+import os
+import shutil
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for the columnar extract
+    pa = pq = None
+
+from marc_index import MARC_PATH, RECORD_TERMINATOR, full_title_of, iter_raw_records, record_fields
+from ol_editions_extract import candidate_rows
+from retrieve_from_open_library_dump import get_match_substring, normalize, score_record
+
+MARC_EXTRACT_PATH = "data/marc_extract.parquet"
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The MARC extract requires pyarrow (pip install pyarrow)")
+
+def marc_extract_schema():
+    return pa.schema([
+        ("offset", pa.int64()),
+        ("title", pa.string()),
+        ("subtitle", pa.string()),
+        ("author", pa.string()),
+        ("title_norm", pa.string()),
+        ("full_title_norm", pa.string()),
+        ("lccn", pa.list_(pa.string())),
+        ("oclc", pa.list_(pa.string())),
+        ("lcc", pa.string()),
+    ])
+
+def _empty_columns():
+    return {name: [] for name in marc_extract_schema().names}
+
+def shard_boundaries(marc_path, num_shards):
+    """
+    Record-aligned byte offsets splitting the MARC file into about num_shards
+    ranges: from each evenly spaced guess, move forward past the next 0x1D
+    terminator. Returns [(start, end), ...] covering the whole file.
+    """
+    size = os.path.getsize(marc_path)
+    starts = [0]
+    with open(marc_path, "rb") as f:
+        for i in range(1, num_shards):
+            f.seek(size * i // num_shards)
+            position = f.tell()
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    position = size
+                    break
+                cut = chunk.find(RECORD_TERMINATOR)
+                if cut >= 0:
+                    position += cut + 1
+                    break
+                position += len(chunk)
+            if position > starts[-1] and position < size:
+                starts.append(position)
+    return list(zip(starts, starts[1:] + [size]))
+
+def extract_shard(marc_path, start, end, part_path, batch_size=50000):
+    """Parse the records starting in [start, end) and write them to part_path. Returns (records, skipped)."""
+    schema = marc_extract_schema()
+    columns = _empty_columns()
+    rows = skipped = 0
+    with pq.ParquetWriter(part_path, schema, compression="zstd") as writer, open(marc_path, "rb") as f:
+        for offset, raw in iter_raw_records(f, start, end):
+            if len(raw) < 25:
+                skipped += 1
+                continue
+            fields = record_fields(raw)
+            columns["offset"].append(offset)
+            for name in ("title", "subtitle", "author", "lccn", "oclc", "lcc"):
+                columns[name].append(fields[name])
+            columns["title_norm"].append(normalize(fields["title"]))
+            columns["full_title_norm"].append(normalize(full_title_of(fields["title"], fields["subtitle"])))
+            if len(columns["offset"]) >= batch_size:
+                rows += len(columns["offset"])
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                columns = _empty_columns()
+        if columns["offset"]:
+            rows += len(columns["offset"])
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+    return rows, skipped
+
+def extract_marc(marc_path=MARC_PATH, extract_path=MARC_EXTRACT_PATH, workers=None, shards_per_worker=4):
+    """
+    Split the MARC file at record boundaries and parse the shards in a process
+    pool, each worker writing its own Parquet part. The parts are then joined
+    in file order into one extract of title, subtitle, author, normalized
+    titles, LCCNs, OCLCs and LC class number, keyed by record offset.
+    """
+    _require_pyarrow()
+    start_time = time.time()
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(os.path.dirname(extract_path) or ".", exist_ok=True)
+    parts_dir = extract_path + ".parts"
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    ranges = shard_boundaries(marc_path, workers * shards_per_worker)
+    part_paths = [os.path.join(parts_dir, f"part-{i:05d}.parquet") for i in range(len(ranges))]
+    rows = skipped = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(extract_shard, marc_path, start, end, part_path)
+            for (start, end), part_path in zip(ranges, part_paths)
+        ]
+        for future in futures:
+            shard_rows, shard_skipped = future.result()
+            rows += shard_rows
+            skipped += shard_skipped
+
+    tmp_path = extract_path + ".tmp"
+    with pq.ParquetWriter(tmp_path, marc_extract_schema(), compression="zstd") as writer:
+        for part_path in part_paths:
+            writer.write_table(pq.read_table(part_path))
+    os.replace(tmp_path, extract_path)
+    shutil.rmtree(parts_dir)
+    print(f"Extracted {rows} MARC records from {len(ranges)} shards to {extract_path} in "
+          f"{time.time() - start_time:.2f} seconds ({skipped} unreadable fragments skipped).")
+    return rows
+
+@functools.lru_cache(maxsize=2)
+def load_marc_extract(extract_path=MARC_EXTRACT_PATH):
+    """Memory-map the extract; repeated lookups reuse the same table."""
+    _require_pyarrow()
+    return pq.read_table(extract_path, memory_map=True)
+
+def scan_marc_extract(input_norms, extract_path=MARC_EXTRACT_PATH, max_perfect_matches=3):
+    """
+    Match normalized titles against the MARC extract the same way scan_extract
+    does for Open Library: candidate_rows' vectorized substring filter on the
+    normalized title columns, then the usual rescoring in file order until
+    max_perfect_matches are found. Each match's "record" includes the record
+    offset and LCC.
+    """
+    table = load_marc_extract(extract_path)
+    matches = {n: [] for n in input_norms}
+    for input_norm in dict.fromkeys(input_norms):
+        if not input_norm:
+            continue
+        for row in candidate_rows(table, input_norm):
+            record = {
+                "offset": row["offset"],
+                "title": row["title"],
+                "full_title": full_title_of(row["title"], row["subtitle"]),
+                "author": row["author"],
+                "lccn": row["lccn"],
+                "oclc": row["oclc"],
+                "lcc": row["lcc"],
+            }
+            match = score_record(input_norm, record, row["title_norm"], row["full_title_norm"])
+            if match:
+                matches[input_norm].append(match)
+                if len(matches[input_norm]) >= max_perfect_matches:
+                    break
+    return matches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel columnar extract of the LC MARC file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Write the extract from the MARC file")
+    build_parser.add_argument("--marc", default=MARC_PATH, help="Binary MARC file")
+    build_parser.add_argument("--extract", default=MARC_EXTRACT_PATH, help="Parquet file to write")
+    build_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    lookup_parser = subparsers.add_parser("lookup", help="Look up a title in the extract")
+    lookup_parser.add_argument("title", help="Book title to search for")
+    lookup_parser.add_argument("--extract", default=MARC_EXTRACT_PATH, help="Parquet extract to read")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        extract_marc(args.marc, args.extract, args.workers)
+    else:
+        start_time = time.time()
+        input_norm = get_match_substring(normalize(args.title))
+        matches = scan_marc_extract([input_norm], args.extract)[input_norm]
+        print(f"Lookup completed in {time.time() - start_time:.4f} seconds.")
+        for i, match in enumerate(matches, 1):
+            print(f"Match {i}: {match['display_title']} | LCCN: {match['lccn']} | OCLC: {match['oclc']} | "
+                  f"LCC: {match['record']['lcc']} | Score: {match['score']}")
+        if not matches:
+            print("No matches found.")
@@ -0,0 +1,363 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+
+try:
+    from pymarc import Record
+except ImportError:  # optional: only needed to decode full records
+    Record = None
+
+from ol_title_index import FTS_SCAN_LIMIT, PREFIX_END, create_fts_index, has_fts_index
+from retrieve_from_open_library_dump import normalize, score_record
+
+MARC_PATH = "data/marc/BooksAll.2016.combined.utf8"
+
+RECORD_TERMINATOR = b"\x1d"
+FIELD_TERMINATOR = b"\x1e"
+SUBFIELD_DELIMITER = b"\x1f"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    title TEXT,
+    full_title TEXT,
+    lccn TEXT,
+    oclc TEXT
+);
+CREATE TABLE IF NOT EXISTS title_keys (
+    norm_key TEXT NOT NULL,
+    record_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lccn_keys (
+    lccn TEXT NOT NULL,
+    record_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS oclc_keys (
+    oclc TEXT NOT NULL,
+    record_id INTEGER NOT NULL
+);
+"""
+
+KEY_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_title_keys_norm_key ON title_keys(norm_key);
+CREATE INDEX IF NOT EXISTS idx_lccn_keys_lccn ON lccn_keys(lccn);
+CREATE INDEX IF NOT EXISTS idx_oclc_keys_oclc ON oclc_keys(oclc);
+"""
+
+def marc_index_path(marc_path):
+    return marc_path + ".idx.sqlite"
+
+def iter_raw_records(f, start=0, end=None):
+    """
+    Yield (offset, raw_record) for the records that start in [start, end) of a
+    binary MARC file, using the leader's record length and checking it
+    against the 0x1D terminator. start must be a record boundary. A record
+    whose length does not land on a terminator is cut at the next terminator
+    instead, so one bad leader does not derail the rest of the file.
+    """
+    f.seek(start)
+    offset = start
+    while end is None or offset < end:
+        head = f.read(5)
+        if not head:
+            break
+        raw = head
+        if head.isdigit() and int(head) > 5:
+            raw += f.read(int(head) - 5)
+        if not raw.endswith(RECORD_TERMINATOR) or RECORD_TERMINATOR in raw[:-1]:
+            cut = raw.find(RECORD_TERMINATOR)
+            while cut < 0:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    break
+                raw += chunk
+                cut = raw.find(RECORD_TERMINATOR)
+            if cut >= 0:
+                raw = raw[:cut + 1]
+            f.seek(offset + len(raw))
+        yield offset, raw
+        offset += len(raw)
+
+def raw_fields(raw, tags):
+    """
+    Read the given tags straight from a raw record's directory without
+    decoding the whole record. Returns tag -> list of fields, each a list of
+    (code, value) subfield pairs (control fields give [("", value)]).
+    Directory entries with a non-numeric length or offset are skipped.
+    """
+    fields = {}
+    try:
+        base = int(raw[12:17])
+    except ValueError:
+        return fields
+    directory = raw[24:base - 1]
+    for i in range(0, len(directory) - 11, 12):
+        tag = directory[i:i + 3].decode("ascii", "replace")
+        if tag not in tags:
+            continue
+        try:
+            length = int(directory[i + 3:i + 7])
+            start = base + int(directory[i + 7:i + 12])
+        except ValueError:
+            # A corrupt directory entry loses that field, not the record
+            continue
+        data = raw[start:start + length].rstrip(FIELD_TERMINATOR).decode("utf-8", "replace")
+        if tag < "010":
+            fields.setdefault(tag, []).append([("", data)])
+            continue
+        subfields = [(part[:1], part[1:]) for part in data.split("\x1f")[1:] if part]
+        fields.setdefault(tag, []).append(subfields)
+    return fields
+
+def normalize_lccn(value):
+    """LC's LCCN normalization: drop blanks and anything after a slash; zero-pad the serial after a hyphen."""
+    value = (value or "").strip().split("/")[0].replace(" ", "")
+    if "-" in value:
+        prefix, serial = value.split("-", 1)
+        if serial.isdigit():
+            value = prefix + serial.zfill(6)
+        else:
+            value = prefix + serial
+    return value
+
+def oclc_from_035(value):
+    """OCLC number from an 035 $a such as '(OCoLC)ocm01234567', without leading zeros; None if not OCLC."""
+    match = re.match(r"\(OCoLC\)\D*(\d+)", value or "")
+    if not match:
+        return None
+    return match.group(1).lstrip("0") or None
+
+def _first(fields, tags, codes):
+    """Value of the first of codes in the first field with one of tags, subfields joined by spaces."""
+    for tag in tags:
+        for subfields in fields.get(tag, []):
+            values = [value.strip() for code, value in subfields if code in codes]
+            if any(values):
+                return " ".join(v for v in values if v)
+    return ""
+
+def record_fields(raw):
+    """
+    The fields we use from a raw record: 245 $a title and $b subtitle, main
+    entry author (100/110/111 $a), 050 LC class number, 010 LCCNs and 035
+    OCLC numbers.
+    """
+    fields = raw_fields(raw, {"245", "100", "110", "111", "050", "010", "035"})
+    lccns = [normalize_lccn(value) for subfields in fields.get("010", []) for code, value in subfields if code == "a"]
+    oclcs = [oclc_from_035(value) for subfields in fields.get("035", []) for code, value in subfields if code == "a"]
+    return {
+        "title": _first(fields, ["245"], "a").strip(" /:;,.="),
+        "subtitle": _first(fields, ["245"], "b").strip(" /:;,.="),
+        "author": _first(fields, ["100", "110", "111"], "a").strip(" ,"),
+        "lcc": _first(fields, ["050"], "ab"),
+        "lccn": list(dict.fromkeys(l for l in lccns if l)),
+        "oclc": list(dict.fromkeys(o for o in oclcs if o)),
+    }
+
+def full_title_of(title, subtitle):
+    return f"{title} : {subtitle}" if subtitle else title
+
+def build_marc_index(marc_path=MARC_PATH, index_path=None, batch_size=20000):
+    """
+    Read the MARC file once and record each record's byte offset and length
+    with its normalized 245 $a and $a+$b title keys, 010 LCCNs and 035 OCLCs,
+    plus the same trigram table over the title keys as the Open Library index.
+    """
+    index_path = index_path or marc_index_path(marc_path)
+    start_time = time.time()
+    tmp_path = index_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+    records, titles, lccns, oclcs = [], [], [], []
+    count = skipped = 0
+    with open(marc_path, "rb") as f:
+        for offset, raw in iter_raw_records(f):
+            if len(raw) < 25:
+                skipped += 1  # a fragment between terminators, not a record
+                continue
+            count += 1
+            fields = record_fields(raw)
+            title, record_lccns, record_oclcs = fields["title"], fields["lccn"], fields["oclc"]
+            full_title = full_title_of(title, fields["subtitle"])
+            records.append((count, offset, len(raw), title, full_title, json.dumps(record_lccns), json.dumps(record_oclcs)))
+            for key in dict.fromkeys(filter(None, (normalize(title), normalize(full_title)))):
+                titles.append((key, count))
+            lccns.extend((lccn, count) for lccn in record_lccns)
+            oclcs.extend((oclc, count) for oclc in record_oclcs)
+            if len(records) >= batch_size:
+                _flush(conn, records, titles, lccns, oclcs)
+                records, titles, lccns, oclcs = [], [], [], []
+    _flush(conn, records, titles, lccns, oclcs)
+    conn.executescript(KEY_INDEXES)
+    create_fts_index(conn)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_path)
+    print(f"Indexed {count} MARC records to {index_path} in {time.time() - start_time:.2f} seconds "
+          f"({skipped} unreadable fragments skipped).")
+    return count
+
+def _flush(conn, records, titles, lccns, oclcs):
+    conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+    conn.executemany("INSERT INTO title_keys VALUES (?, ?)", titles)
+    conn.executemany("INSERT INTO lccn_keys VALUES (?, ?)", lccns)
+    conn.executemany("INSERT INTO oclc_keys VALUES (?, ?)", oclcs)
+    conn.commit()
+
+def _index_rows(index_path, query, params):
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+ROW_COLUMNS = "r.id, r.offset, r.length, r.title, r.full_title, r.lccn, r.oclc"
+
+def _row_dict(row):
+    record_id, offset, length, title, full_title, lccn, oclc = row
+    return {
+        "id": record_id,
+        "offset": offset,
+        "length": length,
+        "title": title,
+        "full_title": full_title,
+        "lccn": json.loads(lccn),
+        "oclc": json.loads(oclc),
+    }
+
+def find_by_title(title, index_path, exact=False, limit=200, scan_limit=FTS_SCAN_LIMIT):
+    """
+    Index rows whose normalized title equals (exact) or contains the normalized
+    title, in file order. Of the containing titles, the limit shortest are
+    kept, since scoring rejects titles much longer than the query. They come
+    from the same bounded lookups as ol_title_index.candidate_rows: the exact
+    key, keys starting with the title and, through the trigram table, keys
+    containing it. Indexes built before the trigram table (add it with the
+    fts command) and titles under 3 characters only find the first two.
+    """
+    key = normalize(title)
+    if not key:
+        return []
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        parts = ["SELECT rowid, record_id, norm_key FROM title_keys WHERE norm_key = ?"]
+        params = [key]
+        if not exact:
+            parts.append(
+                "SELECT * FROM (SELECT rowid, record_id, norm_key FROM title_keys "
+                "WHERE norm_key > ? AND norm_key < ? LIMIT ?)"
+            )
+            params += [key, key + PREFIX_END, scan_limit]
+            if len(key) >= 3 and has_fts_index(conn):
+                parts.append(
+                    "SELECT k.rowid, k.record_id, k.norm_key FROM "
+                    "(SELECT rowid FROM title_fts WHERE title_fts MATCH ? LIMIT ?) f JOIN title_keys k ON k.rowid = f.rowid"
+                )
+                params += ['"' + key.replace('"', '""') + '"', scan_limit]
+        rows = conn.execute(
+            f"SELECT DISTINCT {ROW_COLUMNS} FROM ("
+            f"SELECT record_id FROM ({' UNION '.join(parts)}) ORDER BY length(norm_key), record_id LIMIT ?"
+            f") k JOIN records r ON r.id = k.record_id ORDER BY r.id",
+            params + [limit],
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_row_dict(row) for row in rows]
+
+def find_by_lccn(lccn, index_path):
+    rows = _index_rows(
+        index_path,
+        f"SELECT {ROW_COLUMNS} FROM lccn_keys k JOIN records r ON r.id = k.record_id WHERE k.lccn = ? ORDER BY r.id",
+        (normalize_lccn(lccn),),
+    )
+    return [_row_dict(row) for row in rows]
+
+def find_by_oclc(oclc, index_path):
+    rows = _index_rows(
+        index_path,
+        f"SELECT {ROW_COLUMNS} FROM oclc_keys k JOIN records r ON r.id = k.record_id WHERE k.oclc = ? ORDER BY r.id",
+        (str(oclc).lstrip("0"),),
+    )
+    return [_row_dict(row) for row in rows]
+
+def read_marc_record(marc_path, offset, length):
+    """Seek to one record and decode it with pymarc."""
+    if Record is None:
+        raise ImportError("Decoding MARC records requires pymarc (pip install pymarc)")
+    with open(marc_path, "rb") as f:
+        f.seek(offset)
+        raw = f.read(length)
+    return Record(data=raw, to_unicode=True, force_utf8=True)
+
+def lookup_marc_title(input_norm, index_path, max_perfect_matches=3):
+    """
+    Matches for a normalized title from the index alone, scored with the same
+    rules as the Open Library scans. Each match's "record" is its index row,
+    whose offset and length read_marc_record takes.
+    """
+    matches = []
+    for row in find_by_title(input_norm, index_path):
+        match = score_record(input_norm, row)
+        if match:
+            matches.append(match)
+            if len(matches) >= max_perfect_matches:
+                break
+    return matches
+
+def print_record(record, row):
+    print(f"Record {row['id']} (offset {row['offset']}):")
+    print(f"  Title: {record.title or 'No title'}")
+    print(f"  Author: {record.author or 'No author'}")
+    print(f"  LCCN: {', '.join(row['lccn']) or 'No LCCN'}")
+    print(f"  OCLC: {', '.join(row['oclc']) or 'No OCLC'}")
+    print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offset index over an LC MARC file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Index every record of the MARC file")
+    build_parser.add_argument("--marc", default=MARC_PATH, help="Binary MARC file")
+    build_parser.add_argument("--index", default=None, help="Index file to write (default: <marc>.idx.sqlite)")
+    lookup_parser = subparsers.add_parser("lookup", help="Find and decode records by title, LCCN or OCLC")
+    lookup_parser.add_argument("title", nargs="?", help="Title (records whose title contains it)")
+    lookup_parser.add_argument("--lccn", help="Look up by 010 LCCN instead")
+    lookup_parser.add_argument("--oclc", help="Look up by 035 OCLC number instead")
+    lookup_parser.add_argument("--exact", action="store_true", help="Only titles equal to the given title")
+    lookup_parser.add_argument("--marc", default=MARC_PATH, help="Binary MARC file")
+    lookup_parser.add_argument("--index", default=None, help="Index file (default: <marc>.idx.sqlite)")
+    fts_parser = subparsers.add_parser("fts", help="Add the trigram full-text index to an existing index")
+    fts_parser.add_argument("--marc", default=MARC_PATH, help="Binary MARC file")
+    fts_parser.add_argument("--index", default=None, help="Index file (default: <marc>.idx.sqlite)")
+    args = parser.parse_args()
+
+    index_path = args.index or marc_index_path(args.marc)
+    if args.command == "build":
+        build_marc_index(args.marc, index_path)
+    elif args.command == "fts":
+        conn = sqlite3.connect(index_path)
+        create_fts_index(conn)
+        conn.commit()
+        conn.close()
+        print(f"Trigram index added to {index_path}")
+    else:
+        start_time = time.time()
+        if args.lccn:
+            rows = find_by_lccn(args.lccn, index_path)
+        elif args.oclc:
+            rows = find_by_oclc(args.oclc, index_path)
+        elif args.title:
+            rows = find_by_title(args.title, index_path, exact=args.exact)
+        else:
+            parser.error("give a title, --lccn or --oclc")
+        for row in rows:
+            print_record(read_marc_record(args.marc, row["offset"], row["length"]), row)
+        print(f"{len(rows)} records found in {time.time() - start_time:.4f} seconds.")
@@ -0,0 +1,164 @@
+import argparse
+import collections
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+SRU_SEED_PATH = "data/raw_response.txt"
+LOC_SEED_PATH = "data/debug-data.json"
+
+class MockServiceState:
+    """
+    Canned responses and fault settings shared by all handler threads.
+    latency is the mean added delay in seconds (uniform within +/- jitter);
+    error_rate and throttle_rate are the fractions of requests answered with
+    500 and 429; max_rps, if set, answers 429 to requests beyond that many per
+    second, like a real quota.
+    """
+
+    def __init__(self, sru_seed=SRU_SEED_PATH, loc_seed=LOC_SEED_PATH, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle_rate=0.0, max_rps=None, retry_after=1):
+        with open(sru_seed, "r", encoding="utf-8") as f:
+            self.sru_body = f.read()
+        with open(loc_seed, "r", encoding="utf-8") as f:
+            self.search_body = json.load(f)
+        self.items = {}
+        for result in self.search_body.get("results", []):
+            for lccn in result.get("number_lccn", []):
+                self.items[lccn] = result
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.counts = collections.Counter()
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def over_quota(self):
+        if not self.max_rps:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.max_rps:
+                return True
+            self._recent.append(now)
+            return False
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+class MockServiceHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Routes:
+      /lcdb                      SRU searchRetrieve (MODS XML from raw_response.txt)
+      /item/<lccn>/              loc.gov item JSON (records from debug-data.json, else 404)
+      /books/, /search/          loc.gov search JSON (debug-data.json)
+      /webservices/catalog/search/worldcat/opensearch   WorldCat JSON
+      /_stats                    request counts
+    """
+
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(parts.query)
+        path = parts.path
+        if path == "/_stats":
+            return self.send_json(dict(self.state.counts))
+
+        self.state.count("requests")
+        self.state.delay()
+        if self.state.over_quota() or random.random() < self.state.throttle_rate:
+            self.state.count("429")
+            return self.send_body(429, b"", "text/plain", {"Retry-After": str(self.state.retry_after)})
+        if random.random() < self.state.error_rate:
+            self.state.count("500")
+            return self.send_body(500, b"Internal Server Error", "text/plain")
+
+        if path == "/lcdb":
+            self.state.count("sru")
+            return self.send_body(200, self.state.sru_body.encode("utf-8"), "text/xml; charset=utf-8")
+        if path.startswith("/item/"):
+            self.state.count("item")
+            lccn = path[len("/item/"):].strip("/")
+            result = self.state.items.get(lccn)
+            if result is None:
+                return self.send_json({"status": 404}, status=404)
+            return self.send_json({"item": {**(result.get("item") or {}), "title": result.get("title"), "number_lccn": [lccn]}})
+        if path in ("/books/", "/search/"):
+            self.state.count("search")
+            return self.send_json(self.state.search_body)
+        if path.endswith("/opensearch"):
+            self.state.count("worldcat")
+            return self.send_json(self.worldcat_body(query.get("q", [""])[0]))
+        self.state.count("404")
+        return self.send_json({"status": 404}, status=404)
+
+    def worldcat_body(self, title):
+        """The query title itself plus the seeded records, each with their OCLC numbers."""
+        entries = [{"title": title, "oclcnum": str(1000000 + sum(map(ord, title)))}] if title else []
+        for result in self.state.search_body.get("results", []):
+            if result.get("number_oclc"):
+                entries.append({"title": result.get("title", ""), "oclcnum": result["number_oclc"][0]})
+        return {"entries": entries}
+
+    def send_json(self, data, status=200):
+        self.send_body(status, json.dumps(data).encode("utf-8"), "application/json")
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_server(host="127.0.0.1", port=8765, **state_kwargs):
+    """Serve the mock APIs from a background thread; returns the server (call shutdown() to stop)."""
+    handler = type("Handler", (MockServiceHandler,), {"state": MockServiceState(**state_kwargs)})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the LOC SRU, loc.gov JSON and WorldCat APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean added delay per request, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Delay varies uniformly by up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--max-rps", type=float, default=None, help="Answer 429 above this many requests per second")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+    server = start_mock_server(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               throttle_rate=args.throttle_rate, max_rps=args.max_rps, retry_after=args.retry_after)
+    base = f"http://{args.host}:{args.port}"
+    print(f"Mock services on {base}. Point the clients at it with:")
+    print(f"  LOC_SRU_URL={base}/lcdb LOC_API_URL={base} OCLC_API_URL={base} \\")
+    print(f"  RATE_LIMIT_BUDGETS='{{\"{args.host}\": {{\"rate\": 100, \"burst\": 10}}}}'")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"Requests so far: {dict(server.RequestHandlerClass.state.counts)}")
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Final counts: {dict(server.RequestHandlerClass.state.counts)}")
@@ -1,25 +1,23 @@
+import os
 import pandas as pd
 import requests
 from difflib import SequenceMatcher
+from shared_rate_limit import shared_limiter
 
-# Step 1: Create a simple DataFrame
-data = {
-    'source': ['Sample', 'Sample'],
-    'title': ['Self-Consciousness in Modern British Fiction', 'Fictions of State: Culture and Credit in Britain, 1694-1994']
-}
-df = pd.DataFrame(data)
+# OCLC_API_URL points the lookups elsewhere, e.g. at mock_services.py for load tests
+OCLC_API_URL = os.environ.get("OCLC_API_URL", "https://www.worldcat.org")
 
 def similar(a, b):
     return SequenceMatcher(None, a.lower().strip(), b.lower().strip()).ratio()
 
 def get_oclc_for_title(title, api_key="YOUR_OCLC_API_KEY", verbose=False, threshold=0.90):
-    url = "https://www.worldcat.org/webservices/catalog/search/worldcat/opensearch"
+    url = f"{OCLC_API_URL}/webservices/catalog/search/worldcat/opensearch"
     params = {
         'q': title,
         'wskey': api_key,
         'format': 'json'
     }
-    response = requests.get(url, params=params)
+    response = shared_limiter().wrap(requests.get)(url, params=params)
     if response.status_code != 200:
         if verbose:
             print(f"Error: Received status code {response.status_code} for '{title}'")
@@ -53,8 +51,16 @@ def get_oclc_for_title(title, api_key="YOUR_OCLC_API_KEY", verbose=False, thresh
                 break
     return oclcs[:5]
 
-# Step 3: Apply function to DataFrame and create 'OCLC' column
-df['OCLC'] = df['title'].apply(get_oclc_for_title)
+if __name__ == "__main__":
+    # Step 1: Create a simple DataFrame
+    data = {
+        'source': ['Sample', 'Sample'],
+        'title': ['Self-Consciousness in Modern British Fiction', 'Fictions of State: Culture and Credit in Britain, 1694-1994']
+    }
+    df = pd.DataFrame(data)
+
+    # Step 3: Apply function to DataFrame and create 'OCLC' column
+    df['OCLC'] = df['title'].apply(get_oclc_for_title)
 
-print("\nFinal DataFrame:")
-print(df)
\ No newline at end of file
+    print("\nFinal DataFrame:")
+    print(df)
\ No newline at end of file
@@ -0,0 +1,157 @@
+import argparse
+import concurrent.futures
+import io
+import multiprocessing
+import os
+import time
+
+try:
+    import indexed_gzip as igzip
+except ImportError:  # optional: only needed for parallel dump scans
+    igzip = None
+
+from retrieve_from_open_library_dump import (
+    DUMP_PATH,
+    decode_dump_line,
+    match_record_batch,
+    merge_scan_stats,
+    new_scan_stats,
+    print_scan_stats,
+)
+
+SPACING_MB = 16
+# Lines scanned between checks of the stop event
+STOP_CHECK_LINES = 10000
+
+# Set in each worker by the pool initializer; scan_dump_parallel sets it once
+# every title has its matches, so shards still running stop early
+_stop_event = None
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+def _require_igzip():
+    if igzip is None:
+        raise ImportError("Parallel dump scanning requires indexed_gzip (pip install indexed_gzip)")
+
+def checkpoint_index_path(dump_path):
+    return dump_path + ".gzidx"
+
+def build_checkpoint_index(dump_path=DUMP_PATH, index_file=None, spacing_mb=SPACING_MB):
+    """
+    Inflate the dump once and export a zran-style checkpoint index with an
+    access point every spacing_mb MB of uncompressed data, so workers can
+    start decompressing at any offset.
+    """
+    _require_igzip()
+    index_file = index_file or checkpoint_index_path(dump_path)
+    start_time = time.time()
+    with igzip.IndexedGzipFile(dump_path, spacing=spacing_mb * 1024 * 1024) as f:
+        f.build_full_index()
+        f.export_index(index_file)
+    print(f"Checkpoint index written to {index_file} in {time.time() - start_time:.2f} seconds.")
+    return index_file
+
+def uncompressed_size(dump_path, index_file):
+    _require_igzip()
+    with igzip.IndexedGzipFile(dump_path, index_file=index_file) as f:
+        return f.seek(0, io.SEEK_END)
+
+def shard_ranges(total_size, num_shards):
+    """Split [0, total_size) into num_shards contiguous uncompressed byte ranges."""
+    step = max(1, -(-total_size // num_shards))
+    return [(start, min(start + step, total_size)) for start in range(0, total_size, step)]
+
+def scan_shard(dump_path, index_file, start, end, input_norms, max_perfect_matches=3):
+    """
+    Inflate and match the lines that start inside [start, end) of the
+    uncompressed dump. Returns (matches, stats), where matches maps
+    input_norm -> list of matches tagged with their line_offset. Stops early
+    when the pool's stop event is set.
+    """
+    pending = [n for n in dict.fromkeys(input_norms) if n]
+    matches = {n: [] for n in pending}
+    stats = new_scan_stats()
+    with igzip.IndexedGzipFile(dump_path, index_file=index_file) as f:
+        reader = io.BufferedReader(f, buffer_size=4 * 1024 * 1024)
+        position = start
+        if start > 0:
+            # Align to the first line that begins inside this shard
+            reader.seek(start - 1)
+            if reader.read(1) != b"\n":
+                position += len(reader.readline())
+        lines = 0
+        while pending and position < end:
+            lines += 1
+            if lines % STOP_CHECK_LINES == 0 and _stop_event is not None and _stop_event.is_set():
+                break
+            raw_line = reader.readline()
+            if not raw_line:
+                break
+            line_offset = position
+            position += len(raw_line)
+            record = decode_dump_line(raw_line, stats)
+            if record is None:
+                continue
+            try:
+                found = match_record_batch(record, pending)
+            except Exception:
+                continue
+            done = []
+            for input_norm, match in found:
+                match["line_offset"] = line_offset
+                matches[input_norm].append(match)
+                if len(matches[input_norm]) >= max_perfect_matches:
+                    done.append(input_norm)
+            if done:
+                pending = [n for n in pending if n not in done]
+    return matches, stats
+
+def scan_dump_parallel(input_norms, dump_path=DUMP_PATH, index_file=None, workers=None, max_perfect_matches=3, shards_per_worker=4):
+    """
+    Scan the dump in parallel shards and merge the per-shard matches in line
+    order, so each title gets the same first max_perfect_matches as a
+    sequential scan. Builds the checkpoint index first if it does not exist.
+    """
+    _require_igzip()
+    workers = workers or os.cpu_count() or 1
+    index_file = index_file or checkpoint_index_path(dump_path)
+    if not os.path.isfile(index_file):
+        build_checkpoint_index(dump_path, index_file)
+
+    input_norms = list(input_norms)
+    pending = [n for n in dict.fromkeys(input_norms) if n]
+    merged = {n: [] for n in input_norms}
+    stats = new_scan_stats()
+    ranges = shard_ranges(uncompressed_size(dump_path, index_file), workers * shards_per_worker)
+    stop_event = multiprocessing.Event()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(stop_event,)) as executor:
+        futures = [
+            executor.submit(scan_shard, dump_path, index_file, start, end, pending, max_perfect_matches)
+            for start, end in ranges
+        ]
+        # Shards are merged in order. Once every title has its matches, shards
+        # not yet started are cancelled and running ones stop at their next
+        # check of the stop event (their results are no longer needed).
+        for future in futures:
+            shard_matches_by_title, shard_stats = future.result()
+            merge_scan_stats(stats, shard_stats)
+            for input_norm, shard_matches in shard_matches_by_title.items():
+                room = max_perfect_matches - len(merged[input_norm])
+                if room > 0:
+                    merged[input_norm].extend(shard_matches[:room])
+            if all(len(merged[n]) >= max_perfect_matches for n in pending):
+                stop_event.set()
+                executor.shutdown(wait=True, cancel_futures=True)
+                break
+    print_scan_stats(stats)
+    return merged
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpoint index for parallel scans of the Open Library dump")
+    parser.add_argument("--dump", default=DUMP_PATH, help="Path to ol_dump_editions_latest.txt.gz")
+    parser.add_argument("--index-file", default=None, help="Checkpoint index path (default: <dump>.gzidx)")
+    parser.add_argument("--spacing-mb", type=int, default=SPACING_MB, help="Uncompressed MB between access points")
+    args = parser.parse_args()
+    build_checkpoint_index(args.dump, args.index_file, args.spacing_mb)
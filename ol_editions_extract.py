@@ -0,0 +1,199 @@
+import argparse
+import functools
+import gzip
+import json
+import os
+import sqlite3
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for the columnar extract
+    pa = pc = pq = None
+
+from retrieve_from_open_library_dump import (
+    DUMP_PATH,
+    decode_dump_line,
+    get_match_substring,
+    identifier_lists,
+    new_scan_stats,
+    normalize,
+    print_scan_stats,
+    score_record,
+)
+
+EXTRACT_PATH = "data/ol_editions_extract.parquet"
+# Candidate rows converted to Python objects at a time; a lookup stops once it has its matches
+CANDIDATE_BATCH = 256
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The Open Library extract requires pyarrow (pip install pyarrow)")
+
+def extract_schema():
+    return pa.schema([
+        ("ol_key", pa.string()),
+        ("title", pa.string()),
+        ("full_title", pa.string()),
+        ("title_norm", pa.string()),
+        ("full_title_norm", pa.string()),
+        ("lccn", pa.list_(pa.string())),
+        ("oclc", pa.list_(pa.string())),
+    ])
+
+def _empty_columns():
+    return {name: [] for name in extract_schema().names}
+
+def extract_editions(dump_path=DUMP_PATH, extract_path=EXTRACT_PATH, batch_size=100000):
+    """
+    Stream the editions dump once and write every edition carrying an LCCN or
+    OCLC to a compact Parquet file: OL key, raw and normalized titles, and
+    list columns of LCCNs and OCLCs (oclc and oclc_numbers combined).
+    """
+    _require_pyarrow()
+    start_time = time.time()
+    os.makedirs(os.path.dirname(extract_path) or ".", exist_ok=True)
+    tmp_path = extract_path + ".tmp"
+    schema = extract_schema()
+    stats = new_scan_stats()
+    rows = 0
+    columns = _empty_columns()
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer, gzip.open(dump_path, "rb") as f:
+        for raw_line in f:
+            record = decode_dump_line(raw_line, stats)
+            if record is None:
+                continue
+            append_record(columns, record)
+            if len(columns["ol_key"]) >= batch_size:
+                rows += len(columns["ol_key"])
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                columns = _empty_columns()
+        if columns["ol_key"]:
+            rows += len(columns["ol_key"])
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+    os.replace(tmp_path, extract_path)
+    print_scan_stats(stats)
+    print(f"Extracted {rows} editions to {extract_path} in {time.time() - start_time:.2f} seconds.")
+    return rows
+
+def extract_from_index(index_path, extract_path=EXTRACT_PATH, batch_size=100000):
+    """
+    Rewrite the extract from an ol_title_index.py index instead of the dump.
+    After a monthly `ol_title_index.py refresh` this brings the extract up to
+    date without another pass over the dump.
+    """
+    _require_pyarrow()
+    start_time = time.time()
+    os.makedirs(os.path.dirname(extract_path) or ".", exist_ok=True)
+    tmp_path = extract_path + ".tmp"
+    schema = extract_schema()
+    rows = 0
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    cursor = conn.execute("SELECT ol_key, title, full_title, lccn, oclc FROM editions ORDER BY line_offset")
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            columns = _empty_columns()
+            for ol_key, title, full_title, lccn, oclc in batch:
+                append_record(columns, {
+                    "key": ol_key,
+                    "title": title,
+                    "full_title": full_title,
+                    "lccn": json.loads(lccn),
+                    "oclc": json.loads(oclc),
+                })
+            rows += len(batch)
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+    conn.close()
+    os.replace(tmp_path, extract_path)
+    print(f"Extracted {rows} editions from {index_path} to {extract_path} in {time.time() - start_time:.2f} seconds.")
+    return rows
+
+def append_record(columns, record):
+    """Append one projected edition record to the extract's column lists."""
+    all_lccn, all_oclc = identifier_lists(record)
+    title = record.get("title") or ""
+    full_title = record.get("full_title") or ""
+    columns["ol_key"].append(record.get("key"))
+    columns["title"].append(title)
+    columns["full_title"].append(full_title)
+    columns["title_norm"].append(normalize(title))
+    columns["full_title_norm"].append(normalize(full_title))
+    columns["lccn"].append(all_lccn)
+    columns["oclc"].append(all_oclc)
+
+@functools.lru_cache(maxsize=2)
+def load_extract(extract_path=EXTRACT_PATH):
+    """Memory-map the extract; repeated lookups reuse the same table."""
+    _require_pyarrow()
+    return pq.read_table(extract_path, memory_map=True)
+
+def candidate_rows(table, input_norm, batch_size=CANDIDATE_BATCH):
+    """
+    Rows whose normalized title or full title contains input_norm, in file
+    order. The substring test is vectorized; the matching rows become dicts
+    one batch at a time, so only the batches a lookup reads are converted.
+    """
+    mask = pc.or_(
+        pc.match_substring(table["title_norm"], input_norm),
+        pc.match_substring(table["full_title_norm"], input_norm),
+    )
+    for batch in table.filter(mask).to_batches(max_chunksize=batch_size):
+        yield from batch.to_pylist()
+
+def scan_extract(input_norms, extract_path=EXTRACT_PATH, max_perfect_matches=3):
+    """
+    Match normalized titles against the extract. Candidate rows come from
+    candidate_rows and are rescored with the same rules as the dump scan, in
+    dump order, until max_perfect_matches are found.
+    Returns a dict of input_norm -> matches.
+    """
+    table = load_extract(extract_path)
+    matches = {n: [] for n in input_norms}
+    for input_norm in dict.fromkeys(input_norms):
+        if not input_norm:
+            continue
+        for row in candidate_rows(table, input_norm):
+            record = {
+                "key": row["ol_key"],
+                "title": row["title"],
+                "full_title": row["full_title"],
+                "lccn": row["lccn"],
+                "oclc": row["oclc"],
+            }
+            match = score_record(input_norm, record, row["title_norm"], row["full_title_norm"])
+            if match:
+                matches[input_norm].append(match)
+                if len(matches[input_norm]) >= max_perfect_matches:
+                    break
+    return matches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar extract of identifier-bearing Open Library editions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Write the extract from the editions dump")
+    build_parser.add_argument("--dump", default=DUMP_PATH, help="Path to ol_dump_editions_latest.txt.gz")
+    build_parser.add_argument("--extract", default=EXTRACT_PATH, help="Parquet file to write")
+    build_parser.add_argument("--from-index", default=None, help="Build from an ol_title_index.py index instead of the dump")
+    lookup_parser = subparsers.add_parser("lookup", help="Look up a title in the extract")
+    lookup_parser.add_argument("title", help="Book title to search for")
+    lookup_parser.add_argument("--extract", default=EXTRACT_PATH, help="Parquet extract to read")
+    args = parser.parse_args()
+
+    if args.command == "build" and args.from_index:
+        extract_from_index(args.from_index, args.extract)
+    elif args.command == "build":
+        extract_editions(args.dump, args.extract)
+    else:
+        start_time = time.time()
+        input_norm = get_match_substring(normalize(args.title))
+        matches = scan_extract([input_norm], args.extract)[input_norm]
+        print(f"Lookup completed in {time.time() - start_time:.4f} seconds.")
+        for i, match in enumerate(matches, 1):
+            print(f"Match {i}: {match['display_title']} | LCCN: {match['lccn']} | OCLC: {match['oclc']} | Score: {match['score']}")
+        if not matches:
+            print("No matches found.")
@@ -0,0 +1,420 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import sqlite3
+import time
+
+from retrieve_from_open_library_dump import (
+    DUMP_PATH,
+    decode_dump_line,
+    get_match_substring,
+    identifier_lists,
+    new_scan_stats,
+    normalize,
+    print_scan_stats,
+    score_record,
+)
+
+INDEX_PATH = "data/ol_title_index.sqlite"
+# Candidates fetched from the trigram index per lookup before rescoring
+FTS_TOP_K = 200
+# Keys read from each of the prefix and trigram lookups before the shortest are kept
+FTS_SCAN_LIMIT = 1000
+# Upper bound of a prefix range over norm_key: sorts after any key that starts with the prefix
+PREFIX_END = "\U0010ffff"
+
+SCHEMA = """
+CREATE TABLE editions (
+    id INTEGER PRIMARY KEY,
+    ol_key TEXT,
+    title TEXT,
+    full_title TEXT,
+    lccn TEXT,
+    oclc TEXT,
+    oclc_numbers TEXT,
+    line_offset INTEGER,
+    revision INTEGER,
+    last_modified TEXT,
+    dump_version TEXT
+);
+CREATE TABLE title_keys (
+    norm_key TEXT NOT NULL,
+    edition_id INTEGER NOT NULL
+);
+CREATE TABLE builds (
+    dump_version TEXT,
+    dump_path TEXT,
+    mode TEXT,
+    built_at TEXT,
+    inserted INTEGER,
+    updated INTEGER,
+    deleted INTEGER
+);
+"""
+
+# Columns added after the first index format; older indexes are migrated on refresh
+VERSION_COLUMNS = {"revision": "INTEGER", "last_modified": "TEXT", "dump_version": "TEXT"}
+
+def dump_version_for(dump_path):
+    """
+    Identify a dump by the date in its file name (ol_dump_editions_2025-04-30.txt.gz),
+    falling back to the file's modification date for *_latest downloads.
+    """
+    match = re.search(r"(\d{4}-\d{2}-\d{2})", os.path.basename(dump_path))
+    if match:
+        return match.group(1)
+    return time.strftime("%Y-%m-%d", time.localtime(os.path.getmtime(dump_path)))
+
+def record_version(record):
+    """Return (revision, last_modified) for an edition record."""
+    last_modified = record.get("last_modified")
+    if isinstance(last_modified, dict):
+        last_modified = last_modified.get("value")
+    return record.get("revision"), last_modified
+
+def edition_row(record, line_offset, dump_version):
+    """Column values for an editions row, without the id."""
+    all_lccn, all_oclc = identifier_lists(record)
+    revision, last_modified = record_version(record)
+    return (
+        record.get("key"),
+        record.get("title", ""),
+        record.get("full_title", ""),
+        json.dumps(all_lccn),
+        json.dumps(all_oclc),
+        json.dumps(record.get("oclc_numbers")),
+        line_offset,
+        revision,
+        last_modified,
+        dump_version,
+    )
+
+def title_keys_for(record):
+    return {k for k in (normalize(record.get("title", "")), normalize(record.get("full_title", ""))) if k}
+
+def build_title_index(dump_path=DUMP_PATH, index_path=INDEX_PATH, batch_size=10000, fts=True, dump_version=None):
+    """
+    Stream the editions dump once and store every edition that carries an LCCN or
+    OCLC, keyed by its normalized title and full_title. line_offset is the byte
+    offset of the source line in the decompressed dump. With fts=True a trigram
+    full-text index over the keys is added for substring lookups.
+    The index is written to a temporary file and moved into place when complete.
+    """
+    start_time = time.time()
+    dump_version = dump_version or dump_version_for(dump_path)
+    tmp_path = index_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+
+    editions = []
+    keys = []
+    edition_id = 0
+    offset = 0
+    stats = new_scan_stats()
+    with gzip.open(dump_path, "rb") as f:
+        for raw_line in f:
+            line_offset = offset
+            offset += len(raw_line)
+            record = decode_dump_line(raw_line, stats)
+            if record is None:
+                continue
+            edition_id += 1
+            editions.append((edition_id,) + edition_row(record, line_offset, dump_version))
+            for norm_key in title_keys_for(record):
+                keys.append((norm_key, edition_id))
+            if len(editions) >= batch_size:
+                _flush(conn, editions, keys)
+                editions, keys = [], []
+    _flush(conn, editions, keys)
+
+    conn.execute("CREATE INDEX idx_title_keys_norm_key ON title_keys(norm_key)")
+    conn.execute("CREATE INDEX idx_title_keys_edition_id ON title_keys(edition_id)")
+    conn.execute("CREATE INDEX idx_editions_ol_key ON editions(ol_key)")
+    if fts:
+        create_fts_index(conn)
+    _record_build(conn, dump_version, dump_path, "build", edition_id, 0, 0)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_path)
+    elapsed = time.time() - start_time
+    print_scan_stats(stats)
+    print(f"Indexed {edition_id} editions from {stats['lines']} dump lines in {elapsed:.2f} seconds.")
+    return edition_id
+
+def _flush(conn, editions, keys):
+    conn.executemany("INSERT INTO editions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", editions)
+    conn.executemany("INSERT INTO title_keys VALUES (?, ?)", keys)
+
+def _record_build(conn, dump_version, dump_path, mode, inserted, updated, deleted):
+    conn.execute(
+        "INSERT INTO builds VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (dump_version, dump_path, mode, time.strftime("%Y-%m-%dT%H:%M:%S"), inserted, updated, deleted),
+    )
+
+def _migrate(conn):
+    """Bring an index built by an older version of this script up to the current schema."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(editions)")}
+    for name, sql_type in VERSION_COLUMNS.items():
+        if name not in columns:
+            conn.execute(f"ALTER TABLE editions ADD COLUMN {name} {sql_type}")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS builds (dump_version TEXT, dump_path TEXT, mode TEXT, "
+        "built_at TEXT, inserted INTEGER, updated INTEGER, deleted INTEGER)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_title_keys_edition_id ON title_keys(edition_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_editions_ol_key ON editions(ol_key)")
+
+def _drop_title_keys(conn, edition_ids, fts):
+    """Delete the title keys of the given editions, keeping the trigram index in sync."""
+    for edition_id in edition_ids:
+        if fts:
+            for rowid, norm_key in conn.execute(
+                "SELECT rowid, norm_key FROM title_keys WHERE edition_id = ?", (edition_id,)
+            ).fetchall():
+                conn.execute(
+                    "INSERT INTO title_fts(title_fts, rowid, norm_key) VALUES('delete', ?, ?)", (rowid, norm_key)
+                )
+        conn.execute("DELETE FROM title_keys WHERE edition_id = ?", (edition_id,))
+
+def _add_title_keys(conn, edition_id, record, fts):
+    for norm_key in title_keys_for(record):
+        cursor = conn.execute("INSERT INTO title_keys VALUES (?, ?)", (norm_key, edition_id))
+        if fts:
+            conn.execute("INSERT INTO title_fts(rowid, norm_key) VALUES (?, ?)", (cursor.lastrowid, norm_key))
+
+def _apply_refresh_batch(conn, batch, dump_version, fts, counts):
+    """
+    Insert new editions and update changed ones from a batch of (line_offset, record).
+    Unchanged editions only get their line_offset moved to the new dump.
+    """
+    ol_keys = [record.get("key") for _, record in batch]
+    placeholders = ",".join("?" * len(ol_keys))
+    existing = {
+        ol_key: (edition_id, revision, last_modified, old_offset)
+        for ol_key, edition_id, revision, last_modified, old_offset in conn.execute(
+            f"SELECT ol_key, id, revision, last_modified, line_offset FROM editions WHERE ol_key IN ({placeholders})",
+            ol_keys,
+        )
+    }
+    moved = []
+    conn.executemany("INSERT OR IGNORE INTO seen_keys VALUES (?)", [(k,) for k in ol_keys])
+    for line_offset, record in batch:
+        row = edition_row(record, line_offset, dump_version)
+        current = existing.get(record.get("key"))
+        if current is None:
+            cursor = conn.execute(
+                "INSERT INTO editions (ol_key, title, full_title, lccn, oclc, oclc_numbers, line_offset, "
+                "revision, last_modified, dump_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+            )
+            _add_title_keys(conn, cursor.lastrowid, record, fts)
+            counts["inserted"] += 1
+        elif current[1:3] != record_version(record):
+            edition_id = current[0]
+            conn.execute(
+                "UPDATE editions SET ol_key = ?, title = ?, full_title = ?, lccn = ?, oclc = ?, oclc_numbers = ?, "
+                "line_offset = ?, revision = ?, last_modified = ?, dump_version = ? WHERE id = ?",
+                row + (edition_id,),
+            )
+            _drop_title_keys(conn, [edition_id], fts)
+            _add_title_keys(conn, edition_id, record, fts)
+            counts["updated"] += 1
+        elif current[3] != line_offset:
+            moved.append((line_offset, current[0]))
+    conn.executemany("UPDATE editions SET line_offset = ? WHERE id = ?", moved)
+
+def refresh_title_index(dump_path=DUMP_PATH, index_path=INDEX_PATH, batch_size=5000, dump_version=None):
+    """
+    Bring an existing index up to date with a newer editions dump instead of
+    rebuilding it. Editions are compared by OL key and (revision, last_modified):
+    new ones are inserted, changed ones are rewritten, and editions that are gone
+    from the dump (or no longer carry an identifier) are deleted. Unchanged rows
+    keep the dump_version their data came from, but their line_offset is moved
+    to the new dump so read_dump_line and dump-order ranking stay correct.
+    All changes are applied in one transaction.
+    """
+    start_time = time.time()
+    dump_version = dump_version or dump_version_for(dump_path)
+    conn = sqlite3.connect(index_path)
+    _migrate(conn)
+    fts = has_fts_index(conn)
+    conn.execute("CREATE TEMP TABLE seen_keys (ol_key TEXT PRIMARY KEY)")
+    counts = {"inserted": 0, "updated": 0, "deleted": 0}
+    stats = new_scan_stats()
+    batch = []
+    offset = 0
+    with conn, gzip.open(dump_path, "rb") as f:
+        for raw_line in f:
+            line_offset = offset
+            offset += len(raw_line)
+            record = decode_dump_line(raw_line, stats)
+            if record is None or not record.get("key"):
+                continue
+            batch.append((line_offset, record))
+            if len(batch) >= batch_size:
+                _apply_refresh_batch(conn, batch, dump_version, fts, counts)
+                batch = []
+        if batch:
+            _apply_refresh_batch(conn, batch, dump_version, fts, counts)
+
+        gone = [
+            row[0] for row in conn.execute(
+                "SELECT id FROM editions WHERE ol_key IS NULL OR ol_key NOT IN (SELECT ol_key FROM seen_keys)"
+            )
+        ]
+        _drop_title_keys(conn, gone, fts)
+        conn.executemany("DELETE FROM editions WHERE id = ?", [(edition_id,) for edition_id in gone])
+        counts["deleted"] = len(gone)
+        _record_build(conn, dump_version, dump_path, "refresh", counts["inserted"], counts["updated"], counts["deleted"])
+    conn.close()
+    print_scan_stats(stats)
+    print(
+        f"Refreshed index to dump {dump_version}: {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['deleted']} deleted in {time.time() - start_time:.2f} seconds."
+    )
+    return counts
+
+def create_fts_index(conn):
+    """
+    (Re)build the SQLite FTS5 trigram index over title_keys.norm_key.
+    It is an external-content table, so only the trigram postings are stored.
+    """
+    conn.execute("DROP TABLE IF EXISTS title_fts")
+    conn.execute(
+        "CREATE VIRTUAL TABLE title_fts USING fts5("
+        "norm_key, content='title_keys', content_rowid='rowid', tokenize='trigram')"
+    )
+    conn.execute("INSERT INTO title_fts(title_fts) VALUES('rebuild')")
+
+def has_fts_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'title_fts'").fetchone() is not None
+
+def _record_from_row(row):
+    """Rebuild the projected edition record stored in the index."""
+    ol_key, title, full_title, lccn, oclc, oclc_numbers, line_offset = row
+    record = {"key": ol_key, "title": title, "lccn": json.loads(lccn), "oclc": json.loads(oclc)}
+    if full_title:
+        record["full_title"] = full_title
+    numbers = json.loads(oclc_numbers)
+    if numbers is not None:
+        record["oclc_numbers"] = numbers
+    return record, line_offset
+
+EDITION_COLUMNS = "e.ol_key, e.title, e.full_title, e.lccn, e.oclc, e.oclc_numbers, e.line_offset"
+
+# Candidates are the top_k shortest keys among the exact key, up to
+# FTS_SCAN_LIMIT keys starting with the input (a range on the norm_key index)
+# and up to FTS_SCAN_LIMIT keys containing it (the trigram table). score_record
+# only accepts titles up to 1.5x the input length, so the shortest keys are the
+# ones that can match. Every part is an indexed lookup with a bounded number of
+# rows, so a common word costs no more than a rare title. Candidates are then
+# rescored in dump order.
+
+def candidate_rows(conn, input_norm, top_k=FTS_TOP_K, fts=True, scan_limit=FTS_SCAN_LIMIT):
+    parts = [
+        "SELECT rowid, edition_id, norm_key FROM title_keys WHERE norm_key = ?",
+        "SELECT * FROM (SELECT rowid, edition_id, norm_key FROM title_keys WHERE norm_key > ? AND norm_key < ? LIMIT ?)",
+    ]
+    params = [input_norm, input_norm, input_norm + PREFIX_END, scan_limit]
+    # A quoted phrase against the trigram tokenizer is a substring query, which
+    # is exactly the containment the scoring rules require; it needs 3 characters
+    if fts and len(input_norm) >= 3:
+        parts.append(
+            "SELECT k.rowid, k.edition_id, k.norm_key FROM "
+            "(SELECT rowid FROM title_fts WHERE title_fts MATCH ? LIMIT ?) f JOIN title_keys k ON k.rowid = f.rowid"
+        )
+        params += ['"' + input_norm.replace('"', '""') + '"', scan_limit]
+    return conn.execute(
+        f"""
+        SELECT {EDITION_COLUMNS}
+        FROM (
+            SELECT edition_id FROM ({" UNION ".join(parts)})
+            ORDER BY length(norm_key), edition_id LIMIT ?
+        ) k
+        JOIN editions e ON e.id = k.edition_id
+        GROUP BY e.id
+        ORDER BY e.line_offset
+        """,
+        params + [top_k],
+    ).fetchall()
+
+def lookup_title_index(input_norm, index_path=INDEX_PATH, max_perfect_matches=3, top_k=FTS_TOP_K):
+    """
+    Return matches for a normalized input title from the index.
+    Candidates come from candidate_rows: the exact key, keys starting with
+    input_norm and, if the index has the trigram table, keys containing it.
+    Without the trigram table (built with --no-fts) titles that only contain
+    input_norm further in are not found; add it with the fts command. Each
+    candidate is rescored with the same rules as the dump scan and returned
+    in dump order.
+    """
+    if not input_norm:
+        return []
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        rows = candidate_rows(conn, input_norm, top_k, has_fts_index(conn))
+    finally:
+        conn.close()
+
+    matches = []
+    for row in rows:
+        record, line_offset = _record_from_row(row)
+        match = score_record(input_norm, record)
+        if match:
+            match["line_offset"] = line_offset
+            matches.append(match)
+            if len(matches) >= max_perfect_matches:
+                break
+    return matches
+
+def read_dump_line(dump_path, line_offset):
+    """Return the full JSON record stored at a decompressed byte offset of the dump."""
+    with gzip.open(dump_path, "rb") as f:
+        f.seek(line_offset)
+        fields = f.readline().decode("utf-8").rstrip("\n").split("\t")
+    return json.loads(fields[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalized-title index over the Open Library editions dump")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the index from the editions dump")
+    build_parser.add_argument("--dump", default=DUMP_PATH, help="Path to ol_dump_editions_latest.txt.gz")
+    build_parser.add_argument("--index", default=INDEX_PATH, help="Path of the SQLite index to write")
+    build_parser.add_argument("--no-fts", action="store_true", help="Skip the trigram full-text index")
+    refresh_parser = subparsers.add_parser("refresh", help="Apply a newer editions dump to an existing index")
+    refresh_parser.add_argument("--dump", default=DUMP_PATH, help="Path to the newer editions dump")
+    refresh_parser.add_argument("--index", default=INDEX_PATH, help="Path of the SQLite index to update")
+    refresh_parser.add_argument("--dump-version", default=None, help="Version label (default: date from the dump file name)")
+    fts_parser = subparsers.add_parser("fts", help="Add the trigram full-text index to an existing index")
+    fts_parser.add_argument("--index", default=INDEX_PATH, help="Path of the SQLite index")
+    lookup_parser = subparsers.add_parser("lookup", help="Look up a title in the index")
+    lookup_parser.add_argument("title", help="Book title to search for")
+    lookup_parser.add_argument("--index", default=INDEX_PATH, help="Path of the SQLite index")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_title_index(args.dump, args.index, fts=not args.no_fts)
+    elif args.command == "refresh":
+        refresh_title_index(args.dump, args.index, dump_version=args.dump_version)
+    elif args.command == "fts":
+        conn = sqlite3.connect(args.index)
+        create_fts_index(conn)
+        conn.commit()
+        conn.close()
+        print(f"Trigram index added to {args.index}")
+    else:
+        start_time = time.time()
+        input_norm = get_match_substring(normalize(args.title))
+        matches = lookup_title_index(input_norm, args.index)
+        print(f"Lookup completed in {time.time() - start_time:.4f} seconds.")
+        for i, match in enumerate(matches, 1):
+            print(f"Match {i}: {match['display_title']} | LCCN: {match['lccn']} | OCLC: {match['oclc']} | Score: {match['score']}")
+        if not matches:
+            print("No matches found.")
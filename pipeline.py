@@ -0,0 +1,183 @@
+import argparse
+import importlib
+import io
+import logging
+import os
+import time
+
+import pandas as pd
+
+from results_store import EXPORT_COLUMNS, ResultsStore
+
+CHECKPOINT_DIR = "data/checkpoints"
+STAGES = ["01", "02", "03", "04", "05", "06"]
+
+# pandas' default na_values: strings that read_csv would have turned into NaN
+CSV_NA_STRINGS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+def step(name):
+    """Import a numbered step script as a module, e.g. step("02") -> 02_make_source_columns."""
+    for filename in sorted(os.listdir(os.path.dirname(os.path.abspath(__file__)))):
+        if filename.startswith(f"{name}_") and filename.endswith(".py"):
+            return importlib.import_module(filename[:-3])
+    raise ImportError(f"No step script for stage {name}")
+
+def as_if_read_from_csv(df):
+    """
+    Blank out the strings a CSV round trip would have read back as NaN
+    (e.g. the "nan" left by astype(str)), so stages see the same missing
+    values as when each step re-reads the previous step's CSV.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].mask(df[col].isin(CSV_NA_STRINGS))
+    return df
+
+def csv_round_trip(df):
+    """
+    df as the next step script would read it back from its CSV: dates
+    become text, numeric-looking identifiers become numbers and blanks
+    become NaN, so in-memory stages write the same bundle as `make bundle`.
+    """
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+def _text(value):
+    if isinstance(value, (list, tuple)) or not pd.isna(value):
+        return str(value)
+    return None
+
+def parquet_ready(df):
+    """Columns of mixed Python types (dates next to free text, lists next to blanks) become strings so Parquet can type them."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            kinds = {type(value) for value in df[col] if isinstance(value, (list, tuple)) or not pd.isna(value)}
+            if kinds and kinds != {str}:
+                df[col] = df[col].map(_text)
+    return df
+
+class Pipeline:
+    """
+    Steps 01-06 in one process, passing DataFrames in memory instead of
+    through the intermediate CSVs. Each stage's output can also be written
+    as a Parquet checkpoint; start_at resumes from the previous stage's
+    checkpoint. Wall time is recorded per stage.
+    """
+
+    def __init__(self, checkpoint_dir=None, write_csv=False, filter_red=False, lookup_kwargs=None, skip_lookup=False, delta=False):
+        self.checkpoint_dir = checkpoint_dir
+        self.write_csv = write_csv
+        self.filter_red = filter_red
+        self.lookup_kwargs = lookup_kwargs or {}
+        self.skip_lookup = skip_lookup
+        self.delta = delta
+        self.data = {}
+        self.timings = []
+
+    def checkpoint_path(self, key):
+        return os.path.join(self.checkpoint_dir or CHECKPOINT_DIR, f"{key}.parquet")
+
+    def save(self, key, df):
+        self.data[key] = df
+        if self.checkpoint_dir:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            parquet_ready(df).to_parquet(self.checkpoint_path(key), index=False)
+
+    def load(self, key):
+        if key not in self.data:
+            path = self.checkpoint_path(key)
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"{key} is not in memory and has no checkpoint at {path}; start from an earlier stage")
+            self.data[key] = pd.read_parquet(path)
+        return self.data[key]
+
+    def stage_01(self):
+        df = step("01").load_target_persons(filter_red=self.filter_red, delta=self.delta)
+        if self.write_csv:
+            df.to_csv('data/target_persons.csv', index=False, encoding='utf-8-sig')
+        self.save("target_persons", as_if_read_from_csv(df))
+
+    def stage_02(self):
+        module = step("02")
+        make = module.make_skeletal_dataframe_delta if self.delta else module.make_skeletal_dataframe
+        df = make(self.load("target_persons"))
+        if self.write_csv:
+            df.to_csv('data/df_persons_skeletal.csv', index=False, encoding='utf-8-sig')
+        self.save("df_persons_skeletal", as_if_read_from_csv(df))
+
+    def stage_03(self):
+        module = step("03")
+        sources = module.unique_source_values(self.load("df_persons_skeletal"))
+        # Step 04 and the Makefile read the titles from here, and it is small
+        module.write_unique_sources(sources)
+        self.save("unique_sources", pd.DataFrame({"title": sources}))
+
+    def stage_04(self):
+        titles = self.load("unique_sources")["title"].tolist()
+        if not self.skip_lookup:
+            step("04").main(titles=titles, **self.lookup_kwargs)
+        store = ResultsStore()
+        titles_lccn = pd.DataFrame(store.ledger_rows(), columns=EXPORT_COLUMNS)
+        store.close()
+        self.save("titles_lccn", csv_round_trip(titles_lccn))
+
+    def stage_05(self):
+        module = step("05")
+        add = module.add_lccns_delta if self.delta else module.add_lccns
+        df = add(self.load("df_persons_skeletal").copy(), self.load("titles_lccn"))
+        if self.write_csv:
+            df.to_csv('data/df_persons_skeletal_with_lccn.csv', index=False, encoding='utf-8-sig')
+        self.save("df_persons_skeletal_with_lccn", csv_round_trip(df))
+
+    def stage_06(self):
+        module = step("06")
+        missing_path = 'data/missing_titles.csv'
+        missing_titles = pd.read_csv(missing_path, encoding='utf-8-sig') if os.path.isfile(missing_path) else pd.DataFrame()
+        module.write_bundle(self.load("df_persons_skeletal_with_lccn"), self.load("titles_lccn"), missing_titles)
+        print(f"Bundled workbook written to {module.BUNDLE_PATH}")
+
+    def run(self, start_at="01", stop_after="06"):
+        for name in STAGES[STAGES.index(start_at):STAGES.index(stop_after) + 1]:
+            print(f"=== Stage {name} ===")
+            start = time.perf_counter()
+            getattr(self, f"stage_{name}")()
+            self.timings.append((name, time.perf_counter() - start))
+        self.print_timings()
+
+    def print_timings(self):
+        print("\nStage timings:")
+        for name, seconds in self.timings:
+            print(f"  {name}: {seconds:8.2f}s")
+        print(f"  total: {sum(seconds for _, seconds in self.timings):6.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run steps 01-06 in one process")
+    parser.add_argument('--filter-red', action='store_true', help='Only include rows with red "Researcher/Date" cells')
+    parser.add_argument('--checkpoints', nargs='?', const=CHECKPOINT_DIR, default=None,
+                        help=f'Write a Parquet checkpoint after each stage (default directory: {CHECKPOINT_DIR})')
+    parser.add_argument('--start-at', choices=STAGES, default="01", help='First stage to run; earlier outputs come from checkpoints')
+    parser.add_argument('--stop-after', choices=STAGES, default="06", help='Last stage to run')
+    parser.add_argument('--write-csv', action='store_true', help='Also write the intermediate CSVs the step scripts use')
+    parser.add_argument('--delta', action='store_true', help='Steps 01, 02 and 05: only process rows that are new or changed since the last --delta run')
+    parser.add_argument('--skip-lookup', action='store_true', help='Use the results already in the store instead of running step 04 lookups')
+    parser.add_argument('--skip-openlib', action='store_true', help='Step 04: query LOC only')
+    parser.add_argument('--cascade', action='store_true', help='Step 04: resolve titles through the backend cascade')
+    parser.add_argument('--quiet', action='store_true', help='Step 04: log LOC diagnostics instead of printing every response')
+    args = parser.parse_args()
+    if STAGES.index(args.start_at) > STAGES.index(args.stop_after):
+        parser.error("--start-at comes after --stop-after")
+    if args.quiet:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    pipeline = Pipeline(
+        checkpoint_dir=args.checkpoints,
+        write_csv=args.write_csv,
+        filter_red=args.filter_red,
+        lookup_kwargs={"use_openlib": not args.skip_openlib, "cascade": args.cascade, "quiet": args.quiet},
+        skip_lookup=args.skip_lookup,
+        delta=args.delta,
+    )
+    pipeline.run(args.start_at, args.stop_after)
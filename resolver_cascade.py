@@ -0,0 +1,362 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from get_lccn_from_title import (
+    LOC_TIMEOUT,
+    SRU_URL,
+    build_sru_url,
+    parse_mods_records,
+    record_title_score,
+)
+from http_cache import ResponseCache, cached_get
+from marc_extract import MARC_EXTRACT_PATH
+from marc_index import MARC_PATH, marc_index_path
+from ol_editions_extract import EXTRACT_PATH
+from ol_title_index import INDEX_PATH
+from retrieve_from_open_library_dump import get_match_substring, normalize
+from shared_rate_limit import shared_limiter
+
+STATS_PATH = "data/resolver_stats.json"
+CONFIDENT_SCORE = 95
+HEDGE_DELAY = 2.0
+
+def resolution(title, source, lccns=(), oclcs=(), score=0):
+    """
+    The result every backend returns: the same keys step 04 writes to its CSV
+    (lccn, alt_lccn, oclc, alt_oclc, source) plus the backend's match score.
+    A missing LCCN or OCLC is an empty string.
+    """
+    lccns = [str(l) for l in dict.fromkeys(lccns) if l]
+    oclcs = [str(o) for o in dict.fromkeys(oclcs) if o]
+    return {
+        "title": title,
+        "source": source,
+        "lccn": lccns[0] if lccns else '',
+        "alt_lccn": lccns[1:],
+        "oclc": oclcs[0] if oclcs else '',
+        "alt_oclc": oclcs[1:],
+        "score": score,
+    }
+
+def no_resolution(title):
+    return resolution(title, "None")
+
+class OpenLibraryBackend:
+    """Open Library editions via the columnar extract, or the title index if there is no extract."""
+
+    name = "OpenLibrary"
+    local = True
+
+    def __init__(self, extract_path=EXTRACT_PATH, index_path=INDEX_PATH):
+        self.extract_path = extract_path
+        self.index_path = index_path
+
+    def available(self):
+        return bool(self.extract_path and os.path.isfile(self.extract_path)) or bool(self.index_path and os.path.isfile(self.index_path))
+
+    def resolve(self, title):
+        input_norm = get_match_substring(normalize(title))
+        if self.extract_path and os.path.isfile(self.extract_path):
+            from ol_editions_extract import scan_extract
+            matches = scan_extract([input_norm], self.extract_path)[input_norm]
+        else:
+            from ol_title_index import lookup_title_index
+            matches = lookup_title_index(input_norm, self.index_path)
+        if not matches:
+            return None
+        return resolution(
+            title,
+            self.name,
+            [l for match in matches for l in match["lccn"]],
+            [o for match in matches for o in match["oclc"]],
+            matches[0]["score"],
+        )
+
+class MarcBackend:
+    """The LC MARC BooksAll file via its columnar extract (marc_extract.py), or its offset index if there is no extract."""
+
+    name = "MARC"
+    local = True
+
+    def __init__(self, index_path=None, extract_path=MARC_EXTRACT_PATH):
+        self.index_path = index_path or marc_index_path(MARC_PATH)
+        self.extract_path = extract_path
+
+    def available(self):
+        return bool(self.extract_path and os.path.isfile(self.extract_path)) or bool(self.index_path and os.path.isfile(self.index_path))
+
+    def resolve(self, title):
+        input_norm = get_match_substring(normalize(title))
+        if self.extract_path and os.path.isfile(self.extract_path):
+            from marc_extract import scan_marc_extract
+            matches = scan_marc_extract([input_norm], self.extract_path)[input_norm]
+        else:
+            from marc_index import lookup_marc_title
+            matches = lookup_marc_title(input_norm, self.index_path)
+        if not matches:
+            return None
+        return resolution(
+            title,
+            self.name,
+            [l for match in matches for l in match["lccn"]],
+            [o for match in matches for o in match["oclc"]],
+            matches[0]["score"],
+        )
+
+class LocSruBackend:
+    """
+    LOC SRU title search. Records are scored against the title the same way
+    as the batched CQL path, and only those scoring 80 or more are kept.
+    """
+
+    name = "LOC"
+    local = False
+
+    def __init__(self, cache=None, timeout=LOC_TIMEOUT, breaker=None, base_url=SRU_URL):
+        self.cache = cache
+        self.timeout = timeout
+        self.breaker = breaker
+        self.base_url = base_url
+
+    def available(self):
+        return True
+
+    def resolve(self, title):
+        get = shared_limiter().wrap(requests.get)
+        if self.breaker is not None:
+            get = self.breaker.guard(get)
+        response = cached_get(build_sru_url(title, self.base_url), cache=self.cache, get=get, timeout=self.timeout)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"HTTP {response.status_code}")
+        try:
+            records, _ = parse_mods_records(response.text)
+        except ET.ParseError:
+            return None
+        scored = sorted(((record_title_score(title, record), record) for record in records), key=lambda pair: pair[0], reverse=True)
+        scored = [(score, record) for score, record in scored if score >= 80]
+        if not scored:
+            return None
+        # Identifiers of the scored records, best match first; a missing one stays out of the lists
+        lccns = [lccn for _, record in scored for lccn in record["lccns"]]
+        oclcs = [oclc for _, record in scored for oclc in record["oclcs"]]
+        return resolution(title, self.name, lccns, oclcs, scored[0][0])
+
+class OclcBackend:
+    """WorldCat opensearch (oclc.py). Gives OCLC numbers only, so its results are never confident."""
+
+    name = "OCLC"
+    local = False
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.environ.get("OCLC_API_KEY")
+
+    def available(self):
+        return bool(self.api_key)
+
+    def resolve(self, title):
+        from oclc import get_oclc_for_title
+        oclcs = get_oclc_for_title(title, api_key=self.api_key)
+        if not oclcs:
+            return None
+        # get_oclc_for_title only keeps titles with >= 0.90 similarity
+        return resolution(title, self.name, oclcs=oclcs, score=90)
+
+class ResolverCascade:
+    """
+    Resolve titles through backends in cost order: local ones (no network)
+    first, then remote ones. Within each group the order follows the
+    backends' recorded mean latency divided by hit rate, so cheap and useful
+    backends go first. Local backends run one after another. Remote backends
+    are raced: if the current one has not answered within hedge_delay
+    seconds, the next one is started alongside it. Once no backend is left
+    to start, a remote backend still slow after hedge_delay is sent the same
+    request again (once per lookup) through its own limiter and breaker, and
+    whichever of the two answers first is used. The first confident
+    result (an LCCN scoring at least confident_score) ends the lookup;
+    otherwise the best result seen wins. Stats are kept per backend and saved
+    to stats_path so the ordering carries over between runs.
+    """
+
+    def __init__(self, backends, confident_score=CONFIDENT_SCORE, hedge_delay=HEDGE_DELAY, max_workers=4, stats_path=STATS_PATH):
+        self.backends = [backend for backend in backends if backend.available()]
+        self.confident_score = confident_score
+        self.hedge_delay = hedge_delay
+        self.stats_path = stats_path
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.hedges = 0
+        self._lock = threading.Lock()
+        self.stats = {backend.name: {"calls": 0, "hits": 0, "errors": 0, "seconds": 0.0} for backend in self.backends}
+        if stats_path and os.path.isfile(stats_path):
+            with open(stats_path, "r", encoding="utf-8") as f:
+                for name, saved in json.load(f).items():
+                    if name in self.stats:
+                        self.stats[name].update(saved)
+
+    def expected_cost(self, backend):
+        """Mean seconds per hit; untried backends cost 0 so they get tried."""
+        stats = self.stats[backend.name]
+        if not stats["calls"]:
+            return 0.0
+        mean_latency = stats["seconds"] / stats["calls"]
+        hit_rate = stats["hits"] / stats["calls"]
+        return mean_latency / max(hit_rate, 0.05)
+
+    def ordered_backends(self):
+        return sorted(self.backends, key=lambda backend: (not backend.local, self.expected_cost(backend)))
+
+    def is_confident(self, result):
+        return result is not None and bool(result["lccn"]) and result["score"] >= self.confident_score
+
+    @staticmethod
+    def better(current, candidate):
+        if candidate is None:
+            return current
+        if current is None:
+            return candidate
+        rank = lambda result: (bool(result["lccn"]), result["score"])
+        return candidate if rank(candidate) > rank(current) else current
+
+    def _call(self, backend, title, start=None, race=None):
+        """
+        Run one backend; returns (result, failed) and records its latency and
+        outcome. A request and its hedged duplicate share start (when the first
+        was sent) and race, so only the one that finishes first is recorded.
+        """
+        start = start or time.perf_counter()
+        failed = False
+        counted = True
+        try:
+            result = backend.resolve(title)
+        except CircuitOpenError:
+            result, failed, counted = None, True, False
+        except Exception as e:
+            print(f"{backend.name} lookup failed for '{title}': {e}")
+            result, failed = None, True
+        with self._lock:
+            if race is not None:
+                if race:
+                    return result, failed  # the other request of the pair already answered
+                race.append(backend.name)
+            if counted:
+                stats = self.stats[backend.name]
+                stats["calls"] += 1
+                stats["seconds"] += time.perf_counter() - start
+                stats["hits"] += result is not None
+                stats["errors"] += failed
+        return result, failed
+
+    def _submit(self, running, backend, title, start=None, race=None):
+        start = start or time.perf_counter()
+        race = [] if race is None else race
+        running[self.executor.submit(self._call, backend, title, start, race)] = (backend, start, race)
+
+    def resolve(self, title):
+        """
+        Resolution for a title: the first confident one, else the best one,
+        else no_resolution. Returns None when nothing matched and a backend
+        failed, so the caller can retry the title later.
+        """
+        best = None
+        incomplete = False
+        ordered = self.ordered_backends()
+        for backend in [backend for backend in ordered if backend.local]:
+            result, failed = self._call(backend, title)
+            incomplete |= failed
+            if self.is_confident(result):
+                return result
+            best = self.better(best, result)
+
+        queue = [backend for backend in ordered if not backend.local]
+        running = {}
+        duplicated = set()
+        while queue or running:
+            if queue and not running:
+                self._submit(running, queue.pop(0), title)
+            slow = [entry for entry in running.values() if entry[0].name not in duplicated]
+            done, _ = concurrent.futures.wait(
+                running, timeout=self.hedge_delay if queue or slow else None, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                self.hedges += 1
+                if queue:
+                    # Hedge: the slow backend keeps going, the next one starts now
+                    self._submit(running, queue.pop(0), title)
+                else:
+                    # Nothing left to start: send the longest-running request again
+                    backend, start, race = slow[0]
+                    duplicated.add(backend.name)
+                    self._submit(running, backend, title, start, race)
+                continue
+            for future in done:
+                if future not in running:
+                    continue  # lost the race to its pair in this same batch
+                _, _, race = running.pop(future)
+                for other in [other for other, entry in running.items() if entry[2] is race]:
+                    # The slower request of a hedged pair is ignored; it finishes in the background
+                    running.pop(other)
+                result, failed = future.result()
+                incomplete |= failed
+                if self.is_confident(result):
+                    # Slower requests still in flight finish in the background
+                    return result
+                best = self.better(best, result)
+        if best is None:
+            return None if incomplete else no_resolution(title)
+        return best
+
+    def resolve_many(self, titles):
+        return {title: self.resolve(title) for title in dict.fromkeys(titles)}
+
+    def save_stats(self):
+        if not self.stats_path:
+            return
+        os.makedirs(os.path.dirname(self.stats_path) or ".", exist_ok=True)
+        with self._lock:
+            snapshot = json.dumps(self.stats, indent=2)
+        with open(self.stats_path, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+
+    def print_stats(self):
+        for backend in self.ordered_backends():
+            stats = self.stats[backend.name]
+            calls = stats["calls"] or 1
+            print(f"{backend.name}: {stats['calls']} calls, {stats['hits'] / calls:.0%} hits, "
+                  f"{stats['errors']} errors, {stats['seconds'] / calls:.2f}s mean")
+        print(f"Hedged requests: {self.hedges}")
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def default_backends(cache=None, breaker=None, extract_path=EXTRACT_PATH, index_path=INDEX_PATH, oclc_api_key=None,
+                     loc_timeout=LOC_TIMEOUT, marc_index=None, marc_extract=MARC_EXTRACT_PATH):
+    """Every backend this tree has, local first; unavailable ones are dropped by ResolverCascade."""
+    return [
+        OpenLibraryBackend(extract_path, index_path),
+        MarcBackend(marc_index, marc_extract),
+        LocSruBackend(cache=cache, timeout=loc_timeout, breaker=breaker),
+        OclcBackend(oclc_api_key),
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve titles to LCCNs through the backend cascade")
+    parser.add_argument("titles", nargs="+", help="Book titles to resolve")
+    parser.add_argument("--hedge-delay", type=float, default=HEDGE_DELAY, help="Seconds before a slow remote lookup is hedged")
+    parser.add_argument("--confident-score", type=float, default=CONFIDENT_SCORE, help="Score at which a match ends the lookup")
+    parser.add_argument("--no-cache", action="store_true", help="Always query remote services instead of reusing cached responses")
+    args = parser.parse_args()
+    cache = None if args.no_cache else ResponseCache()
+    cascade = ResolverCascade(default_backends(cache=cache, breaker=CircuitBreaker("LOC SRU")),
+                              confident_score=args.confident_score, hedge_delay=args.hedge_delay)
+    for title, result in cascade.resolve_many(args.titles).items():
+        print(f"{title}: {result}")
+    cascade.print_stats()
+    cascade.save_stats()
+    cascade.close()
@@ -0,0 +1,227 @@
+import argparse
+import ast
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from retrieve_from_open_library_dump import normalize
+
+RESULTS_PATH = "data/titles_lccn.sqlite"
+LEDGER_CSV_PATH = "data/titles_lccn.csv"
+EXPORT_COLUMNS = ["Title", "LCCN", "Alt_LCCN", "OCLC", "Alt_OCLC", "Source"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    title_norm TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    lccn TEXT NOT NULL DEFAULT '',
+    alt_lccn TEXT NOT NULL DEFAULT '[]',
+    oclc TEXT NOT NULL DEFAULT '',
+    alt_oclc TEXT NOT NULL DEFAULT '[]',
+    source TEXT NOT NULL DEFAULT 'None',
+    updated_at REAL
+);
+"""
+
+# A later result replaces an earlier one unless it found nothing and the earlier one found something
+UPSERT = """
+INSERT INTO results (title_norm, title, lccn, alt_lccn, oclc, alt_oclc, source, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(title_norm) DO UPDATE SET
+    title = excluded.title,
+    lccn = excluded.lccn,
+    alt_lccn = excluded.alt_lccn,
+    oclc = excluded.oclc,
+    alt_oclc = excluded.alt_oclc,
+    source = excluded.source,
+    updated_at = excluded.updated_at
+WHERE excluded.source != 'None' OR results.source = 'None'
+"""
+
+def _identifier(value):
+    value = "" if value is None else str(value).strip()
+    return "" if value in ("n/a", "nan") else value
+
+def _identifier_list(value):
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value) if value.startswith("[") else [value]
+        except (ValueError, SyntaxError):
+            value = [value]
+    return [_identifier(v) for v in value or [] if _identifier(v)]
+
+def result_from_ledger_row(row):
+    """
+    A step 04 style result from a titles_lccn.csv row. The old ledger's last
+    column was either Source (step 04) or No_match (find_best_title_match,
+    which only ever wrote Open Library results).
+    """
+    marker = row.get("Source") or row.get("No_match") or ""
+    if marker in ("", "No match"):
+        marker = "None" if marker == "No match" else "OpenLibrary"
+    return {
+        "title": row.get("Title") or "",
+        "lccn": row.get("LCCN"),
+        "alt_lccn": row.get("Alt_LCCN"),
+        "oclc": row.get("OCLC"),
+        "alt_oclc": row.get("Alt_OCLC"),
+        "source": marker,
+    }
+
+class ResultsStore:
+    """
+    The title -> LCCN/OCLC results of every lookup, in SQLite (WAL mode, so
+    several processes can read and write at once). Titles are keyed by their
+    normalized form, so each title has exactly one row. The first time the
+    database is created, the old titles_lccn.csv ledger is imported into it;
+    export_csv/export_xlsx write the tables the later steps read.
+    """
+
+    def __init__(self, path=RESULTS_PATH, legacy_csv=LEDGER_CSV_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        created = not os.path.exists(path)
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        if created and legacy_csv and os.path.isfile(legacy_csv):
+            count = self.import_csv(legacy_csv)
+            print(f"Imported {count} ledger rows from {legacy_csv} into {path}")
+
+    def _row_values(self, result, now):
+        title = (result.get("title") or "").strip()
+        return (
+            normalize(title),
+            title,
+            _identifier(result.get("lccn")),
+            json.dumps(_identifier_list(result.get("alt_lccn"))),
+            _identifier(result.get("oclc")),
+            json.dumps(_identifier_list(result.get("alt_oclc"))),
+            result.get("source") or "None",
+            now,
+        )
+
+    def upsert(self, result):
+        """Store one result dict (title, lccn, alt_lccn, oclc, alt_oclc, source)."""
+        self.upsert_many([result])
+
+    def upsert_many(self, results):
+        """Store many results in one transaction."""
+        now = time.time()
+        rows = [self._row_values(result, now) for result in results]
+        rows = [row for row in rows if row[0]]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(UPSERT, rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def resolved(self, titles):
+        """The subset of titles that already have a row (matched by normalized title)."""
+        by_norm = {}
+        for title in titles:
+            by_norm.setdefault(normalize(title), []).append(title)
+        keys = [key for key in by_norm if key]
+        found = set()
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT title_norm FROM results WHERE title_norm IN ({placeholders})", chunk)
+                for (key,) in rows:
+                    found.update(by_norm[key])
+        return found
+
+    def get(self, title):
+        """The stored result for a title, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, lccn, alt_lccn, oclc, alt_oclc, source FROM results WHERE title_norm = ?", (normalize(title),)
+            ).fetchone()
+        return self._result(row) if row else None
+
+    @staticmethod
+    def _result(row):
+        title, lccn, alt_lccn, oclc, alt_oclc, source = row
+        return {"title": title, "lccn": lccn, "alt_lccn": json.loads(alt_lccn), "oclc": oclc,
+                "alt_oclc": json.loads(alt_oclc), "source": source}
+
+    def results(self):
+        """Every stored result, in the order titles were first added."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, lccn, alt_lccn, oclc, alt_oclc, source FROM results ORDER BY rowid"
+            ).fetchall()
+        return [self._result(row) for row in rows]
+
+    def ledger_rows(self):
+        """
+        Every result as a titles_lccn.csv row, as step 04 wrote them: list
+        columns as Python reprs and a missing LCCN or OCLC as 'n/a'.
+        """
+        return [
+            {
+                "Title": result["title"],
+                "LCCN": result["lccn"] or "n/a",
+                "Alt_LCCN": repr(result["alt_lccn"]),
+                "OCLC": result["oclc"] or "n/a",
+                "Alt_OCLC": repr(result["alt_oclc"]),
+                "Source": result["source"],
+                "No_match": "No match" if result["source"] == "None" else "",
+            }
+            for result in self.results()
+        ]
+
+    def import_csv(self, csv_path):
+        with open(csv_path, "r", encoding="utf-8-sig", newline='') as csvfile:
+            results = [result_from_ledger_row(row) for row in csv.DictReader(csvfile)]
+        self.upsert_many(results)
+        return len(results)
+
+    def export_csv(self, csv_path=LEDGER_CSV_PATH):
+        """Write every result to csv_path (Title, LCCN, Alt_LCCN, OCLC, Alt_OCLC, Source), replacing it."""
+        rows = self.ledger_rows()
+        tmp_path = csv_path + ".tmp"
+        with open(tmp_path, "w", newline='', encoding="utf-8-sig") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp_path, csv_path)
+        return len(rows)
+
+    def export_xlsx(self, xlsx_path, sheet_name="Titles LCCN"):
+        import pandas as pd
+        rows = self.ledger_rows()
+        pd.DataFrame(rows, columns=EXPORT_COLUMNS).to_excel(xlsx_path, sheet_name=sheet_name, index=False)
+        return len(rows)
+
+    def close(self):
+        self._conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Title -> LCCN/OCLC results store")
+    parser.add_argument("command", choices=["export", "import", "stats"])
+    parser.add_argument("--store", default=RESULTS_PATH, help="Path of the results database")
+    parser.add_argument("--csv", default=LEDGER_CSV_PATH, help="CSV to export to or import from")
+    parser.add_argument("--xlsx", default=None, help="Also export to this Excel workbook")
+    args = parser.parse_args()
+    store = ResultsStore(args.store, legacy_csv=None)
+    if args.command == "import":
+        print(f"Imported {store.import_csv(args.csv)} rows from {args.csv}")
+    elif args.command == "export":
+        print(f"Exported {store.export_csv(args.csv)} results to {args.csv}")
+        if args.xlsx:
+            print(f"Exported {store.export_xlsx(args.xlsx)} results to {args.xlsx}")
+    else:
+        results = store.results()
+        with_lccn = sum(1 for result in results if result["lccn"])
+        print(f"{len(results)} titles, {with_lccn} with an LCCN")
+        for source in sorted({result["source"] for result in results}):
+            print(f"  {source}: {sum(1 for result in results if result['source'] == source)}")
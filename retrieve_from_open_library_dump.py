@@ -2,11 +2,25 @@ import gzip
 import json
 import time
 import string
-import csv
 import os
-from rapidfuzz import fuzz
+import numpy as np
+from rapidfuzz import fuzz, process
 import ast
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # optional: faster JSON decoding of dump lines
+    _loads = json.loads
+
+DUMP_PATH = "data/ol_dump_editions_latest.txt.gz"
+LEDGER_PATH = "data/titles_lccn.csv"
+
+# Only these fields of an edition record are ever used
+RECORD_FIELDS = ("key", "title", "full_title", "lccn", "oclc", "oclc_numbers", "revision", "last_modified")
+# b'"oclc' covers both the "oclc" and "oclc_numbers" keys
+IDENTIFIER_KEY_MARKERS = (b'"lccn"', b'"oclc')
+
 def normalize(text):
     """Lowercase and remove punctuation for better matching."""
     if not text:
@@ -35,102 +49,258 @@ def get_match_substring(input_norm):
 def is_reasonable_length(candidate, input_norm, factor=1.5):
     return len(candidate) >= len(input_norm) and len(candidate) <= factor * len(input_norm)
 
-def find_best_title_match(
-    input_title,
-    dump_path="data/ol_dump_editions_latest.txt.gz",
-    max_results=10
-):
-    start_time = time.time()
-    input_norm_full = normalize(input_title)
-    input_norm = get_match_substring(input_norm_full)
-    matches = []
-    max_perfect_matches = 3
+def identifier_lists(record):
+    """Return (all_lccn, all_oclc) string lists for an edition record."""
+    lccn = record.get("lccn")
+    oclc = record.get("oclc")
+    oclc_numbers = record.get("oclc_numbers")
+    # Normalize to lists for easier handling
+    lccn_list = lccn if isinstance(lccn, list) else ([lccn] if lccn else [])
+    oclc_list = oclc if isinstance(oclc, list) else ([oclc] if oclc else [])
+    oclc_numbers_list = oclc_numbers if isinstance(oclc_numbers, list) else ([oclc_numbers] if oclc_numbers else [])
+    # Combine OCLC and OCLC_numbers, preserving order
+    all_oclc = [str(x) for x in oclc_list + oclc_numbers_list if x]
+    all_lccn = [str(x) for x in lccn_list if x]
+    return all_lccn, all_oclc
 
-    # CSV path and fieldnames
-    csv_path = "data/titles_lccn.csv"
-    fieldnames = ["Title", "LCCN", "Alt_LCCN", "OCLC", "Alt_OCLC", "No_match"]
+def new_scan_stats():
+    return {"lines": 0, "no_identifier_key": 0, "malformed": 0, "no_identifier_value": 0, "decoded": 0}
 
-    # Check if the title is already in the CSV (fuzzy match, >=95%)
-    file_exists = os.path.isfile(csv_path)
-    already_done = False
-    existing_row = None
-    if file_exists:
-        with open(csv_path, "r", encoding="utf-8", newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                existing_title = row.get("Title", "").strip()
-                existing_title_norm = normalize(existing_title)
-                score = fuzz.partial_ratio(input_norm, existing_title_norm)
-                if score >= 95:
-                    already_done = True
-                    existing_row = row
-                    break
+def merge_scan_stats(stats, other):
+    for key, value in other.items():
+        stats[key] = stats.get(key, 0) + value
+    return stats
 
-    if already_done:
-        print("Search already done!")
-        print("\nResult:")
-        print(f"Title: {existing_row.get('Title','')}")
-        print(f"LCCN: {existing_row.get('LCCN','')}")
-        print(f"Alt_LCCN: {existing_row.get('Alt_LCCN','')}")
-        print(f"OCLC: {existing_row.get('OCLC','')}")
-        print(f"Alt_OCLC: {existing_row.get('Alt_OCLC','')}")
-        print(f"No_match: {existing_row.get('No_match','')}")
-        return existing_row
+def print_scan_stats(stats):
+    print(
+        f"Prefilter: {stats['lines']} lines read, "
+        f"{stats['no_identifier_key']} dropped without identifier keys, "
+        f"{stats['malformed']} malformed, "
+        f"{stats['no_identifier_value']} with empty identifiers, "
+        f"{stats['decoded']} decoded."
+    )
 
-    # Search logic
-    with gzip.open(dump_path, "rt", encoding="utf-8") as f:
-        for line_num, line in enumerate(f):
+def decode_dump_line(raw_line, stats):
+    """
+    Prefilter and decode one raw (bytes) dump line.
+    Lines without an lccn/oclc key are rejected by a byte search before any
+    JSON decoding; survivors are decoded and projected to RECORD_FIELDS.
+    Returns the projected record, or None if the line can never match.
+    """
+    stats["lines"] += 1
+    if IDENTIFIER_KEY_MARKERS[0] not in raw_line and IDENTIFIER_KEY_MARKERS[1] not in raw_line:
+        stats["no_identifier_key"] += 1
+        return None
+    payload = raw_line[raw_line.rfind(b"\t") + 1:]
+    if not payload.startswith(b"{"):
+        stats["malformed"] += 1
+        return None
+    try:
+        data = _loads(payload)
+    except ValueError:
+        stats["malformed"] += 1
+        return None
+    record = {field: data[field] for field in RECORD_FIELDS if field in data}
+    all_lccn, all_oclc = identifier_lists(record)
+    if not (all_lccn or all_oclc):
+        stats["no_identifier_value"] += 1
+        return None
+    stats["decoded"] += 1
+    return record
+
+def score_record(input_norm, record, title_norm=None, full_title_norm=None):
+    """
+    Score an edition record against a normalized input title.
+    Returns a match dict if the record passes the substring and 96% partial_ratio
+    checks and carries an LCCN or OCLC, otherwise None.
+    """
+    title = record.get("title", "")
+    full_title = record.get("full_title", "")
+    all_lccn, all_oclc = identifier_lists(record)
+    if not (all_lccn or all_oclc):
+        return None
+
+    if title_norm is None:
+        title_norm = normalize(title)
+    if full_title_norm is None:
+        full_title_norm = normalize(full_title)
+
+    # Fuzzy substring match using RapidFuzz partial_ratio, threshold 98%
+    score_title = fuzz.partial_ratio(input_norm, title_norm) if is_reasonable_length(title_norm, input_norm) else 0
+    score_full_title = fuzz.partial_ratio(input_norm, full_title_norm) if is_reasonable_length(full_title_norm, input_norm) else 0
+
+    min_substring_length = int(0.95 * len(input_norm))
+    is_good_substring = (
+        (input_norm in title_norm and len(input_norm) >= min_substring_length) or
+        (input_norm in full_title_norm and len(input_norm) >= min_substring_length)
+    )
+    if not (is_good_substring and (score_title >= 96 or score_full_title >= 96)):
+        return None
+    return {
+        "title": title,
+        "full_title": full_title,
+        "display_title": full_title if full_title else title,
+        "lccn": all_lccn,
+        "oclc": all_oclc,
+        "record": record,
+        "score": max(score_title, score_full_title),
+        "score_title": score_title,
+        "score_full_title": score_full_title,
+        "oclc_numbers": record.get("oclc_numbers"),
+    }
+
+class TitleLedgerCache:
+    """
+    In-memory view of the title ledger (results_store.py), loaded once and
+    shared by lookups. has_title checks exact normalized titles against a
+    dict; find returns the first row in ledger order whose title scores
+    >= 95 partial_ratio, as the old per-row scan did, scoring all ledger
+    titles in one batched rapidfuzz pass. append_row writes through to the
+    store and updates the cache. csv_path is the old titles_lccn.csv,
+    imported when the store is first created.
+    """
+
+    def __init__(self, csv_path=LEDGER_PATH, store=None):
+        from results_store import ResultsStore
+        self.csv_path = csv_path
+        self.store = store if store is not None else ResultsStore(legacy_csv=csv_path)
+        self.rows = []
+        self.keys = []
+        self.exact = {}
+        for row in self.store.ledger_rows():
+            self._add(row)
+
+    def _add(self, row):
+        key = normalize((row.get("Title") or "").strip())
+        self.rows.append(row)
+        self.keys.append(key)
+        self.exact.setdefault(key, row)
+
+    def has_title(self, title):
+        """True if a ledger title normalizes to the same string as title."""
+        return normalize(title) in self.exact
+
+    def find(self, input_norm, threshold=95):
+        """Return the first ledger row whose title fuzzy-matches (>=95%) input_norm, or None."""
+        return self.find_many([input_norm], threshold)[0]
+
+    def find_many(self, input_norms, threshold=95):
+        """Batched version of find: one rapidfuzz cdist pass for all inputs."""
+        found = [None] * len(input_norms)
+        if not self.keys or not input_norms:
+            return found
+        scores = process.cdist(list(input_norms), self.keys, scorer=fuzz.partial_ratio, score_cutoff=threshold)
+        for i, row_scores in enumerate(scores):
+            hits = np.flatnonzero(row_scores)
+            if hits.size:
+                found[i] = self.rows[hits[0]]
+        return found
+
+    def append_row(self, row):
+        """Upsert a ledger row (Title, LCCN, Alt_LCCN, OCLC, Alt_OCLC, No_match) into the store and the cache."""
+        from results_store import result_from_ledger_row
+        self.store.upsert(result_from_ledger_row(row))
+        self._add({key: str(value) for key, value in row.items()})
+
+def find_ledger_row(input_norm, csv_path=LEDGER_PATH, ledger=None):
+    """Return the ledger row whose title fuzzy-matches (>=95%) the input, or None."""
+    if ledger is None:
+        ledger = TitleLedgerCache(csv_path)
+    return ledger.find(input_norm)
+
+def print_ledger_row(existing_row):
+    print("Search already done!")
+    print("\nResult:")
+    print(f"Title: {existing_row.get('Title','')}")
+    print(f"LCCN: {existing_row.get('LCCN','')}")
+    print(f"Alt_LCCN: {existing_row.get('Alt_LCCN','')}")
+    print(f"OCLC: {existing_row.get('OCLC','')}")
+    print(f"Alt_OCLC: {existing_row.get('Alt_OCLC','')}")
+    print(f"No_match: {existing_row.get('No_match','')}")
+
+def scan_dump(input_norm, dump_path=DUMP_PATH, max_perfect_matches=3):
+    """Stream the gzipped editions dump and return up to max_perfect_matches matches."""
+    matches = []
+    stats = new_scan_stats()
+    with gzip.open(dump_path, "rb") as f:
+        for raw_line in f:
+            record = decode_dump_line(raw_line, stats)
+            if record is None:
+                continue
             try:
-                fields = line.rstrip("\n").split("\t")
-                if not fields or not fields[-1].startswith("{"):
-                    continue  # skip malformed lines
-                record = json.loads(fields[-1])
-                title = record.get("title", "")
-                full_title = record.get("full_title", "")
-                lccn = record.get("lccn")
-                oclc = record.get("oclc")
-                oclc_numbers = record.get("oclc_numbers")
-                # Normalize to lists for easier handling
-                lccn_list = lccn if isinstance(lccn, list) else ([lccn] if lccn else [])
-                oclc_list = oclc if isinstance(oclc, list) else ([oclc] if oclc else [])
-                oclc_numbers_list = oclc_numbers if isinstance(oclc_numbers, list) else ([oclc_numbers] if oclc_numbers else [])
-                # Combine OCLC and OCLC_numbers, preserving order
-                all_oclc = [str(x) for x in oclc_list + oclc_numbers_list if x]
-                all_lccn = [str(x) for x in lccn_list if x]
-
-                title_norm = normalize(title)
-                full_title_norm = normalize(full_title)
-
-                # Fuzzy substring match using RapidFuzz partial_ratio, threshold 98%
-                score_title = fuzz.partial_ratio(input_norm, title_norm) if is_reasonable_length(title_norm, input_norm) else 0
-                score_full_title = fuzz.partial_ratio(input_norm, full_title_norm) if is_reasonable_length(full_title_norm, input_norm) else 0
-
-                min_substring_length = int(0.95 * len(input_norm))
-                is_good_substring = (
-                    (input_norm in title_norm and len(input_norm) >= min_substring_length) or
-                    (input_norm in full_title_norm and len(input_norm) >= min_substring_length)
-                )
-                if is_good_substring and (score_title >= 96 or score_full_title >= 96):
-                    if all_lccn or all_oclc:
-                        matches.append({
-                            "title": title,
-                            "full_title": full_title,
-                            "display_title": full_title if full_title else title,
-                            "lccn": all_lccn,
-                            "oclc": all_oclc,
-                            "record": record,
-                            "score": max(score_title, score_full_title),
-                            "score_title": score_title,
-                            "score_full_title": score_full_title,
-                            "oclc_numbers": oclc_numbers,
-                        })
-                        if len(matches) >= max_perfect_matches:
-                            break
+                match = score_record(input_norm, record)
             except Exception:
                 continue
+            if match:
+                matches.append(match)
+                if len(matches) >= max_perfect_matches:
+                    break
+    print_scan_stats(stats)
+    return matches
 
-    elapsed = time.time() - start_time
+def match_record_batch(record, pending):
+    """
+    Score one edition record against a list of pending normalized titles.
+    Returns a list of (input_norm, match) pairs for the titles it matches.
+    """
+    all_lccn, all_oclc = identifier_lists(record)
+    if not (all_lccn or all_oclc):
+        return []
+    title_norm = normalize(record.get("title", ""))
+    full_title_norm = normalize(record.get("full_title", ""))
+    # One batched partial_ratio pass over all pending titles; rows
+    # below the 96% cutoff come back as 0 and are skipped.
+    scores = process.cdist(
+        pending, [title_norm, full_title_norm],
+        scorer=fuzz.partial_ratio, score_cutoff=96
+    )
+    hits = np.flatnonzero(scores.max(axis=1))
+    found = []
+    for i in hits:
+        input_norm = pending[i]
+        match = score_record(input_norm, record, title_norm, full_title_norm)
+        if match:
+            found.append((input_norm, match))
+    return found
+
+def scan_dump_batch(input_norms, dump_path=DUMP_PATH, max_perfect_matches=3, workers=None):
+    """
+    Stream the gzipped editions dump once and match every record against all
+    pending normalized titles. Returns a dict of input_norm -> matches.
+    Each title stops collecting after max_perfect_matches, and the scan ends
+    as soon as no titles are pending.
+    With workers > 1 the dump is scanned in parallel shards (see ol_dump_shards.py).
+    """
+    if workers and workers > 1:
+        from ol_dump_shards import scan_dump_parallel
+        return scan_dump_parallel(input_norms, dump_path, workers=workers, max_perfect_matches=max_perfect_matches)
+
+    pending = [n for n in dict.fromkeys(input_norms) if n]
+    matches = {n: [] for n in input_norms}
+    stats = new_scan_stats()
+    with gzip.open(dump_path, "rb") as f:
+        for raw_line in f:
+            if not pending:
+                break
+            record = decode_dump_line(raw_line, stats)
+            if record is None:
+                continue
+            try:
+                found = match_record_batch(record, pending)
+            except Exception:
+                continue
+            done = []
+            for input_norm, match in found:
+                matches[input_norm].append(match)
+                if len(matches[input_norm]) >= max_perfect_matches:
+                    done.append(input_norm)
+            if done:
+                pending = [n for n in pending if n not in done]
+    print_scan_stats(stats)
+    return matches
 
+def summarize_matches(input_title, matches, elapsed, csv_path=LEDGER_PATH, write_csv=True, ledger=None):
+    """Pick best/alternate identifiers, append a ledger row, print and return the summary dict."""
     # Prepare CSV output
     best_lccn = ""
     alt_lccn = []
@@ -162,14 +332,11 @@ def find_best_title_match(
     alt_lccn = [str(x) for x in alt_lccn]
     alt_oclc = [str(x) for x in alt_oclc]
 
-    # Write to CSV (append, never overwrite)
-    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-    file_exists = os.path.isfile(csv_path)
-    with open(csv_path, "a", newline='', encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not file_exists or os.stat(csv_path).st_size == 0:
-            writer.writeheader()
-        writer.writerow({
+    # Record the result in the ledger
+    if write_csv:
+        if ledger is None:
+            ledger = TitleLedgerCache(csv_path)
+        ledger.append_row({
             "Title": input_title,
             "LCCN": best_lccn,
             "Alt_LCCN": repr(alt_lccn),
@@ -214,6 +381,93 @@ def find_best_title_match(
         "matches": matches
     }
 
+def find_best_title_match(
+    input_title,
+    dump_path=DUMP_PATH,
+    max_results=10,
+    index_path=None,
+    workers=None,
+    extract_path=None,
+    ledger=None
+):
+    """
+    Look up LCCN/OCLC identifiers for a title in the Open Library editions data.
+    By default the whole dump is streamed; pass index_path (built with
+    ol_title_index.py) to query the persistent normalized-title index instead,
+    extract_path to scan the columnar extract (ol_editions_extract.py), or
+    workers > 1 to scan the dump in parallel shards.
+    Pass a TitleLedgerCache as ledger to share one loaded ledger across calls.
+    """
+    start_time = time.time()
+    input_norm_full = normalize(input_title)
+    input_norm = get_match_substring(input_norm_full)
+    max_perfect_matches = 3
+
+    if ledger is None:
+        ledger = TitleLedgerCache()
+
+    # Check if the title is already in the CSV (fuzzy match, >=95%)
+    existing_row = ledger.find(input_norm)
+    if existing_row is not None:
+        print_ledger_row(existing_row)
+        return existing_row
+
+    # Search logic
+    if index_path:
+        from ol_title_index import lookup_title_index
+        matches = lookup_title_index(input_norm, index_path, max_perfect_matches=max_perfect_matches)
+    elif extract_path:
+        from ol_editions_extract import scan_extract
+        matches = scan_extract([input_norm], extract_path, max_perfect_matches=max_perfect_matches)[input_norm]
+    elif workers and workers > 1:
+        matches = scan_dump_batch([input_norm], dump_path, max_perfect_matches=max_perfect_matches, workers=workers)[input_norm]
+    else:
+        matches = scan_dump(input_norm, dump_path, max_perfect_matches=max_perfect_matches)
+
+    elapsed = time.time() - start_time
+    return summarize_matches(input_title, matches, elapsed, ledger=ledger)
+
+def find_best_title_matches(
+    input_titles,
+    dump_path=DUMP_PATH,
+    write_csv=True,
+    workers=None,
+    extract_path=None,
+    ledger=None
+):
+    """
+    Batch version of find_best_title_match: titles not already in the ledger are
+    matched in a single pass over the dump (or against the columnar extract when
+    extract_path is given). Returns a dict of title -> summary, in input order.
+    """
+    start_time = time.time()
+    if ledger is None:
+        ledger = TitleLedgerCache()
+    results = {}
+    pending = {}
+    input_norms = [get_match_substring(normalize(input_title)) for input_title in input_titles]
+    existing_rows = ledger.find_many(input_norms)
+    for input_title, input_norm, existing_row in zip(input_titles, input_norms, existing_rows):
+        if existing_row is not None:
+            print_ledger_row(existing_row)
+            results[input_title] = existing_row
+        else:
+            results[input_title] = None
+            pending[input_title] = input_norm
+
+    if not pending:
+        found = {}
+    elif extract_path:
+        from ol_editions_extract import scan_extract
+        found = scan_extract(list(pending.values()), extract_path)
+    else:
+        found = scan_dump_batch(list(pending.values()), dump_path, workers=workers)
+    elapsed = time.time() - start_time
+    for input_title, input_norm in pending.items():
+        print(f"\n=== {input_title} ===")
+        results[input_title] = summarize_matches(input_title, found[input_norm], elapsed, write_csv=write_csv, ledger=ledger)
+    return results
+
 if __name__ == "__main__":
     input_title = input("Enter a book title to search for: ").strip()
     if input_title.startswith('"') and input_title.endswith('"'):
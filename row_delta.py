@@ -0,0 +1,96 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+DELTA_DIR = "data/delta"
+
+def row_fingerprints(df):
+    """
+    Content hash of every row of df, as hex strings aligned with df's index.
+    Rows are hashed by their values' text, with every kind of missing value
+    alike and whole floats written as integers, so a row keeps its
+    fingerprint when another row changes how read_csv types a column (e.g.
+    an all-empty column gaining a value, or a year column gaining a blank
+    and turning 1900 into 1900.0).
+    """
+    text = df.astype(str)
+    for i, dtype in enumerate(df.dtypes):
+        if isinstance(dtype, np.dtype) and dtype.kind == "f":
+            values = df.iloc[:, i]
+            whole = (np.isfinite(values) & (values == np.floor(values)) & (values.abs() < 2 ** 63)).to_numpy()
+            text.iloc[whole, i] = values[whole].astype("int64").astype(str).to_numpy()
+    text = text.mask(df.isna(), "\x00")
+    hashes = pd.util.hash_pandas_object(text, index=False)
+    return hashes.map(lambda h: format(h, "016x"))
+
+def code_signature(*paths, extra=""):
+    """Hash of the given source files (and anything else the output depends on), so edits invalidate a cache."""
+    digest = hashlib.sha1(extra.encode("utf-8"))
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+class RowCache:
+    """
+    Per-row results of one step, keyed by the fingerprint of the input row
+    that produced them and pickled to data/delta/<name>.pkl. run() applies
+    the step only to rows it has not seen (new or edited rows, plus any the
+    caller marks stale), drops results for rows that are gone, and returns
+    the full output in input order. process must be row-local and keep the
+    index of the rows it returns; rows it filters out are remembered as
+    processed. The cache starts over when the signature (step code, input
+    columns) changes.
+    """
+
+    def __init__(self, name, signature, delta_dir=DELTA_DIR):
+        self.name = name
+        self.path = os.path.join(delta_dir, f"{name}.pkl")
+        self.signature = signature
+        self.seen = set()
+        self.outputs = None
+        self.extra = {}
+        if os.path.isfile(self.path):
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("signature") == signature:
+                self.seen = state["seen"]
+                self.outputs = state["outputs"]
+                self.extra = state.get("extra", {})
+
+    def run(self, df, process, stale=()):
+        fingerprints = row_fingerprints(df)
+        stale = set(stale)
+        reusable = self.seen - stale
+        todo = ~fingerprints.isin(reusable)
+        new_rows = df[todo].set_axis(fingerprints[todo])
+        new_rows = new_rows[~new_rows.index.duplicated()]
+        live = set(fingerprints)
+        removed = len(self.seen - live)
+
+        outputs = self.outputs
+        if outputs is not None:
+            outputs = outputs[outputs.index.isin(reusable & live)]
+        if len(new_rows):
+            processed = process(new_rows)
+            outputs = processed if outputs is None or outputs.empty else pd.concat([outputs, processed])
+        self.seen = (reusable & live) | set(new_rows.index)
+        self.outputs = outputs
+        print(f"{self.name}: {len(new_rows)} new or changed rows processed, "
+              f"{len(df) - int(todo.sum())} reused, {removed} removed")
+
+        if outputs is None:
+            return pd.DataFrame()
+        order = [fingerprint for fingerprint in fingerprints if fingerprint in outputs.index]
+        return outputs.loc[order].reset_index(drop=True)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"signature": self.signature, "seen": self.seen, "outputs": self.outputs, "extra": self.extra}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import email.utils
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+LIMITS_PATH = "data/rate_limits.sqlite"
+
+# Requests per second and burst size for each host. www.loc.gov keeps the old
+# rate_limit() budget of 9 requests a minute; the SRU endpoint gets the async
+# client's default of one request every 2 seconds.
+DEFAULT_BUDGETS = {
+    "www.loc.gov": {"rate": 9 / 60, "burst": 9},
+    "lx2.loc.gov": {"rate": 1 / 2, "burst": 1},
+    "www.worldcat.org": {"rate": 1, "burst": 1},
+}
+FALLBACK_BUDGET = {"rate": 1, "burst": 1}
+# Extra budgets as JSON, e.g. '{"127.0.0.1": {"rate": 100, "burst": 10}}' for mock_services.py
+BUDGETS_ENV = "RATE_LIMIT_BUDGETS"
+
+# AIMD: a 429 halves the host's rate (down to max_rate / MIN_RATE_DIVISOR);
+# every successful response adds back max_rate / INCREASE_DIVISOR
+DECREASE_FACTOR = 0.5
+MIN_RATE_DIVISOR = 16
+INCREASE_DIVISOR = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    max_rate REAL,
+    burst REAL,
+    rate REAL,
+    tokens REAL,
+    updated REAL,
+    paused_until REAL
+);
+"""
+
+def host_of(url):
+    return (urllib.parse.urlsplit(url).hostname or "").lower()
+
+def retry_after_seconds(value, default):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+class SharedRateLimiter:
+    """
+    Per-host token buckets kept in SQLite so every process using the same file
+    draws from one budget. Each update runs in a BEGIN IMMEDIATE transaction,
+    which serializes processes on the database lock. A 429 halves the host's
+    rate and pauses it for Retry-After seconds; successes ramp the rate back
+    up to the configured budget (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, path=LIMITS_PATH, budgets=None):
+        self.path = path
+        self.budgets = dict(DEFAULT_BUDGETS, **json.loads(os.environ.get(BUDGETS_ENV) or "{}"), **(budgets or {}))
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def budget(self, host):
+        return self.budgets.get(host, FALLBACK_BUDGET)
+
+    def _update(self, host, change):
+        """Run change(state, now) on the host's row inside one write transaction; returns its result."""
+        budget = self.budget(host)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT rate, tokens, updated, paused_until FROM hosts WHERE host = ?", (host,)
+                ).fetchone()
+                if row is None:
+                    row = (budget["rate"], budget["burst"], now, 0.0)
+                rate, tokens, updated, paused_until = row
+                # Budgets come from the code, so a changed budget applies on the next call
+                rate = min(rate, budget["rate"])
+                # No tokens accrue while the host is paused
+                refill_from = max(updated, paused_until)
+                state = {
+                    "rate": rate,
+                    "tokens": min(budget["burst"], tokens + max(0.0, now - refill_from) * rate),
+                    "paused_until": paused_until,
+                }
+                result = change(state, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (host, budget["rate"], budget["burst"], state["rate"], state["tokens"], now, state["paused_until"]),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def try_acquire(self, host):
+        """Take a token for host if one is available; returns 0, or the seconds to wait before trying again."""
+        def take(state, now):
+            if now < state["paused_until"]:
+                return state["paused_until"] - now
+            if state["tokens"] >= 1:
+                state["tokens"] -= 1
+                return 0.0
+            return (1 - state["tokens"]) / state["rate"]
+        return self._update(host, take)
+
+    def ready_in(self, host):
+        """Seconds until host has a token free, without taking it."""
+        def peek(state, now):
+            if now < state["paused_until"]:
+                return state["paused_until"] - now
+            return max(0.0, (1 - state["tokens"]) / state["rate"])
+        return self._update(host, peek)
+
+    def wait_until_ready(self, host, verbose=False):
+        """Block until host has budget, e.g. before starting a timed request."""
+        while True:
+            wait = self.ready_in(host)
+            if wait <= 0:
+                return
+            if verbose and wait > 5:
+                print(f"Rate limit for {host} reached. Waiting for {wait:.2f} seconds...")
+            time.sleep(wait)
+
+    def acquire(self, host, verbose=False):
+        """Block until a request to host fits the shared budget."""
+        while True:
+            wait = self.try_acquire(host)
+            if wait <= 0:
+                return
+            if verbose and wait > 5:
+                print(f"Rate limit for {host} reached. Waiting for {wait:.2f} seconds...")
+            time.sleep(wait)
+
+    async def acquire_async(self, host):
+        """
+        acquire() for asyncio code. The SQLite transaction can wait up to the
+        busy timeout on other processes, so it runs in a worker thread and the
+        event loop keeps serving in-flight responses meanwhile.
+        """
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, host)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record(self, host, status_code, retry_after=None):
+        """
+        Feed a response status back into the host's budget. 429 and 503 halve
+        the rate and pause the host for retry_after seconds (default: one
+        token interval at the new rate); other responses ramp the rate up.
+        """
+        budget = self.budget(host)
+
+        def adjust(state, now):
+            if status_code in (429, 503):
+                state["rate"] = max(budget["rate"] / MIN_RATE_DIVISOR, state["rate"] * DECREASE_FACTOR)
+                pause = retry_after if retry_after is not None else 1 / state["rate"]
+                state["paused_until"] = max(state["paused_until"], now + pause)
+                state["tokens"] = 0.0
+            else:
+                state["rate"] = min(budget["rate"], state["rate"] + budget["rate"] / INCREASE_DIVISOR)
+            return state["rate"]
+        return self._update(host, adjust)
+
+    async def record_async(self, host, status_code, retry_after=None):
+        """record() for asyncio code, run in a worker thread like acquire_async."""
+        return await asyncio.to_thread(self.record, host, status_code, retry_after)
+
+    def pause(self, host, seconds):
+        """Stop all processes from sending to host for the next `seconds`."""
+        def hold(state, now):
+            state["paused_until"] = max(state["paused_until"], now + seconds)
+        self._update(host, hold)
+
+    def wrap(self, get, verbose=False):
+        """Wrap a requests-style get so every call waits for, and reports back to, the shared budget."""
+        @functools.wraps(get)
+        def limited(url, *args, **kwargs):
+            host = host_of(url)
+            self.acquire(host, verbose)
+            response = get(url, *args, **kwargs)
+            self.record(host, response.status_code, retry_after_seconds(response.headers.get("Retry-After"), None))
+            return response
+        return limited
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT host, max_rate, burst, rate, tokens, updated, paused_until FROM hosts ORDER BY host").fetchall()
+        return [
+            {
+                "host": host,
+                "requests_per_minute": round(rate * 60, 2),
+                "budget_per_minute": round(max_rate * 60, 2),
+                "tokens": round(min(burst, tokens + max(0.0, now - max(updated, paused_until)) * rate), 2),
+                "paused_for": round(max(0.0, paused_until - now), 1),
+            }
+            for host, max_rate, burst, rate, tokens, updated, paused_until in rows
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM hosts")
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_limiter(path=LIMITS_PATH):
+    """The process-wide limiter for path, opened on first use."""
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = SharedRateLimiter(path)
+        return _shared[path]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or reset the shared per-host request budgets")
+    parser.add_argument("command", choices=["status", "reset"])
+    parser.add_argument("--limits", default=LIMITS_PATH, help="Path of the rate-limit database")
+    args = parser.parse_args()
+    limiter = SharedRateLimiter(args.limits)
+    if args.command == "reset":
+        limiter.reset()
+        print(f"Reset {args.limits}")
+    else:
+        for row in limiter.status():
+            print(f"{row['host']}: {row['requests_per_minute']}/min of {row['budget_per_minute']}/min, "
+                  f"{row['tokens']} tokens, paused for {row['paused_for']}s")
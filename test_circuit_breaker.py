@@ -0,0 +1,87 @@
+import time
+
+import pytest
+import requests
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("LOC", failure_threshold=3, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+    assert breaker.short_circuited == 1
+    clock.now += 45
+    assert breaker.remaining_cooldown() == 15
+
+def test_one_trial_call_after_the_cooldown(clock):
+    breaker = CircuitBreaker("LOC", failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow()
+
+def test_trial_success_closes_and_failure_reopens(clock):
+    breaker = CircuitBreaker("LOC", failure_threshold=3, cooldown=60)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert breaker.remaining_cooldown() == 60
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert (breaker.state, breaker.failures) == (breaker.CLOSED, 0)
+
+def test_guard_counts_errors_throttling_and_server_errors(clock):
+    breaker = CircuitBreaker("LOC", failure_threshold=3, cooldown=60)
+    answers = [FakeResponse(429), FakeResponse(503), requests.Timeout("read timed out"), FakeResponse(200)]
+
+    def get(url):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    guarded = breaker.guard(get)
+    assert guarded("u").status_code == 429
+    assert guarded("u").status_code == 503
+    with pytest.raises(requests.Timeout):
+        guarded("u")
+    with pytest.raises(CircuitOpenError):
+        guarded("u")
+    assert len(answers) == 1
+    clock.now += 60
+    assert guarded("u").status_code == 200
+    assert breaker.state == breaker.CLOSED
+
+def test_client_errors_are_not_failures(clock):
+    breaker = CircuitBreaker("LOC", failure_threshold=1, cooldown=60)
+    assert breaker.guard(lambda url: FakeResponse(404))("u").status_code == 404
+    assert breaker.state == breaker.CLOSED
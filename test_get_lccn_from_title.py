@@ -0,0 +1,137 @@
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+import requests
+
+import get_lccn_from_title as loc
+from shared_rate_limit import SharedRateLimiter
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "raw_response.txt"), "r", encoding="utf-8") as f:
+    SRU_BODY = f.read()
+
+def mods_record(title, lccn=None, subtitle=None):
+    subtitle = f"<subTitle>{subtitle}</subTitle>" if subtitle else ""
+    lccn = f'<identifier type="lccn">{lccn}</identifier>' if lccn else ""
+    return (
+        '<zs:record><zs:recordSchema>mods</zs:recordSchema><zs:recordData><mods xmlns="http://www.loc.gov/mods/v3">'
+        f"<titleInfo><title>{title}</title>{subtitle}</titleInfo>{lccn}</mods></zs:recordData></zs:record>"
+    )
+
+def sru_response(*records, total=None):
+    total = len(records) if total is None else total
+    return (
+        '<?xml version="1.0"?><zs:searchRetrieveResponse xmlns:zs="http://www.loc.gov/zing/srw/">'
+        f"<zs:version>1.1</zs:version><zs:numberOfRecords>{total}</zs:numberOfRecords>"
+        f"<zs:records>{''.join(records)}</zs:records></zs:searchRetrieveResponse>"
+    )
+
+def record(title, lccn=None, subtitle=None):
+    return {"titles": [title], "subtitle": subtitle, "lccns": [lccn] if lccn else [], "oclcs": [], "lcc": []}
+
+class Answers(list):
+    urls = None
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+@pytest.fixture
+def loc_answers(tmp_path, monkeypatch):
+    """Answer every LOC request with the next (status, body) pair; records the URLs asked for."""
+    limiter = SharedRateLimiter(str(tmp_path / "limits.sqlite"), budgets={loc.host_of(loc.SRU_URL): {"rate": 1000, "burst": 100}})
+    monkeypatch.setattr(loc, "shared_limiter", lambda: limiter)
+    monkeypatch.chdir(tmp_path)
+    answers = Answers()
+    answers.urls = []
+
+    def get(url, *args, **kwargs):
+        answers.urls.append(url)
+        return FakeResponse(*answers.pop(0))
+
+    monkeypatch.setattr(requests, "get", get)
+    return answers
+
+@pytest.mark.parametrize("verbose", [True, False])
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_error_status_defers_the_title(loc_answers, verbose, status):
+    loc_answers.append((status, "Too many requests"))
+    assert loc.get_lccn_from_title("Piety promoted", verbose=verbose) is None
+
+def test_ok_response_gives_a_result(loc_answers):
+    loc_answers.append((200, SRU_BODY))
+    assert loc.get_lccn_from_title("Piety promoted", verbose=False)["lccn"] == "04008882"
+
+def test_batch_fallback_defers_on_error_status(loc_answers):
+    loc_answers.extend([(429, ""), (429, ""), (200, SRU_BODY)])
+    results = loc.get_lccns_from_titles_batched(["Piety promoted", "Dying sayings"], verbose=False)
+    assert results["Piety promoted"] is None
+    assert results["Dying sayings"]["lccn"] == "04008882"
+    assert len(loc_answers.urls) == 3
+
+def test_batch_cql_quotes_each_title():
+    assert loc.build_batch_cql(['Piety "promoted"', "Dying sayings"]) == (
+        'dc.title all "Piety \\"promoted\\"" or dc.title all "Dying sayings"'
+    )
+
+def test_records_go_to_the_title_they_match_best():
+    piety, sayings = record("Piety promoted", "04008882"), record("Dying sayings of Friends", "44051785")
+    assigned, ambiguous = loc.assign_records_to_titles(["Piety promoted", "Dying sayings"], [sayings, piety, record("Unrelated")])
+    assert assigned == {"Piety promoted": [(100, piety)], "Dying sayings": [(100, sayings)]}
+    assert ambiguous == set()
+
+def test_record_tied_between_titles_makes_both_ambiguous():
+    _, ambiguous = loc.assign_records_to_titles(["Piety promoted", "Piety promoted!"], [record("Piety promoted")])
+    assert ambiguous == {"Piety promoted", "Piety promoted!"}
+
+def test_one_request_resolves_a_batch(loc_answers):
+    loc_answers.append((200, sru_response(
+        mods_record("Dying sayings", "44051785"),
+        mods_record("Piety promoted", "50041871", subtitle="in a collection"),
+        mods_record("Piety promoted", "04008882"),
+    )))
+    results = loc.get_lccns_from_titles_batched(["Piety promoted", "Dying sayings", "Unknown title"], verbose=False)
+    assert results["Piety promoted"]["lccn"] == "50041871"
+    assert results["Piety promoted"]["alt_lccn"] == ["04008882"]
+    assert results["Dying sayings"]["lccn"] == "44051785"
+    assert results["Unknown title"]["lccn"] == "n/a"
+    assert len(loc_answers.urls) == 1
+
+def test_truncated_batch_sends_unmatched_titles_alone(loc_answers):
+    loc_answers.extend([
+        (200, sru_response(mods_record("Piety promoted", "04008882"), total=12)),
+        (200, SRU_BODY),
+    ])
+    results = loc.get_lccns_from_titles_batched(["Piety promoted", "Dying sayings"], verbose=False)
+    assert results["Piety promoted"]["lccn"] == "04008882"
+    assert results["Dying sayings"]["lccn"] == "04008882"
+    assert "Dying%20sayings" in loc_answers.urls[1]
+
+def test_mods_records_are_parsed_from_the_stream():
+    records, total = loc.parse_mods_records(SRU_BODY)
+    assert (len(records), total) == (5, 10)
+    assert records[1] == {
+        "titles": ["Piety promoted"],
+        "subtitle": "in a collection of dying sayings of many of the people called Quakers",
+        "lccns": ["44051785"],
+        "oclcs": ["1109691"],
+        "lcc": ["BX7790 .P5 1854"],
+    }
+
+def test_record_count_comes_before_the_records():
+    items = list(loc.iter_mods_records(sru_response(mods_record("Piety promoted", "04008882"), total=7)))
+    assert items[0] == 7
+    assert [item["lccns"] for item in items[1:]] == [["04008882"]]
+
+def test_bad_xml_raises_parse_error():
+    with pytest.raises(ET.ParseError):
+        loc.parse_mods_records(SRU_BODY[:2000])
+
+def test_quiet_mode_prints_nothing_and_keeps_bad_responses(loc_answers, tmp_path, capsys):
+    loc_answers.extend([(200, SRU_BODY), (200, "<not xml")])
+    assert loc.get_lccn_from_title("Piety promoted", verbose=False)["alt_lccn"] == ["44051785", "50041871", "44052282", "44051790"]
+    assert loc.get_lccn_from_title("Dying sayings", verbose=False) == loc.empty_result()
+    assert capsys.readouterr().out == ""
+    assert len(os.listdir(tmp_path / loc.RAW_RESPONSE_DIR)) == 1
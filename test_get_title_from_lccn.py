@@ -1,19 +1,31 @@
+import os
 import time
 import random
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 import json
 import cloudscraper
+from http_cache import ResponseCache, is_cached
+from shared_rate_limit import shared_limiter
 
-def robust_request(url, max_retries=5, base_delay=2, verbose=True):
+LOC_API_URL = os.environ.get("LOC_API_URL", "https://www.loc.gov")
+
+def robust_request(url, max_retries=5, base_delay=2, verbose=True, cache=None):
      """
      Makes a robust HTTP GET request with retries and exponential backoff using cloudscraper.
      """
+     if cache is not None:
+         cached = cache.get(url)
+         if cached is not None:
+             return cached
      scraper = cloudscraper.create_scraper()
+     limited_get = shared_limiter().wrap(scraper.get, verbose)
      for attempt in range(max_retries):
         try:
-            response = scraper.get(url)
+            response = limited_get(url)
             if response.status_code == 200:
+                 if cache is not None:
+                     cache.put(url, None, response.status_code, response.text, response.headers)
                  return response
             elif response.status_code == 429:  # Too many requests
                  wait = base_delay * (2 ** attempt) + random.uniform(0, 1)
@@ -32,12 +44,12 @@ def robust_request(url, max_retries=5, base_delay=2, verbose=True):
         print("Max retries reached. Request failed.")
      return None
 
-def get_title_from_lccn_json(lccn, delay=1.5, max_retries=5, verbose=True):
+def get_title_from_lccn_json(lccn, delay=1.5, max_retries=5, verbose=True, cache=None):
     """
     Retrieves the title of a book using its LCCN from the Library of Congress JSON API.
     """
-    url = f"https://www.loc.gov/item/{lccn}/?fo=json"
-    response = robust_request(url, max_retries=max_retries, base_delay=delay, verbose=verbose)
+    url = f"{LOC_API_URL}/item/{lccn}/?fo=json"
+    response = robust_request(url, max_retries=max_retries, base_delay=delay, verbose=verbose, cache=cache)
     
     if response and response.status_code == 200:
         try:
@@ -57,14 +69,15 @@ def get_title_from_lccn_json(lccn, delay=1.5, max_retries=5, verbose=True):
         if verbose:
             print(f"Failed to retrieve JSON for LCCN {lccn}")
     
-    time.sleep(delay + random.uniform(0, 1))
+    if not is_cached(response):
+        time.sleep(delay + random.uniform(0, 1))
     return None
 
 def get_title_from_lccn_selenium(lccn, verbose=True):
     """
     Retrieves the title of a book using its LCCN from the Library of Congress JSON API using Selenium.
     """
-    url = f"https://www.loc.gov/item/{lccn}/?fo=json"
+    url = f"{LOC_API_URL}/item/{lccn}/?fo=json"
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
@@ -95,7 +108,7 @@ if __name__ == "__main__":
     # Example LCCN for testing
     test_lccn = "2002022641"  # Replace with a valid LCCN for testing
     print(f"Testing get_title_from_lccn_json with LCCN: {test_lccn}")
-    title = get_title_from_lccn_json(test_lccn, verbose=True)
+    title = get_title_from_lccn_json(test_lccn, verbose=True, cache=ResponseCache())
     if title:
         print(f"Test passed. Retrieved title: {title}")
     else:
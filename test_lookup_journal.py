@@ -0,0 +1,32 @@
+from lookup_journal import LookupJournal
+
+def write(path, lines):
+    path.write_bytes(b"".join(lines))
+
+def test_replays_entries_in_order(tmp_path):
+    journal = LookupJournal(str(tmp_path / "journal.jsonl"))
+    journal.append({"title": "A"})
+    journal.append({"title": "B"})
+    journal.close()
+    assert [entry["title"] for entry in LookupJournal(journal.path).replay()] == ["A", "B"]
+
+def test_missing_journal_replays_nothing(tmp_path):
+    assert LookupJournal(str(tmp_path / "journal.jsonl")).replay() == []
+
+def test_torn_last_line_is_cut(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    write(path, [b'{"title": "A"}\n', b'{"title": "B"}\n', b'{"title": "C'])
+    journal = LookupJournal(str(path))
+    assert [entry["title"] for entry in journal.replay()] == ["A", "B"]
+    assert path.read_bytes() == b'{"title": "A"}\n{"title": "B"}\n'
+    journal.append({"title": "D"})
+    journal.close()
+    assert [entry["title"] for entry in LookupJournal(str(path)).replay()] == ["A", "B", "D"]
+
+def test_corrupt_middle_line_is_skipped(tmp_path, capsys):
+    path = tmp_path / "journal.jsonl"
+    lines = [b'{"title": "A"}\n', b'{"title": \x00\n', b'{"title": "B"}\n']
+    write(path, lines)
+    assert [entry["title"] for entry in LookupJournal(str(path)).replay()] == ["A", "B"]
+    assert path.read_bytes() == b"".join(lines)
+    assert "lines 2" in capsys.readouterr().out
@@ -0,0 +1,90 @@
+import sqlite3
+
+from marc_index import (
+    FIELD_TERMINATOR,
+    RECORD_TERMINATOR,
+    SUBFIELD_DELIMITER,
+    build_marc_index,
+    find_by_title,
+    lookup_marc_title,
+    raw_fields,
+)
+
+def marc_record(fields):
+    """A raw MARC record from (tag, data) pairs; data is the field's bytes without its terminator."""
+    directory = b""
+    body = b""
+    for tag, data in fields:
+        data += FIELD_TERMINATOR
+        directory += tag.encode("ascii") + b"%04d%05d" % (len(data), len(body))
+        body += data
+    base = 24 + len(directory) + 1
+    length = base + len(body) + 1
+    leader = b"%05dnam a22%05d a 4500" % (length, base)
+    return leader + directory + FIELD_TERMINATOR + body + RECORD_TERMINATOR
+
+def subfields(*pairs):
+    return b"  " + b"".join(SUBFIELD_DELIMITER + code.encode() + value.encode("utf-8") for code, value in pairs)
+
+RECORD = marc_record([
+    ("001", b"12345"),
+    ("010", subfields(("a", "   50041871 "))),
+    ("245", subfields(("a", "Piety promoted :"), ("b", "dying sayings /"))),
+])
+
+def test_reads_control_and_data_fields():
+    fields = raw_fields(RECORD, {"001", "010", "245"})
+    assert fields["001"] == [[("", "12345")]]
+    assert fields["010"] == [[("a", "   50041871 ")]]
+    assert fields["245"] == [[("a", "Piety promoted :"), ("b", "dying sayings /")]]
+
+def test_only_requested_tags():
+    assert list(raw_fields(RECORD, {"245"})) == ["245"]
+
+def test_corrupt_directory_entry_skips_only_that_field():
+    raw = bytearray(RECORD)
+    entry = 24 + 12  # the 010 entry
+    raw[entry + 3:entry + 7] = b"XX12"
+    fields = raw_fields(bytes(raw), {"001", "010", "245"})
+    assert "010" not in fields
+    assert fields["245"] == [[("a", "Piety promoted :"), ("b", "dying sayings /")]]
+
+def test_unreadable_base_address_gives_no_fields():
+    raw = bytearray(RECORD)
+    raw[12:17] = b"abcde"
+    assert raw_fields(bytes(raw), {"245"}) == {}
+
+def titled(title, lccn):
+    return marc_record([("010", subfields(("a", lccn))), ("245", subfields(("a", title + " /")))])
+
+def index_of(tmp_path, titles):
+    marc_path = str(tmp_path / "books.mrc")
+    with open(marc_path, "wb") as f:
+        f.write(b"".join(titled(title, f"{i:08d}") for i, title in enumerate(titles, 1)))
+    index_path = marc_path + ".idx.sqlite"
+    build_marc_index(marc_path, index_path)
+    return index_path
+
+TITLES = ["Piety promoted", "Piety promoted in a collection of dying sayings", "On piety promoted", "Ab"]
+
+def test_title_lookup_finds_keys_containing_the_title(tmp_path):
+    index_path = index_of(tmp_path, TITLES)
+    assert [row["id"] for row in find_by_title("piety promoted", index_path)] == [1, 2, 3]
+    assert [row["id"] for row in find_by_title("Piety promoted", index_path, exact=True)] == [1]
+    assert [m["record"]["lccn"] for m in lookup_marc_title("piety promoted", index_path)] == [["00000001"], ["00000003"]]
+
+def test_short_titles_use_the_prefix_range(tmp_path):
+    index_path = index_of(tmp_path, TITLES)
+    assert [row["id"] for row in find_by_title("ab", index_path)] == [4]
+
+def test_index_without_trigram_table_finds_prefixes(tmp_path):
+    index_path = index_of(tmp_path, TITLES)
+    conn = sqlite3.connect(index_path)
+    conn.execute("DROP TABLE title_fts")
+    conn.commit()
+    conn.close()
+    assert [row["id"] for row in find_by_title("piety promoted", index_path)] == [1, 2]
+
+def test_candidates_are_the_shortest_keys(tmp_path):
+    index_path = index_of(tmp_path, TITLES)
+    assert [row["id"] for row in find_by_title("piety promoted", index_path, limit=2)] == [1, 3]
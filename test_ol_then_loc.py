@@ -1,31 +1,44 @@
 import sys
 import pprint
+import argparse
 
 # Import the Open Library and LOC functions
-from retrieve_from_open_library_dump import find_best_title_match
-from get_lccn_from_title import get_lccn_from_title  # You need to rename your function in test2_get_lccn_from_title.py
+from retrieve_from_open_library_dump import find_best_title_matches
+from resolver_cascade import LocSruBackend, OclcBackend, ResolverCascade
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python test_ol_then_loc.py \"Book Title Here\"")
+    parser = argparse.ArgumentParser(usage='python test_ol_then_loc.py "Book Title Here" | --titles-file titles.txt')
+    parser.add_argument('title', nargs='*', help='Book title to search for')
+    parser.add_argument('--titles-file', help='File with one title per line; all titles share one dump scan')
+    args = parser.parse_args()
+    if args.titles_file:
+        with open(args.titles_file, "r", encoding="utf-8") as f:
+            input_titles = [line.strip() for line in f if line.strip()]
+    elif args.title:
+        input_titles = [" ".join(args.title).strip()]
+    else:
+        parser.print_usage()
         sys.exit(1)
-    input_title = " ".join(sys.argv[1:]).strip()
 
-    # Query Open Library
-    result = find_best_title_match(input_title)
+    # Query Open Library (one pass over the dump for all titles)
+    ol_results = find_best_title_matches(input_titles)
 
-    # If LCCN found, print result and script name
-    if result.get("LCCN"):
-        pprint.pprint(result)
-        print("retrieve_from_open_library_dump.py")
-    else:
-        # Try LOC
-        title_for_loc = result.get("Title", input_title)
-        lccn = get_lccn_from_title(title_for_loc)
-        if lccn and lccn != 'n/a':
-            result["LCCN"] = lccn
+    # Remote sources are raced and hedged instead of queried one after another
+    remote = ResolverCascade([LocSruBackend(), OclcBackend()], stats_path=None)
+    for input_title, result in ol_results.items():
+        # If LCCN found, print result and script name
+        if result.get("LCCN"):
             pprint.pprint(result)
-            print("The lccn value was obtained through LOC")
+            print("retrieve_from_open_library_dump.py")
         else:
-            pprint.pprint(result)
-            print("No LCCN found in Open Library or LOC")
\ No newline at end of file
+            # Try LOC
+            title_for_loc = result.get("Title", input_title)
+            loc_result = remote.resolve(title_for_loc)
+            if loc_result and loc_result.get("lccn"):
+                result["LCCN"] = loc_result["lccn"]
+                pprint.pprint(result)
+                print(f"The lccn value was obtained through {loc_result['source']}")
+            else:
+                pprint.pprint(result)
+                print("No LCCN found in Open Library or LOC")
+    remote.close()
@@ -0,0 +1,90 @@
+import gzip
+import json
+import sqlite3
+
+from ol_title_index import build_title_index, create_fts_index, lookup_title_index, read_dump_line, refresh_title_index
+
+def edition(n, title, revision=1, **identifiers):
+    record = {"key": f"/books/OL{n}M", "revision": revision, "title": title, **identifiers}
+    return f"/type/edition\t/books/OL{n}M\t{revision}\t2010-01-01T00:00:00\t{json.dumps(record)}\n"
+
+def write_dump(path, lines):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.writelines(lines)
+    return str(path)
+
+DUMP = [
+    edition(1, "Piety promoted", lccn=["04008882"]),
+    edition(2, "Piety promoted without identifiers"),
+    edition(3, "Piety promoted : dying sayings", oclc_numbers=["1109691"]),
+    edition(4, "Sermons on piety promoted", lccn=["50041871"]),
+    edition(5, "Piety promoted, vol. 2", lccn=["04008883"]),
+]
+
+def keys_of(matches):
+    return [match["record"]["key"] for match in matches]
+
+def test_build_indexes_editions_with_identifiers(tmp_path):
+    dump_path = write_dump(tmp_path / "ol_dump_editions_2025-04-30.txt.gz", DUMP)
+    assert build_title_index(dump_path, str(tmp_path / "index.sqlite")) == 4
+
+def test_lookup_finds_exact_and_prefix_titles_in_dump_order(tmp_path):
+    dump_path = write_dump(tmp_path / "ol_dump_editions_2025-04-30.txt.gz", DUMP)
+    index_path = str(tmp_path / "index.sqlite")
+    build_title_index(dump_path, index_path, fts=False)
+    matches = lookup_title_index("piety promoted", index_path)
+    assert keys_of(matches) == ["/books/OL1M", "/books/OL5M"]
+    assert matches[0]["lccn"] == ["04008882"]
+    assert lookup_title_index("no such title", index_path) == []
+
+def test_line_offset_points_at_the_dump_line(tmp_path):
+    dump_path = write_dump(tmp_path / "ol_dump_editions_2025-04-30.txt.gz", DUMP)
+    index_path = str(tmp_path / "index.sqlite")
+    build_title_index(dump_path, index_path)
+    match = lookup_title_index("piety promoted", index_path)[0]
+    assert read_dump_line(dump_path, match["line_offset"])["key"] == "/books/OL1M"
+
+# Contains the query after its first word, so only the trigram table finds it
+INNER_TITLE = edition(6, "On piety promoted", oclc_numbers=["7654321"])
+
+def test_trigram_index_finds_titles_containing_the_query(tmp_path):
+    dump_path = write_dump(tmp_path / "ol_dump_editions_2025-04-30.txt.gz", DUMP + [INNER_TITLE])
+    index_path = str(tmp_path / "index.sqlite")
+    build_title_index(dump_path, index_path)
+    assert keys_of(lookup_title_index("piety promoted", index_path)) == ["/books/OL1M", "/books/OL5M", "/books/OL6M"]
+    assert keys_of(lookup_title_index("piety promoted", index_path, max_perfect_matches=1)) == ["/books/OL1M"]
+
+def test_trigram_index_can_be_added_later(tmp_path):
+    dump_path = write_dump(tmp_path / "ol_dump_editions_2025-04-30.txt.gz", DUMP + [INNER_TITLE])
+    index_path = str(tmp_path / "index.sqlite")
+    build_title_index(dump_path, index_path, fts=False)
+    assert "/books/OL6M" not in keys_of(lookup_title_index("piety promoted", index_path))
+    conn = sqlite3.connect(index_path)
+    create_fts_index(conn)
+    conn.commit()
+    conn.close()
+    assert "/books/OL6M" in keys_of(lookup_title_index("piety promoted", index_path))
+
+def test_candidates_are_the_shortest_keys(tmp_path):
+    dump_path = write_dump(tmp_path / "ol_dump_editions_2025-04-30.txt.gz", DUMP + [INNER_TITLE])
+    index_path = str(tmp_path / "index.sqlite")
+    build_title_index(dump_path, index_path)
+    assert keys_of(lookup_title_index("piety promoted", index_path, top_k=2)) == ["/books/OL1M", "/books/OL6M"]
+
+def test_refresh_applies_a_newer_dump(tmp_path):
+    index_path = str(tmp_path / "index.sqlite")
+    build_title_index(write_dump(tmp_path / "ol_dump_editions_2025-04-30.txt.gz", DUMP + [INNER_TITLE]), index_path)
+    newer = [
+        edition(7, "Piety promoted", lccn=["04008884"]),  # new, and moves every later line
+        DUMP[0],
+        DUMP[2],
+        edition(5, "Dying sayings", revision=2, lccn=["04008883"]),  # changed title
+    ]  # OL4M and OL6M are gone
+    dump_path = write_dump(tmp_path / "ol_dump_editions_2025-05-31.txt.gz", newer)
+    assert refresh_title_index(dump_path, index_path) == {"inserted": 1, "updated": 1, "deleted": 2}
+
+    matches = lookup_title_index("piety promoted", index_path)
+    assert keys_of(matches) == ["/books/OL7M", "/books/OL1M"]
+    assert read_dump_line(dump_path, matches[1]["line_offset"])["key"] == "/books/OL1M"
+    assert keys_of(lookup_title_index("dying sayings", index_path)) == ["/books/OL5M"]
+    assert lookup_title_index("on piety promoted", index_path) == []
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from resolver_cascade import ResolverCascade, no_resolution, resolution
+
+class FakeBackend:
+    """Answers each call with the next (seconds, result) pair; a result that is an exception is raised."""
+
+    def __init__(self, name, local, *answers):
+        self.name = name
+        self.local = local
+        self.answers = list(answers)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def available(self):
+        return True
+
+    def resolve(self, title):
+        with self._lock:
+            self.calls += 1
+            seconds, result = self.answers.pop(0)
+        time.sleep(seconds)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def found(name, score=100):
+    return resolution("Piety promoted", name, ["50041871"], score=score)
+
+@pytest.fixture
+def cascade_of():
+    cascades = []
+
+    def make(*backends, hedge_delay=0.05):
+        cascade = ResolverCascade(backends, hedge_delay=hedge_delay, stats_path=None)
+        cascades.append(cascade)
+        return cascade
+
+    yield make
+    for cascade in cascades:
+        cascade.close()
+
+def test_confident_local_result_skips_remote_backends(cascade_of):
+    local = FakeBackend("OpenLibrary", True, (0, found("OpenLibrary")))
+    remote = FakeBackend("LOC", False)
+    assert cascade_of(remote, local).resolve("Piety promoted")["source"] == "OpenLibrary"
+    assert remote.calls == 0
+
+def test_backends_are_ordered_by_cost_within_each_group(cascade_of):
+    cascade = cascade_of(FakeBackend("OCLC", False), FakeBackend("LOC", False), FakeBackend("MARC", True))
+    cascade.stats["OCLC"].update(calls=10, hits=1, seconds=10.0)
+    cascade.stats["LOC"].update(calls=10, hits=9, seconds=10.0)
+    assert [backend.name for backend in cascade.ordered_backends()] == ["MARC", "LOC", "OCLC"]
+
+def test_best_result_wins_when_none_is_confident(cascade_of):
+    local = FakeBackend("OpenLibrary", True, (0, found("OpenLibrary", score=85)))
+    remote = FakeBackend("LOC", False, (0, found("LOC", score=90)))
+    assert cascade_of(local, remote).resolve("Piety promoted")["source"] == "LOC"
+
+def test_no_match_without_failures_is_no_resolution(cascade_of):
+    cascade = cascade_of(FakeBackend("OpenLibrary", True, (0, None)), FakeBackend("LOC", False, (0, None)))
+    assert cascade.resolve("Piety promoted") == no_resolution("Piety promoted")
+
+def test_failed_backend_leaves_the_title_for_later(cascade_of):
+    cascade = cascade_of(FakeBackend("LOC", False, (0, RuntimeError("HTTP 503"))))
+    assert cascade.resolve("Piety promoted") is None
+    assert cascade.stats["LOC"]["errors"] == 1
+
+def test_slow_backend_is_hedged_with_the_next_one(cascade_of):
+    loc = FakeBackend("LOC", False, (0.5, None))
+    oclc = FakeBackend("OCLC", False, (0, found("OCLC")))
+    cascade = cascade_of(loc, oclc)
+    start = time.perf_counter()
+    assert cascade.resolve("Piety promoted")["source"] == "OCLC"
+    assert time.perf_counter() - start < 0.4
+    assert cascade.hedges == 1
+
+def test_slow_last_backend_gets_a_duplicate_request(cascade_of):
+    loc = FakeBackend("LOC", False, (1.0, found("LOC")), (0, found("LOC")))
+    cascade = cascade_of(loc)
+    start = time.perf_counter()
+    assert cascade.resolve("Piety promoted")["source"] == "LOC"
+    assert time.perf_counter() - start < 0.5
+    assert (loc.calls, cascade.hedges) == (2, 1)
+    time.sleep(1.0)  # the losing request finishes and is not recorded
+    assert cascade.stats["LOC"]["calls"] == 1
+
+def test_duplicate_is_sent_once_per_lookup(cascade_of):
+    loc = FakeBackend("LOC", False, (0.3, None), (0.3, None))
+    cascade = cascade_of(loc)
+    assert cascade.resolve("Piety promoted") == no_resolution("Piety promoted")
+    assert (loc.calls, cascade.hedges) == (2, 1)
@@ -0,0 +1,61 @@
+import pytest
+
+from results_store import ResultsStore, result_from_ledger_row
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"), legacy_csv=None)
+    yield store
+    store.close()
+
+FOUND = {"title": "Piety Promoted", "lccn": "50041871", "alt_lccn": ["04008882"], "oclc": "1109691",
+         "alt_oclc": [], "source": "LOC"}
+MISSED = {"title": "piety promoted", "lccn": "n/a", "alt_lccn": [], "oclc": "n/a", "alt_oclc": [], "source": "None"}
+
+def test_miss_does_not_replace_a_found_result(store):
+    store.upsert(FOUND)
+    store.upsert(MISSED)
+    assert store.get("Piety promoted") == {**FOUND, "title": "Piety Promoted"}
+
+def test_found_result_replaces_a_miss(store):
+    store.upsert(MISSED)
+    store.upsert(FOUND)
+    assert store.get("Piety promoted")["lccn"] == "50041871"
+
+def test_later_found_result_replaces_an_earlier_one(store):
+    store.upsert(FOUND)
+    store.upsert({**FOUND, "lccn": "04008882", "alt_lccn": [], "source": "OpenLibrary"})
+    assert store.get("Piety promoted")["source"] == "OpenLibrary"
+    assert store.get("Piety promoted")["lccn"] == "04008882"
+
+def test_placeholders_are_stored_blank(store):
+    store.upsert(MISSED)
+    result = store.get("Piety promoted")
+    assert (result["lccn"], result["oclc"]) == ("", "")
+
+def test_resolved_matches_normalized_titles(store):
+    store.upsert(FOUND)
+    assert store.resolved(["PIETY PROMOTED", "Other"]) == {"PIETY PROMOTED"}
+
+def test_ledger_rows_round_trip_through_export(store, tmp_path):
+    store.upsert_many([FOUND, {**MISSED, "title": "Unknown"}])
+    csv_path = str(tmp_path / "titles_lccn.csv")
+    assert store.export_csv(csv_path) == 2
+    imported = ResultsStore(str(tmp_path / "imported.sqlite"), legacy_csv=csv_path)
+    assert imported.results() == store.results()
+    imported.close()
+
+def test_export_writes_placeholders_for_missing_identifiers(store, tmp_path):
+    store.upsert_many([FOUND, {**MISSED, "title": "Unknown"}, {**FOUND, "title": "No OCLC", "oclc": ""}])
+    csv_path = tmp_path / "titles_lccn.csv"
+    store.export_csv(str(csv_path))
+    assert csv_path.read_text(encoding="utf-8-sig").splitlines() == [
+        "Title,LCCN,Alt_LCCN,OCLC,Alt_OCLC,Source",
+        "Piety Promoted,50041871,['04008882'],1109691,[],LOC",
+        "Unknown,n/a,[],n/a,[],None",
+        "No OCLC,50041871,['04008882'],n/a,[],LOC",
+    ]
+
+def test_ledger_row_without_source_is_open_library():
+    assert result_from_ledger_row({"Title": "A", "LCCN": "1"})["source"] == "OpenLibrary"
+    assert result_from_ledger_row({"Title": "A", "No_match": "No match"})["source"] == "None"
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+import retrieve_from_open_library_dump as dump
+from retrieve_from_open_library_dump import decode_dump_line, new_scan_stats
+
+def line(record):
+    return b"/type/edition\t/books/OL1M\t1\t2010-01-01T00:00:00\t" + json.dumps(record).encode() + b"\n"
+
+@pytest.fixture
+def stats():
+    return new_scan_stats()
+
+def test_lines_without_identifier_keys_are_not_decoded(stats, monkeypatch):
+    def loads(payload):
+        raise AssertionError("decoded a line the prefilter should have dropped")
+
+    monkeypatch.setattr(dump, "_loads", loads)
+    assert decode_dump_line(line({"key": "/books/OL1M", "title": "Piety promoted"}), stats) is None
+    assert stats["no_identifier_key"] == 1
+
+def test_records_are_projected_to_the_used_fields(stats):
+    record = {"key": "/books/OL1M", "title": "Piety promoted", "lccn": ["04008882"], "publishers": ["Sowle"]}
+    assert decode_dump_line(line(record), stats) == {"key": "/books/OL1M", "title": "Piety promoted", "lccn": ["04008882"]}
+    assert stats["decoded"] == 1
+
+def test_oclc_numbers_key_passes_the_prefilter(stats):
+    assert decode_dump_line(line({"title": "Piety promoted", "oclc_numbers": ["1109691"]}), stats)["oclc_numbers"] == ["1109691"]
+
+def test_empty_identifiers_are_dropped_after_decoding(stats):
+    assert decode_dump_line(line({"title": "Piety promoted", "lccn": [], "oclc_numbers": [""]}), stats) is None
+    assert stats["no_identifier_value"] == 1
+
+def test_malformed_lines_are_counted(stats):
+    assert decode_dump_line(b'/type/edition\t/books/OL1M\t{"lccn": ["0400\n', stats) is None
+    assert decode_dump_line(b'/type/edition\t/books/OL1M\tnot json "lccn"\n', stats) is None
+    assert stats["malformed"] == 2
+    assert stats["lines"] == 2
@@ -0,0 +1,75 @@
+import io
+
+import pandas as pd
+
+from row_delta import RowCache, row_fingerprints
+
+YEARS_CSV = "Name,Year\nAlice,1900\nBob,1901\n"
+
+def read(text):
+    return pd.read_csv(io.StringIO(text))
+
+def test_blank_row_keeps_fingerprints_of_whole_float_rows():
+    before = read(YEARS_CSV)
+    after = read(YEARS_CSV + "Carol,\n")
+    assert before["Year"].dtype == "int64" and after["Year"].dtype == "float64"
+    assert row_fingerprints(after)[:2].tolist() == row_fingerprints(before).tolist()
+
+def test_fractional_floats_keep_their_fraction():
+    assert row_fingerprints(read("Year\n1900.5\n"))[0] != row_fingerprints(read("Year\n1900\n"))[0]
+
+def test_blank_row_only_processes_the_new_row(tmp_path):
+    calls = []
+
+    def process(rows):
+        calls.append(len(rows))
+        return rows.assign(Label=rows["Name"].str.upper())
+
+    cache = RowCache("years", "v1", delta_dir=str(tmp_path))
+    cache.run(read(YEARS_CSV), process)
+    cache.save()
+    out = RowCache("years", "v1", delta_dir=str(tmp_path)).run(read(YEARS_CSV + "Carol,\n"), process)
+    assert calls == [2, 1]
+    assert out["Label"].tolist() == ["ALICE", "BOB", "CAROL"]
+
+def test_reuses_unchanged_rows_and_drops_removed_ones(tmp_path):
+    calls = []
+
+    def process(rows):
+        calls.append(rows["Name"].tolist())
+        return rows.assign(Label=rows["Name"].str.upper())
+
+    cache = RowCache("names", "v1", delta_dir=str(tmp_path))
+    cache.run(read("Name,Year\nAlice,1900\nBob,1901\nCarol,1902\n"), process)
+    cache.save()
+    cache = RowCache("names", "v1", delta_dir=str(tmp_path))
+    out = cache.run(read("Name,Year\nCarol,1902\nAlice,1900\nBob,1950\n"), process)
+    assert calls[1] == ["Bob"]
+    assert out["Label"].tolist() == ["CAROL", "ALICE", "BOB"]
+    assert len(cache.seen) == 3
+
+def test_stale_rows_are_reprocessed(tmp_path):
+    calls = []
+    df = read(YEARS_CSV)
+
+    def process(rows):
+        calls.append(len(rows))
+        return rows
+
+    cache = RowCache("years", "v1", delta_dir=str(tmp_path))
+    cache.run(df, process)
+    cache.run(df, process, stale=[row_fingerprints(df)[0]])
+    assert calls == [2, 1]
+
+def test_signature_change_starts_over(tmp_path):
+    calls = []
+
+    def process(rows):
+        calls.append(len(rows))
+        return rows
+
+    cache = RowCache("years", "v1", delta_dir=str(tmp_path))
+    cache.run(read(YEARS_CSV), process)
+    cache.save()
+    RowCache("years", "v2", delta_dir=str(tmp_path)).run(read(YEARS_CSV), process)
+    assert calls == [2, 2]
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from shared_rate_limit import SharedRateLimiter
+
+HOST = "lx2.loc.gov"
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+@pytest.fixture
+def limiter_at(tmp_path):
+    def make():
+        return SharedRateLimiter(str(tmp_path / "limits.sqlite"), budgets={HOST: {"rate": 1.0, "burst": 2}})
+    return make
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def test_burst_then_one_token_per_interval(clock, limiter_at):
+    limiter = limiter_at()
+    assert [limiter.try_acquire(HOST) for _ in range(3)] == [0, 0, 1.0]
+    clock.now += 1
+    assert limiter.try_acquire(HOST) == 0
+
+def test_processes_share_one_budget(clock, limiter_at):
+    first, second = limiter_at(), limiter_at()
+    assert first.try_acquire(HOST) == 0
+    assert second.try_acquire(HOST) == 0
+    assert first.try_acquire(HOST) == 1.0
+
+def test_throttling_halves_the_rate_and_pauses(clock, limiter_at):
+    limiter = limiter_at()
+    assert limiter.record(HOST, 429, retry_after=30) == 0.5
+    assert limiter.try_acquire(HOST) == 30
+    clock.now += 30
+    assert limiter.try_acquire(HOST) == 2.0  # no tokens accrued during the pause
+
+def test_rate_has_a_floor(clock, limiter_at):
+    limiter = limiter_at()
+    rates = [limiter.record(HOST, 503, retry_after=0) for _ in range(6)]
+    assert rates == [0.5, 0.25, 0.125, 0.0625, 0.0625, 0.0625]
+
+def test_successes_ramp_the_rate_back_up(clock, limiter_at):
+    limiter = limiter_at()
+    limiter.record(HOST, 429, retry_after=0)
+    rates = [limiter.record(HOST, 200) for _ in range(11)]
+    assert rates[0] == pytest.approx(0.55)
+    assert rates[9] == pytest.approx(1.0)
+    assert rates[10] == 1.0
+
+def test_wrapped_get_reports_retry_after(clock, limiter_at):
+    limiter = limiter_at()
+    get = limiter.wrap(lambda url, **kwargs: FakeResponse(429, {"Retry-After": "120"}))
+    assert get(f"http://{HOST}:210/lcdb?query=x").status_code == 429
+    assert limiter.ready_in(HOST) == 120
+    assert limiter.status()[0]["requests_per_minute"] == 30
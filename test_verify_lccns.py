@@ -0,0 +1,22 @@
+from thefuzz import fuzz
+
+from verify_lccns import score_pairs
+
+TITLES = [
+    ("Café société", "Cafe societe"),
+    ("Les misérables", "Les Misérables / Victor Hugo"),
+    ("Über die Freiheit", "Uber die Freiheit"),
+    ("Piety promoted : dying sayings", "Piety promoted, in a collection of dying sayings"),
+    ("Ærø og Ålborg", "Aero og Alborg"),
+    ("Łódź ghetto", "Lodz ghetto"),
+    ("", "Piety promoted"),
+]
+
+def test_scores_match_thefuzz():
+    titles, fetched = zip(*TITLES)
+    sort_scores, set_scores = score_pairs(list(titles), list(fetched))
+    assert sort_scores == [fuzz.token_sort_ratio(a, b) for a, b in TITLES]
+    assert set_scores == [fuzz.token_set_ratio(a, b) for a, b in TITLES]
+
+def test_no_pairs():
+    assert score_pairs([], []) == ([], [])
@@ -0,0 +1,144 @@
+import argparse
+import ast
+import concurrent.futures
+import os
+import random
+import time
+
+import requests
+from rapidfuzz import fuzz, process, utils
+
+from http_cache import ResponseCache, cached_get
+from shared_rate_limit import shared_limiter
+
+LOC_API_URL = os.environ.get("LOC_API_URL", "https://www.loc.gov")
+HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; LCCNBot/1.0; +https://github.com/millerbrook/lod_lccn_script)'}
+ITEM_TIMEOUT = (5, 20)
+# thefuzz's scorers (force_ascii=True) delete these code points before default_process
+ASCII_ONLY = {i: None for i in range(128, 256)}
+
+def fetch_item_title(lccn, cache=None, max_retries=3, timeout=ITEM_TIMEOUT, verbose=False):
+    """
+    Title of the loc.gov item for an LCCN, or None. Requests go through the
+    shared www.loc.gov budget, which also absorbs 429 pauses, and 200
+    responses are cached.
+    """
+    url = f"{LOC_API_URL}/item/{lccn}/?fo=json"
+    get = shared_limiter().wrap(requests.get, verbose)
+    for attempt in range(max_retries):
+        try:
+            response = cached_get(url, cache=cache, get=get, timeout=timeout, headers=HEADERS)
+        except requests.RequestException as e:
+            if verbose:
+                print(f"Request failed for LCCN {lccn}: {e}")
+            time.sleep(2 ** attempt + random.uniform(0, 1))
+            continue
+        if response.status_code == 200:
+            try:
+                return response.json().get('item', {}).get('title')
+            except ValueError as e:
+                if verbose:
+                    print(f"Error parsing JSON for LCCN {lccn}: {e}")
+                return None
+        if response.status_code != 429 and response.status_code < 500:
+            if verbose:
+                print(f"HTTP error {response.status_code} for LCCN {lccn}")
+            return None
+        if response.status_code != 429:
+            # 429s are paused by the shared limiter; back off on server errors here
+            time.sleep(2 ** attempt + random.uniform(0, 1))
+    if verbose:
+        print(f"Failed to retrieve JSON for LCCN {lccn}")
+    return None
+
+def fetch_item_titles(lccns, concurrency=4, cache=None, max_retries=3, verbose=False):
+    """Fetch the item titles for a set of LCCNs concurrently; returns a dict of lccn -> title or None."""
+    unique = list(dict.fromkeys(str(lccn) for lccn in lccns if lccn))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        titles = executor.map(lambda lccn: fetch_item_title(lccn, cache, max_retries, verbose=verbose), unique)
+        return dict(zip(unique, titles))
+
+def full_process(s):
+    """thefuzz's full_process(s, force_ascii=True), which its scorers apply by default."""
+    return utils.default_process(str(s).translate(ASCII_ONLY))
+
+def score_pairs(titles, fetched_titles):
+    """
+    token_sort_ratio and token_set_ratio for each (title, fetched title) pair
+    in one vectorized pass each, preprocessed (full_process) and rounded like thefuzz.
+    """
+    if not titles:
+        return [], []
+    sort_scores = process.cpdist(titles, fetched_titles, scorer=fuzz.token_sort_ratio, processor=full_process, workers=-1)
+    set_scores = process.cpdist(titles, fetched_titles, scorer=fuzz.token_set_ratio, processor=full_process, workers=-1)
+    return [round(float(s)) for s in sort_scores], [round(float(s)) for s in set_scores]
+
+def verify_candidates(candidates, sim_threshold=95, concurrency=4, cache=None, max_retries=3, verbose=False):
+    """
+    Verify candidate LCCNs for many titles at once. candidates is a list of
+    (title, [lccn, ...]). Every distinct LCCN is fetched once; each title is
+    confirmed by its first LCCN whose loc.gov title scores at least
+    sim_threshold on token_sort_ratio or token_set_ratio. Returns one entry
+    per candidate: a dict with lccn, title_from_lccn, scorer and score, or None.
+    """
+    fetched = fetch_item_titles((lccn for _, lccns in candidates for lccn in lccns), concurrency, cache, max_retries, verbose)
+    pairs = [
+        (row, str(lccn), title, fetched[str(lccn)])
+        for row, (title, lccns) in enumerate(candidates)
+        for lccn in lccns
+        if lccn and fetched.get(str(lccn))
+    ]
+    sort_scores, set_scores = score_pairs([str(p[2]) for p in pairs], [p[3] for p in pairs])
+    confirmed = [None] * len(candidates)
+    for (row, lccn, _, title_from_lccn), sort_score, set_score in zip(pairs, sort_scores, set_scores):
+        if confirmed[row] is not None:
+            continue
+        if sort_score >= sim_threshold:
+            confirmed[row] = {"lccn": lccn, "title_from_lccn": title_from_lccn, "scorer": "token_sort_ratio", "score": sort_score}
+        elif set_score >= sim_threshold:
+            confirmed[row] = {"lccn": lccn, "title_from_lccn": title_from_lccn, "scorer": "token_set_ratio", "score": set_score}
+    return confirmed
+
+def ledger_candidates(csv_path):
+    """(title, [LCCN, *Alt_LCCN]) for every ledger row that has an LCCN."""
+    import pandas as pd
+    df = pd.read_csv(csv_path, dtype=str).fillna("")
+    candidates = []
+    for _, row in df.iterrows():
+        lccns = [row.get("LCCN", "")]
+        if row.get("Alt_LCCN", "").startswith("["):
+            lccns += ast.literal_eval(row["Alt_LCCN"])
+        lccns = [lccn for lccn in lccns if lccn and lccn != "n/a"]
+        if lccns:
+            candidates.append((row["Title"], lccns))
+    return candidates
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check candidate LCCNs against their loc.gov item titles")
+    parser.add_argument("--input", default="data/titles_lccn.csv", help="CSV with Title, LCCN and optional Alt_LCCN columns")
+    parser.add_argument("--output", default="data/lccn_verification.csv", help="Where to write the verification results")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent loc.gov requests")
+    parser.add_argument("--threshold", type=int, default=95, help="Minimum token_sort/token_set score to confirm")
+    parser.add_argument("--no-cache", action="store_true", help="Always query loc.gov instead of reusing cached responses")
+    args = parser.parse_args()
+
+    import pandas as pd
+    start_time = time.time()
+    candidates = ledger_candidates(args.input)
+    cache = None if args.no_cache else ResponseCache()
+    confirmed = verify_candidates(candidates, args.threshold, args.concurrency, cache, verbose=True)
+    rows = []
+    for (title, lccns), match in zip(candidates, confirmed):
+        rows.append({
+            "Title": title,
+            "Candidate_LCCNs": repr(lccns),
+            "Verified_LCCN": match["lccn"] if match else "",
+            "Title_From_LCCN": match["title_from_lccn"] if match else "",
+            "Scorer": match["scorer"] if match else "",
+            "Score": match["score"] if match else "",
+        })
+    pd.DataFrame(rows).to_csv(args.output, index=False, encoding="utf-8-sig")
+    verified = sum(match is not None for match in confirmed)
+    print(f"Verified {verified} of {len(candidates)} titles in {time.time() - start_time:.2f} seconds; results in {args.output}")
+    if cache:
+        print(f"HTTP cache: {cache.hits} hits, {cache.misses} misses")